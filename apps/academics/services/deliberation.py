@@ -3,8 +3,9 @@ from django.db import transaction
 from django.db.models import Sum, F, Avg
 from apps.students.models import Student, StudentPromotion, Enrollment
 from apps.academics.models import CourseGrade, ReportCard
-from apps.university.models import AcademicYear, Level, ProgramFee
+from apps.university.models import AcademicYear, Level
 from apps.finance.models import StudentBalance
+from apps.finance.services.fees import FeeResolver
 
 class DeliberationService:
     @staticmethod
@@ -119,16 +120,7 @@ class DeliberationService:
             
         # 3. Create Student Balance
         if not StudentBalance.objects.filter(student=student, academic_year=next_year).exists():
-            # Determine fee
-            try:
-                program_fee = ProgramFee.objects.get(
-                    program=student.program,
-                    level=level_to,
-                    academic_year=next_year
-                )
-                amount = program_fee.amount
-            except ProgramFee.DoesNotExist:
-                amount = student.program.tuition_fee
+            amount = FeeResolver(next_year).total_due(student.program_id, level_to)
                 
             StudentBalance.objects.create(
                 student=student,
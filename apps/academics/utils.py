@@ -3,6 +3,8 @@ from openpyxl.styles import Font, Alignment, PatternFill
 from django.http import HttpResponse
 from io import BytesIO
 
+from apps.core.services.export import EXPORT_CHUNK_SIZE, write_xlsx
+
 def export_grades_template(exam, students):
     """
     Génère un fichier Excel servant de modèle pour l'importation des notes.
@@ -54,30 +56,40 @@ def export_grades_template(exam, students):
     buffer.seek(0)
     return buffer
 
-def export_current_grades(exam, grades_data):
+CURRENT_GRADES_HEADERS = ["Matricule", "Nom", "Note", "Absent", "Remarques", "Noté par", "Date"]
+CURRENT_GRADES_COLUMN_WIDTHS = {
+    openpyxl.utils.get_column_letter(col): 20
+    for col in range(1, len(CURRENT_GRADES_HEADERS) + 1)
+}
+
+
+def current_grades_rows(grades):
     """
-    Génère un fichier Excel avec les notes actuelles.
-    grades_data: list of dicts with student and score info
+    Génère les lignes de l'export des notes à partir d'un queryset de Grade,
+    lu par blocs pour garder une mémoire constante.
     """
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Notes actuelles"
-
-    headers = ["Matricule", "Nom", "Note", "Absent", "Remarques", "Noté par", "Date"]
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col, value=header).font = Font(bold=True)
-        ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 20
+    for grade in grades.select_related('student__user', 'graded_by').iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    ):
+        yield [
+            grade.student.student_id,
+            grade.student.user.get_full_name(),
+            grade.score,
+            "Oui" if grade.is_absent else "Non",
+            grade.remarks,
+            grade.graded_by.get_full_name() if grade.graded_by else None,
+            grade.graded_at,
+        ]
 
-    for row, grade in enumerate(grades_data, 2):
-        ws.cell(row=row, column=1, value=grade['student_matricule'])
-        ws.cell(row=row, column=2, value=grade['student_name'])
-        ws.cell(row=row, column=3, value=grade['score'])
-        ws.cell(row=row, column=4, value="Oui" if grade['is_absent'] else "Non")
-        ws.cell(row=row, column=5, value=grade.get('remarks', ''))
-        ws.cell(row=row, column=6, value=grade['graded_by_name'])
-        ws.cell(row=row, column=7, value=grade['graded_at'])
 
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer
+def export_current_grades(exam, grades):
+    """
+    Génère un fichier Excel avec les notes actuelles.
+    grades: queryset des notes de l'examen
+    """
+    return write_xlsx(
+        CURRENT_GRADES_HEADERS,
+        current_grades_rows(grades),
+        "Notes actuelles",
+        CURRENT_GRADES_COLUMN_WIDTHS,
+    )
@@ -15,10 +15,15 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from apps.core.permissions import IsAdminOrReadOnly, IsTeacherOrAdmin, IsSecretaryOrAdmin
+from apps.core.services.export import export_response
+from apps.core.services.imports import ImportFileError, SpreadsheetReader
 from .models import Course, Exam, Grade, CourseGrade, ReportCard
 from django.db import transaction
 from django.http import HttpResponse
-from .utils import export_grades_template, export_current_grades
+from .utils import (
+    CURRENT_GRADES_COLUMN_WIDTHS, CURRENT_GRADES_HEADERS, current_grades_rows,
+    export_grades_template,
+)
 from .services.grades import (
     delete_course_grade,
     delete_grade,
@@ -31,7 +36,6 @@ from .services.grades import (
     unvalidate_course_grade,
     validate_course_grade,
 )
-import openpyxl
 from .serializers import (
     CourseListSerializer, CourseDetailSerializer, CourseCreateSerializer,
     ExamListSerializer, ExamDetailSerializer, ExamCreateSerializer,
@@ -571,18 +575,13 @@ class GradeViewSet(viewsets.ModelViewSet):
 
         ensure_course_access(request.user, exam.course, exam.semester)
 
-        grades = Grade.objects.filter(exam_id=exam_id).select_related('student', 'student__user', 'graded_by')
-        serializer = GradeListSerializer(grades, many=True)
-
-        buffer = export_current_grades(exam, serializer.data)
-        filename = f"Notes_{exam.course.code}_{exam.exam_type}.xlsx"
-        
-        response = HttpResponse(
-            buffer,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        grades = Grade.objects.filter(exam_id=exam_id)
+        return export_response(
+            request, CURRENT_GRADES_HEADERS, current_grades_rows(grades),
+            filename=f"Notes_{exam.course.code}_{exam.exam_type}",
+            title="Notes actuelles",
+            column_widths=CURRENT_GRADES_COLUMN_WIDTHS,
         )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
 
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsTeacherOrAdmin])
     def import_grades(self, request):
@@ -602,67 +601,78 @@ class GradeViewSet(viewsets.ModelViewSet):
         ensure_academic_year_open(exam.semester)
 
         try:
-            wb = openpyxl.load_workbook(file_obj, data_only=True)
-            ws = wb.active
-            
-            from apps.students.models import Student
-            from decimal import Decimal, InvalidOperation
+            reader = SpreadsheetReader(file_obj, width=5)
+        except ImportFileError as e:
+            return Response({"error": f"Erreur lors de la lecture du fichier: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
-            results = {'created': 0, 'updated': 0, 'errors': []}
-            
-            with transaction.atomic():
-                # Skip header
-                for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
-                    matricule, name, score_val, absent_val, remarks = row[0:5]
-                    
-                    if not matricule:
-                        continue
-                        
-                    try:
-                        student = Student.objects.get(student_id=matricule)
-                        # Basic score validation
-                        is_absent = str(absent_val).strip().upper() in ['O', 'OUI', 'Y', 'YES', 'TRUE']
-                        
-                        score = Decimal('0.00')
-                        if not is_absent and score_val is not None:
-                            try:
-                                score = Decimal(str(score_val))
-                                if score > exam.max_score:
-                                    results['errors'].append(f"Ligne {row_idx}: La note {score} dépasse le maximum {exam.max_score}")
-                                    continue
-                                if score < 0:
-                                    results['errors'].append(f"Ligne {row_idx}: La note ne peut pas être négative")
-                                    continue
-                            except (InvalidOperation, ValueError):
-                                results['errors'].append(f"Ligne {row_idx}: Format de note invalide: {score_val}")
-                                continue
-                        
-                        existing_grade = Grade.objects.filter(
-                            student=student,
-                            exam=exam,
-                        ).first()
-                        grade = save_grade(
-                            actor=request.user,
-                            instance=existing_grade,
-                            validated_data={
-                                'student': student,
-                                'exam': exam,
-                                'score': score,
-                                'is_absent': is_absent,
-                                'remarks': str(remarks or ""),
-                            },
+        from apps.students.models import Student
+        from decimal import Decimal, InvalidOperation
+
+        results = {'created': 0, 'updated': 0, 'errors': []}
+
+        try:
+            with reader, transaction.atomic():
+                for chunk in reader.chunks():
+                    matricules = {str(row[0]).strip() for _, row in chunk if row[0]}
+                    students = Student.objects.in_bulk(matricules, field_name='student_id')
+                    existing_grades = {
+                        grade.student_id: grade
+                        for grade in Grade.objects.filter(
+                            exam=exam, student__student_id__in=matricules,
                         )
-                        created = existing_grade is None
-                        
-                        if created:
-                            results['created'] += 1
-                        else:
-                            results['updated'] += 1
-                            
-                    except Student.DoesNotExist:
-                        results['errors'].append(f"Ligne {row_idx}: Étudiant avec le matricule {matricule} non trouvé")
-                    except Exception as e:
-                        results['errors'].append(f"Ligne {row_idx}: Erreur inattendue: {str(e)}")
+                    }
+
+                    for row_idx, row in chunk:
+                        matricule, name, score_val, absent_val, remarks = row
+
+                        if not matricule:
+                            continue
+
+                        try:
+                            student = students.get(str(matricule).strip())
+                            if student is None:
+                                raise Student.DoesNotExist
+                            # Basic score validation
+                            is_absent = str(absent_val).strip().upper() in ['O', 'OUI', 'Y', 'YES', 'TRUE']
+
+                            score = Decimal('0.00')
+                            if not is_absent and score_val is not None:
+                                try:
+                                    score = Decimal(str(score_val))
+                                    if score > exam.max_score:
+                                        results['errors'].append(f"Ligne {row_idx}: La note {score} dépasse le maximum {exam.max_score}")
+                                        continue
+                                    if score < 0:
+                                        results['errors'].append(f"Ligne {row_idx}: La note ne peut pas être négative")
+                                        continue
+                                except (InvalidOperation, ValueError):
+                                    results['errors'].append(f"Ligne {row_idx}: Format de note invalide: {score_val}")
+                                    continue
+
+                            existing_grade = existing_grades.get(student.pk)
+                            grade = save_grade(
+                                actor=request.user,
+                                instance=existing_grade,
+                                validated_data={
+                                    'student': student,
+                                    'exam': exam,
+                                    'score': score,
+                                    'is_absent': is_absent,
+                                    'remarks': str(remarks or ""),
+                                },
+                            )
+                            # A second line for the same student updates this grade.
+                            existing_grades[student.pk] = grade
+
+                            if existing_grade is None:
+                                results['created'] += 1
+                            else:
+                                results['updated'] += 1
+
+                        except Student.DoesNotExist:
+                            results['errors'].append(f"Ligne {row_idx}: Étudiant avec le matricule {matricule} non trouvé")
+                        except Exception as e:
+                            results['errors'].append(f"Ligne {row_idx}: Erreur inattendue: {str(e)}")
 
             return Response(results)
         except Exception as e:
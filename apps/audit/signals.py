@@ -19,6 +19,12 @@ AUDITED_APP_LABELS = {
     'university',
 }
 
+# Derived tables maintained from audited writes; auditing them is pure noise.
+UNAUDITED_MODEL_LABELS = {
+    'finance.MonthlyFinanceRollup',
+    'students.AttendanceSummary',
+}
+
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
@@ -33,33 +39,64 @@ def _should_audit(sender, raw=False):
         not raw
         and sender is not AuditLog
         and sender._meta.app_label in AUDITED_APP_LABELS
+        and sender._meta.label not in UNAUDITED_MODEL_LABELS
         and get_current_request() is not None
     )
 
 
-def _schedule_audit_log(sender, instance, action):
+def _audit_payloads(sender, instances, action):
     request = get_current_request()
     user = get_current_user()
     user_id = user.pk if user and user.is_authenticated else None
-    payload = {
-        'user_id': user_id,
-        'action': action,
-        'model_name': sender.__name__,
-        'object_id': str(instance.pk),
-        'object_repr': str(instance)[:255],
-        'ip_address': get_client_ip(request),
-        'details': {},
-    }
-
-    def write_log():
+    ip_address = get_client_ip(request)
+    return [
+        {
+            'user_id': user_id,
+            'action': action,
+            'model_name': sender.__name__,
+            'object_id': str(instance.pk),
+            'object_repr': str(instance)[:255],
+            'ip_address': ip_address,
+            'details': {},
+        }
+        for instance in instances
+    ]
+
+
+def _schedule_audit_logs(sender, payloads):
+    def write_logs():
         try:
-            AuditLog.objects.create(**payload)
+            AuditLog.objects.bulk_create(
+                [AuditLog(**payload) for payload in payloads], batch_size=500,
+            )
         except Exception:
             # Auditing must never roll back the business transaction. This callback
             # runs after commit, so a missing/unavailable audit table cannot poison it.
             logger.exception('Unable to write audit log for %s', sender._meta.label)
 
-    transaction.on_commit(write_log)
+    transaction.on_commit(write_logs)
+
+
+def _schedule_audit_log(sender, instance, action):
+    _schedule_audit_logs(sender, _audit_payloads(sender, [instance], action))
+
+
+def audit_bulk_create(sender, instances):
+    """Audit rows inserted with bulk_create, which never sends post_save."""
+    if not _should_audit(sender) or not instances:
+        return
+    _schedule_audit_logs(
+        sender, _audit_payloads(sender, instances, AuditLog.Action.CREATE),
+    )
+
+
+def audit_bulk_update(sender, instances):
+    """Audit rows changed with QuerySet.update or bulk_update."""
+    if not _should_audit(sender) or not instances:
+        return
+    _schedule_audit_logs(
+        sender, _audit_payloads(sender, instances, AuditLog.Action.UPDATE),
+    )
 
 @receiver(post_save)
 def audit_post_save(sender, instance, created, raw=False, **kwargs):
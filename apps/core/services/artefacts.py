@@ -0,0 +1,223 @@
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: prune without the lock.
+    fcntl = None
+
+# Eviction brings the cache down to this share of the cap, so that it does
+# not run again on the very next write.
+ARTEFACT_CACHE_LOW_WATERMARK = 0.9
+# Seconds between two size checks of the same process.
+ARTEFACT_PRUNE_INTERVAL = 60
+# Temporary files older than this were left by a crashed write.
+STALE_TEMP_AGE = 60 * 60
+
+TEMP_PREFIX = '.tmp-'
+KEY_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]*:[0-9a-f]{64}$')
+
+
+def artefact_key(namespace, *parts):
+    """
+    Address of a generated file: its namespace and the SHA-256 of everything
+    it is built from, so a changed input is a different key and stale files
+    simply age out.
+    """
+    source = '|'.join(str(part) for part in parts)
+    return f"{namespace}:{hashlib.sha256(source.encode('utf-8')).hexdigest()}"
+
+
+class ArtefactCache:
+    """
+    Generated files (ID cards, bulletins, statements, exports) kept on disk.
+
+    The cache lives under settings.ARTEFACT_CACHE_ROOT, on the /data volume
+    beside the SQLite database in production, so every gunicorn worker sees
+    the same files and they survive restarts. Writes go to a temporary file
+    renamed into place, so readers never see a partial file. Reads refresh
+    the modification time, and once the total size passes
+    ARTEFACT_CACHE_MAX_SIZE the least recently used files are evicted.
+    """
+
+    def __init__(self):
+        # Counters of this process only; disk totals come from stats().
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._last_prune = 0.0
+
+    @property
+    def root(self):
+        return Path(settings.ARTEFACT_CACHE_ROOT)
+
+    @property
+    def max_size(self):
+        return settings.ARTEFACT_CACHE_MAX_SIZE
+
+    def path(self, key):
+        if not KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid artefact key: {key!r}")
+        namespace, digest = key.split(':')
+        return self.root / namespace / digest[:2] / digest
+
+    def get(self, key):
+        """Return the bytes stored under key, or None."""
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self._touch(path)
+        self.hits += 1
+        return data
+
+    def get_many(self, keys):
+        """Return {key: bytes} for the keys that are stored."""
+        found = {}
+        for key in keys:
+            data = self.get(key)
+            if data is not None:
+                found[key] = data
+        return found
+
+    def set(self, key, data):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temp_path)
+            raise
+        self.writes += 1
+        self._maybe_prune()
+
+    def set_many(self, items):
+        for key, data in items.items():
+            self.set(key, data)
+
+    def get_or_set(self, key, build):
+        """Return the stored bytes of key, building and storing them on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = build()
+            self.set(key, data)
+        return data
+
+    def delete(self, key):
+        with contextlib.suppress(FileNotFoundError):
+            self.path(key).unlink()
+
+    def clear(self, namespace=None):
+        target = self.root / namespace if namespace else self.root
+        shutil.rmtree(target, ignore_errors=True)
+
+    def _touch(self, path):
+        # Evicted by another worker between the read and now: nothing to do.
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+
+    def _entries(self):
+        """Yield (path, size, mtime) of every file, removing stale temp files."""
+        now = time.time()
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = Path(directory) / filename
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if filename.startswith(TEMP_PREFIX):
+                    if now - stat.st_mtime > STALE_TEMP_AGE:
+                        with contextlib.suppress(FileNotFoundError):
+                            path.unlink()
+                    continue
+                if filename == '.lock':
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        if now - self._last_prune >= ARTEFACT_PRUNE_INTERVAL:
+            self._last_prune = now
+            self.prune()
+
+    @contextlib.contextmanager
+    def _prune_lock(self):
+        """Let one process prune at a time; the others skip their turn."""
+        if fcntl is None:
+            yield True
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / '.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def prune(self, max_size=None):
+        """Evict the least recently used files above the size cap; return the count."""
+        max_size = self.max_size if max_size is None else max_size
+        with self._prune_lock() as acquired:
+            if not acquired:
+                return 0
+            entries = list(self._entries())
+            total = sum(size for _, size, _ in entries)
+            if total <= max_size:
+                return 0
+
+            target = max_size * ARTEFACT_CACHE_LOW_WATERMARK
+            evicted = 0
+            for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+                if total <= target:
+                    break
+                with contextlib.suppress(FileNotFoundError):
+                    path.unlink()
+                total -= size
+                evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def stats(self):
+        """Disk usage per namespace plus the hit/miss counters of this process."""
+        namespaces = {}
+        for path, size, _ in self._entries():
+            namespace = path.relative_to(self.root).parts[0]
+            usage = namespaces.setdefault(namespace, {'entries': 0, 'size': 0})
+            usage['entries'] += 1
+            usage['size'] += size
+        return {
+            'root': str(self.root),
+            'entries': sum(usage['entries'] for usage in namespaces.values()),
+            'size': sum(usage['size'] for usage in namespaces.values()),
+            'max_size': self.max_size,
+            'namespaces': namespaces,
+            'process': {
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions,
+            },
+        }
+
+
+artefacts = ArtefactCache()
@@ -0,0 +1,155 @@
+import codecs
+import csv
+import os
+from itertools import islice
+
+from django.conf import settings
+from openpyxl import load_workbook
+
+# Defaults for every import endpoint; override them in settings if needed.
+IMPORT_MAX_UPLOAD_SIZE = getattr(settings, 'IMPORT_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+IMPORT_MAX_ROWS = getattr(settings, 'IMPORT_MAX_ROWS', 20000)
+IMPORT_CHUNK_SIZE = 500
+
+CSV_EXTENSIONS = ('.csv', '.txt')
+
+
+class ImportFileError(Exception):
+    """The uploaded file as a whole cannot be imported (format, size, row count)."""
+
+
+class SpreadsheetReader:
+    """
+    Read the data rows of an uploaded .xlsx or .csv file lazily.
+
+    Workbooks are opened in openpyxl's read-only mode and CSV files are
+    decoded line by line, so memory does not grow with the upload. Without
+    columns, rows come out as tuples padded to width cells. With columns,
+    a {key: [header aliases]} mapping resolved once against the header row,
+    rows come out as {key: value} dicts (None for missing columns). Empty
+    cells read as None and blank rows are skipped.
+
+    Use it as a context manager so the workbook file is closed:
+
+        with SpreadsheetReader(upload, width=4) as reader:
+            for chunk in reader.chunks():
+                ...
+    """
+
+    def __init__(self, file_obj, *, width=None, columns=None,
+                 max_rows=None, max_size=None):
+        self.file_obj = file_obj
+        self.width = width
+        self.columns = columns
+        self.max_rows = max_rows or IMPORT_MAX_ROWS
+        self.max_size = max_size or IMPORT_MAX_UPLOAD_SIZE
+        self.header = []
+        self.indexes = {}
+        self._workbook = None
+        self._rows = None
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+    def _upload_size(self):
+        size = getattr(self.file_obj, 'size', None)
+        if size is None:
+            position = self.file_obj.tell()
+            size = self.file_obj.seek(0, os.SEEK_END)
+            self.file_obj.seek(position)
+        return size
+
+    def _is_csv(self):
+        name = (getattr(self.file_obj, 'name', '') or '').lower()
+        content_type = getattr(self.file_obj, 'content_type', '') or ''
+        return name.endswith(CSV_EXTENSIONS) or content_type.startswith('text/')
+
+    def _open(self):
+        if self._upload_size() > self.max_size:
+            raise ImportFileError(
+                f"Fichier trop volumineux (maximum {self.max_size // (1024 * 1024)} Mo)."
+            )
+        try:
+            if self._is_csv():
+                rows = self._csv_rows()
+            else:
+                self._workbook = load_workbook(self.file_obj, read_only=True, data_only=True)
+                sheet = self._workbook.active
+                # The declared dimensions are cheap to read; reject obvious
+                # oversize files before streaming a single row.
+                if sheet.max_row and sheet.max_row - 1 > self.max_rows:
+                    raise ImportFileError(self._too_many_rows_message())
+                rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+        except ImportFileError:
+            self.close()
+            raise
+        except Exception as e:
+            self.close()
+            raise ImportFileError(f"Format de fichier invalide: {str(e)}")
+
+        self.header = [str(value).strip() if value is not None else '' for value in header or ()]
+        if self.columns:
+            lowered = [value.lower() for value in self.header]
+            for key, names in self.columns.items():
+                self.indexes[key] = next(
+                    (lowered.index(name.lower()) for name in names if name.lower() in lowered),
+                    None,
+                )
+        self._rows = rows
+
+    def _csv_rows(self):
+        self.file_obj.seek(0)
+        sample = self.file_obj.read(4096).decode('utf-8-sig', errors='replace')
+        self.file_obj.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        lines = codecs.iterdecode(self.file_obj, 'utf-8-sig', errors='replace')
+        for row in csv.reader(lines, dialect):
+            yield tuple(value.strip() or None for value in row)
+
+    def _too_many_rows_message(self):
+        return f"Trop de lignes dans le fichier (maximum {self.max_rows})."
+
+    def column(self, key):
+        """0-based index of a mapped column, or None when the header lacks it."""
+        return self.indexes.get(key)
+
+    def rows(self):
+        """Yield (row_number, row) for every non-empty data row."""
+        count = 0
+        for row_number, row in enumerate(self._rows, start=2):
+            if not row or not any(value not in (None, '') for value in row):
+                continue
+            count += 1
+            if count > self.max_rows:
+                raise ImportFileError(self._too_many_rows_message())
+            if self.columns:
+                yield row_number, {
+                    key: row[index] if index is not None and index < len(row) else None
+                    for key, index in self.indexes.items()
+                }
+            elif self.width:
+                yield row_number, tuple(row[:self.width]) + (None,) * (self.width - len(row))
+            else:
+                yield row_number, tuple(row)
+
+    def chunks(self, size=IMPORT_CHUNK_SIZE):
+        """Yield lists of at most size (row_number, row) pairs."""
+        rows = self.rows()
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,134 @@
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+MEDIA_STREAM_BLOCK_SIZE = 64 * 1024
+
+# Files whose name carries a digest of their content never change.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _byte_range(request, size, etag, last_modified):
+    """
+    Return (start, end) of the single byte range asked for, None to send the
+    whole file, or False when the range cannot be satisfied.
+
+    Multi-range requests are answered with the whole file, which RFC 9110
+    allows; so is a range whose If-Range validator no longer matches.
+    """
+    header = request.META.get('HTTP_RANGE', '').strip()
+    match = RANGE_PATTERN.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range:
+        if if_range.startswith(('"', 'W/')):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            block = handle.read(min(MEDIA_STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _offload_header(path):
+    """X-Accel-Redirect (nginx) or X-Sendfile (Apache) header, per MEDIA_OFFLOAD."""
+    mode = getattr(settings, 'MEDIA_OFFLOAD', '')
+    if mode == 'x-accel-redirect':
+        relative = path.resolve().relative_to(Path(settings.MEDIA_ROOT).resolve()).as_posix()
+        return 'X-Accel-Redirect', f"{settings.MEDIA_ACCEL_PREFIX.rstrip('/')}/{relative}"
+    if mode == 'x-sendfile':
+        return 'X-Sendfile', str(path.resolve())
+    return None
+
+
+def serve_media_file(request, path, *, immutable=False):
+    """
+    Serve a file of MEDIA_ROOT with validators, conditional GETs and ranges.
+
+    Every response carries ETag and Last-Modified; a matching If-None-Match
+    or If-Modified-Since gets a bodiless 304. With MEDIA_OFFLOAD set, the
+    bytes are left to the reverse proxy through X-Accel-Redirect or
+    X-Sendfile; otherwise a single Range is answered with 206 Partial
+    Content. immutable marks content-hashed files as cacheable for a year.
+    """
+    stat = path.stat()
+    etag = file_etag(stat)
+    # HTTP dates have whole-second precision.
+    last_modified = int(stat.st_mtime)
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else DEFAULT_CACHE_CONTROL
+
+    def with_validators(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = cache_control
+        response['X-Content-Type-Options'] = 'nosniff'
+        return response
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return with_validators(conditional)
+
+    content_type, encoding = mimetypes.guess_type(path.name)
+    content_type = content_type or 'application/octet-stream'
+
+    offload = _offload_header(path)
+    if offload:
+        # The proxy sends the body and handles ranges itself.
+        response = HttpResponse(content_type=content_type)
+        response[offload[0]] = offload[1]
+    else:
+        byte_range = _byte_range(request, stat.st_size, etag, last_modified)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return with_validators(response)
+        start, end = byte_range or (0, stat.st_size - 1)
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(path, start, length),
+            content_type=content_type,
+            status=206 if byte_range else 200,
+        )
+        response['Content-Length'] = str(length)
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return with_validators(response)
@@ -147,6 +147,8 @@ class CustomActionAuthorizationMatrixTests(TestCase):
         ('/api/v1/finance/student-balances/999999/recalculate/', FINANCE_ROLES, {}),
         ('/api/v1/finance/salaries/999999/pay/', FINANCE_ROLES, {}),
         ('/api/v1/finance/salaries/import_excel/', FINANCE_ROLES, {}),
+        ('/api/v1/finance/salaries/generate_payroll/', FINANCE_ROLES, {}),
+        ('/api/v1/finance/salaries/pay_bulk/', FINANCE_ROLES, {}),
         ('/api/v1/finance/expenses/import_excel/', FINANCE_ROLES, {}),
         ('/api/v1/academics/courses/999999/check_prerequisites/', ALL_ROLES, {}),
         ('/api/v1/academics/grades/bulk_create/', GRADE_ROLES, {}),
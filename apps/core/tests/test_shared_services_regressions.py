@@ -0,0 +1,85 @@
+import io
+import os
+import tempfile
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from openpyxl import Workbook
+
+from apps.core.services.artefacts import ArtefactCache, artefact_key
+from apps.core.services.imports import ImportFileError, SpreadsheetReader
+
+
+class SpreadsheetReaderTests(SimpleTestCase):
+    def setUp(self):
+        workbook = Workbook()
+        for index in range(6):
+            workbook.active.append([f'RTS{index:04d}', index])
+        self.xlsx_upload = io.BytesIO()
+        workbook.save(self.xlsx_upload)
+        self.xlsx_upload.seek(0)
+
+    def test_import_reader_maps_headers_once_and_enforces_limits(self):
+        csv_upload = SimpleUploadedFile(
+            'notes.csv',
+            '\ufeffNom;Matricule\n;\nAwa;RTS0001\n"Diallo; Mamadou";RTS0002\n'.encode('utf-8'),
+            content_type='text/csv',
+        )
+        columns = {'matricule': ['matricule'], 'name': ['Nom'], 'email': ['Email']}
+        with SpreadsheetReader(csv_upload, columns=columns) as reader:
+            self.assertEqual(reader.column('matricule'), 1)
+            rows = list(reader.rows())
+        self.assertEqual(rows, [
+            (3, {'matricule': 'RTS0001', 'name': 'Awa', 'email': None}),
+            (4, {'matricule': 'RTS0002', 'name': 'Diallo; Mamadou', 'email': None}),
+        ])
+
+        with SpreadsheetReader(self.xlsx_upload, width=3) as reader:
+            chunks = list(reader.chunks(size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[0][0], (2, ('RTS0001', 1, None)))
+
+        self.xlsx_upload.seek(0)
+        with self.assertRaisesMessage(ImportFileError, 'Trop de lignes'):
+            SpreadsheetReader(self.xlsx_upload, max_rows=4)
+        with self.assertRaisesMessage(ImportFileError, 'trop volumineux'):
+            SpreadsheetReader(io.BytesIO(b'x' * 2048), max_size=1024)
+        with self.assertRaisesMessage(ImportFileError, 'Format de fichier invalide'):
+            SpreadsheetReader(io.BytesIO(b'not a workbook'))
+
+
+class ArtefactCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = self.settings(ARTEFACT_CACHE_ROOT=directory.name, ARTEFACT_CACHE_MAX_SIZE=150)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_artefact_cache_is_atomic_lru_and_reports_stats(self):
+        store = ArtefactCache()
+        keys = [artefact_key('exports', 'report', index) for index in range(3)]
+        self.assertEqual(keys[0], artefact_key('exports', 'report', 0))
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertIsNone(store.get(keys[0]))
+
+        for index, key in enumerate(keys):
+            store.set(key, bytes([index]) * 100)
+            # Distinct mtimes, oldest first, whatever the filesystem resolution.
+            os.utime(store.path(key), (time.time() - 100 + index, time.time() - 100 + index))
+        self.assertFalse([name for name in os.listdir(store.path(keys[0]).parent) if name.startswith('.tmp-')])
+
+        # Reading the oldest file makes it the most recently used one.
+        self.assertEqual(store.get(keys[0]), b'\x00' * 100)
+        self.assertEqual(store.prune(), 2)
+        self.assertEqual(store.get_many(keys), {keys[0]: b'\x00' * 100})
+
+        stats = store.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['namespaces'], {'exports': {'entries': 1, 'size': 100}})
+        self.assertEqual(stats['process']['evictions'], 2)
+        self.assertEqual(stats['process']['hits'], 2)
+
+        with self.assertRaises(ValueError):
+            store.path('../../etc:passwd')
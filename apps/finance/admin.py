@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TuitionPayment, TuitionFee, StudentBalance, Salary, Expense
+from .models import TuitionPayment, TuitionFee, StudentBalance, Salary, Expense, MonthlyFinanceRollup
 
 
 @admin.register(TuitionPayment)
@@ -35,3 +35,9 @@ class SalaryAdmin(admin.ModelAdmin):
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ['category', 'description', 'amount', 'date', 'approved_by']
     list_filter = ['category', 'date']
+
+
+@admin.register(MonthlyFinanceRollup)
+class MonthlyFinanceRollupAdmin(admin.ModelAdmin):
+    list_display = ['source', 'period', 'academic_year', 'category', 'method', 'status', 'amount', 'count']
+    list_filter = ['source', 'academic_year', 'status']
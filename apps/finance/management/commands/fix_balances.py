@@ -1,44 +1,48 @@
-from django.core.management.base import BaseCommand
-from apps.students.models import Student
-from apps.finance.models import StudentBalance
+from django.core.management.base import BaseCommand, CommandError
+from apps.finance.services.balances import reconcile_academic_year
 from apps.university.models import AcademicYear
 
 class Command(BaseCommand):
-    help = 'Fixes student balances for enrolled students in current academic year'
+    help = 'Reconciles every student balance of an academic year from the payment ledger'
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write("Fixing student balances...")
-        
-        # Get current academic year
-        try:
-            current_year = AcademicYear.objects.get(is_current=True)
-            self.stdout.write(f"Current Year: {current_year}")
-        except AcademicYear.DoesNotExist:
-            self.stdout.write(self.style.ERROR("No current academic year found!"))
-            return
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--academic-year',
+            help='Academic year id or name (defaults to the current year)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without writing any balance',
+        )
 
-        # Get all students enrolled in current year
-        students = Student.objects.filter(enrollments__academic_year=current_year, enrollments__is_active=True).distinct()
-        self.stdout.write(f"Total enrolled students in current year: {students.count()}")
-        
-        count = 0
-        skipped = 0
-        
-        for student in students:
-            # Check if balance exists
-            if not StudentBalance.objects.filter(student=student, academic_year=current_year).exists():
-                # Create balance
-                if student.program:
-                    StudentBalance.objects.create(
-                        student=student,
-                        academic_year=current_year,
-                        total_due=student.program.tuition_fee,
-                        total_paid=0
-                    )
-                    count += 1
-                else:
-                    self.stdout.write(self.style.WARNING(f"Student {student} has no program!"))
-            else:
-                skipped += 1
-                
-        self.stdout.write(self.style.SUCCESS(f"Created {count} StudentBalance records (Skipped {skipped})"))
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling student balances...")
+
+        year_ref = options.get('academic_year')
+        years = AcademicYear.objects.all()
+        if year_ref:
+            year_filter = {'pk': year_ref} if str(year_ref).isdigit() else {'name': year_ref}
+            academic_year = years.filter(**year_filter).first()
+        else:
+            academic_year = years.filter(is_current=True).first()
+        if academic_year is None:
+            raise CommandError("No matching academic year found!")
+        self.stdout.write(f"Academic Year: {academic_year}")
+
+        report = reconcile_academic_year(academic_year, dry_run=options['dry_run'])
+
+        for drift in report['drifted']:
+            old_due, new_due = drift['total_due']
+            old_paid, new_paid = drift['total_paid']
+            self.stdout.write(
+                f"Student #{drift['student']}: due {old_due} -> {new_due}, "
+                f"paid {old_paid} -> {new_paid}"
+            )
+
+        prefix = "[dry-run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Checked {report['checked']} balances: "
+            f"{len(report['drifted'])} drifted, {report['created']} created "
+            f"(due drift {report['total_due_drift']}, paid drift {report['total_paid_drift']})"
+        ))
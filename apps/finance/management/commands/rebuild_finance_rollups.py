@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from apps.finance.services.rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly finance rollups used by the finance dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-closed',
+            action='store_true',
+            help='Also re-aggregate past months that already have rollups',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding finance rollups...")
+        rebuilt = rebuild_rollups(include_closed=options['include_closed'])
+        for source, count in rebuilt.items():
+            self.stdout.write(f"{source}: {count} rollup rows rebuilt")
+        self.stdout.write(self.style.SUCCESS("Finance rollups are up to date"))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:22
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_alter_tuitionfee_unique_together_tuitionfee_level_and_more'),
+        ('university', '0003_programfee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyFinanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('TUITION', 'Scolarité'), ('SALARY', 'Salaires'), ('EXPENSE', 'Dépenses')], max_length=10, verbose_name='Source')),
+                ('period', models.DateField(verbose_name='Mois')),
+                ('category', models.CharField(blank=True, max_length=20, verbose_name='Catégorie')),
+                ('method', models.CharField(blank=True, max_length=20, verbose_name='Méthode de paiement')),
+                ('status', models.CharField(blank=True, max_length=20, verbose_name='Statut')),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Montant')),
+                ('count', models.IntegerField(default=0, verbose_name='Nombre')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='finance_rollups', to='university.academicyear', verbose_name='Année académique')),
+            ],
+            options={
+                'verbose_name': 'Agrégat financier mensuel',
+                'verbose_name_plural': 'Agrégats financiers mensuels',
+                'ordering': ['period', 'source'],
+                'indexes': [models.Index(fields=['source', 'period'], name='finance_rollup_source_period'), models.Index(fields=['academic_year', 'source'], name='finance_rollup_year_source')],
+            },
+        ),
+    ]
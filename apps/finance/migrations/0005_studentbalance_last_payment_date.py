@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:26
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_last_payment_date(apps, schema_editor):
+    StudentBalance = apps.get_model('finance', 'StudentBalance')
+    TuitionPayment = apps.get_model('finance', 'TuitionPayment')
+    last_payments = TuitionPayment.objects.filter(status='COMPLETED').order_by().values(
+        'student_id', 'academic_year_id',
+    ).annotate(last=Max('payment_date'))
+    balances = {
+        (balance.student_id, balance.academic_year_id): balance
+        for balance in StudentBalance.objects.all()
+    }
+    changed = []
+    for row in last_payments:
+        balance = balances.get((row['student_id'], row['academic_year_id']))
+        if balance is not None:
+            balance.last_payment_date = row['last']
+            changed.append(balance)
+    StudentBalance.objects.bulk_update(changed, ['last_payment_date'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_monthlyfinancerollup'),
+        ('students', '0003_student_photo'),
+        ('university', '0003_programfee'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentbalance',
+            name='last_payment_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Date du dernier paiement'),
+        ),
+        migrations.AddIndex(
+            model_name='studentbalance',
+            index=models.Index(fields=['academic_year', 'last_payment_date'], name='finance_balance_year_lastpay'),
+        ),
+        migrations.RunPython(backfill_last_payment_date, migrations.RunPython.noop),
+    ]
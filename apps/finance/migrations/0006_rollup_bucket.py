@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def _bucket(source, academic_year_id, period, category, method, status):
+    # Same layout as MonthlyFinanceRollup.bucket_key.
+    return ':'.join((
+        source,
+        str(academic_year_id or '-'),
+        f'{period:%Y-%m}' if period else '-',
+        category, method, status,
+    ))
+
+
+def backfill_buckets(apps, schema_editor):
+    MonthlyFinanceRollup = apps.get_model('finance', 'MonthlyFinanceRollup')
+    StudentBalance = apps.get_model('finance', 'StudentBalance')
+
+    # Concurrent first inserts could leave two rows for a bucket: merge them.
+    kept = {}
+    duplicates = []
+    for row in MonthlyFinanceRollup.objects.order_by('pk'):
+        bucket = _bucket(
+            row.source, row.academic_year_id, row.period,
+            row.category, row.method, row.status,
+        )
+        first = kept.get(bucket)
+        if first is None:
+            row.bucket = bucket
+            kept[bucket] = row
+        else:
+            first.amount += row.amount
+            first.count += row.count
+            duplicates.append(row.pk)
+    MonthlyFinanceRollup.objects.filter(pk__in=duplicates).delete()
+    MonthlyFinanceRollup.objects.bulk_update(
+        kept.values(), ['bucket', 'amount', 'count'], batch_size=500,
+    )
+
+    MonthlyFinanceRollup.objects.bulk_create([
+        MonthlyFinanceRollup(
+            source='BALANCE',
+            academic_year_id=row['academic_year_id'],
+            period=None,
+            amount=row['total'] or Decimal('0.00'),
+            count=row['total_count'],
+            bucket=_bucket('BALANCE', row['academic_year_id'], None, '', '', ''),
+        )
+        for row in StudentBalance.objects.order_by().values('academic_year_id').annotate(
+            total=Sum(F('total_due') - F('total_paid')), total_count=Count('id'),
+        )
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_studentbalance_last_payment_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='monthlyfinancerollup',
+            name='source',
+            field=models.CharField(choices=[('TUITION', 'Scolarité'), ('SALARY', 'Salaires'), ('EXPENSE', 'Dépenses'), ('BALANCE', 'Soldes impayés')], max_length=10, verbose_name='Source'),
+        ),
+        migrations.AlterField(
+            model_name='monthlyfinancerollup',
+            name='period',
+            field=models.DateField(blank=True, null=True, verbose_name='Mois'),
+        ),
+        migrations.AddField(
+            model_name='monthlyfinancerollup',
+            name='bucket',
+            field=models.CharField(default='', editable=False, max_length=100, verbose_name="Clé d'agrégat"),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='monthlyfinancerollup',
+            constraint=models.UniqueConstraint(fields=('bucket',), name='finance_rollup_unique_bucket'),
+        ),
+    ]
@@ -162,12 +162,23 @@ class StudentBalance(models.Model):
         default=Decimal('0.00'),
         verbose_name="Total payé"
     )
+    last_payment_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Date du dernier paiement"
+    )
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Solde étudiant"
         verbose_name_plural = "Soldes étudiants"
         unique_together = ['student', 'academic_year']
+        indexes = [
+            models.Index(
+                fields=['academic_year', 'last_payment_date'],
+                name='finance_balance_year_lastpay',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.student} - {self.academic_year}: {self.balance}"
@@ -307,3 +318,79 @@ class Expense(models.Model):
 
     def __str__(self):
         return f"{self.get_category_display()} - {self.amount} ({self.date})"
+
+
+class MonthlyFinanceRollup(models.Model):
+    """
+    Agrégat mensuel des paiements, salaires et dépenses (tableau de bord).
+
+    Les soldes impayés sont agrégés par année académique, sans mois. bucket
+    est la clé unique de l'agrégat, dérivée des autres champs : NULL n'étant
+    jamais égal à NULL, une contrainte sur les champs eux-mêmes laisserait
+    passer des doublons pour les salaires et les dépenses, sans année.
+    """
+
+    class Source(models.TextChoices):
+        TUITION = 'TUITION', 'Scolarité'
+        SALARY = 'SALARY', 'Salaires'
+        EXPENSE = 'EXPENSE', 'Dépenses'
+        BALANCE = 'BALANCE', 'Soldes impayés'
+
+    source = models.CharField(
+        max_length=10,
+        choices=Source.choices,
+        verbose_name="Source"
+    )
+    academic_year = models.ForeignKey(
+        'university.AcademicYear',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='finance_rollups',
+        verbose_name="Année académique"
+    )
+    period = models.DateField(null=True, blank=True, verbose_name="Mois")
+    category = models.CharField(max_length=20, blank=True, verbose_name="Catégorie")
+    method = models.CharField(max_length=20, blank=True, verbose_name="Méthode de paiement")
+    status = models.CharField(max_length=20, blank=True, verbose_name="Statut")
+    amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Montant"
+    )
+    count = models.IntegerField(default=0, verbose_name="Nombre")
+    bucket = models.CharField(max_length=100, editable=False, verbose_name="Clé d'agrégat")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Agrégat financier mensuel"
+        verbose_name_plural = "Agrégats financiers mensuels"
+        ordering = ['period', 'source']
+        indexes = [
+            models.Index(fields=['source', 'period'], name='finance_rollup_source_period'),
+            models.Index(fields=['academic_year', 'source'], name='finance_rollup_year_source'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['bucket'], name='finance_rollup_unique_bucket'),
+        ]
+
+    def __str__(self):
+        period = f"{self.period:%Y-%m}" if self.period else self.academic_year_id
+        return f"{self.get_source_display()} {period}: {self.amount}"
+
+    @staticmethod
+    def bucket_key(source, academic_year_id, period, category, method, status):
+        return ':'.join((
+            source,
+            str(academic_year_id or '-'),
+            f'{period:%Y-%m}' if period else '-',
+            category, method, status,
+        ))
+
+    def save(self, *args, **kwargs):
+        self.bucket = self.bucket_key(
+            self.source, self.academic_year_id, self.period,
+            self.category, self.method, self.status,
+        )
+        super().save(*args, **kwargs)
@@ -236,7 +236,7 @@ class StudentBalanceListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'student', 'student_name', 'student_matricule', 'student_program',
             'student_level', 'academic_year', 'academic_year_name', 'total_due',
-            'total_paid', 'balance', 'is_paid', 'updated_at'
+            'total_paid', 'balance', 'is_paid', 'last_payment_date', 'updated_at'
         ]
 
 
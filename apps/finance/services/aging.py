@@ -0,0 +1,124 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.university.models import CacheVersion
+
+from ..models import StudentBalance
+
+AGING_CACHE_TIMEOUT = 60 * 15
+BALANCES_VERSION_KEY = 'finance:balances-version'
+
+# (label, maximum age in days); the last bucket is open-ended.
+AGING_BUCKETS = (
+    ('0-30', 30),
+    ('31-60', 60),
+    ('61-90', 90),
+    ('90+', None),
+)
+
+
+def balances_version():
+    return CacheVersion.current(BALANCES_VERSION_KEY)
+
+
+def bump_balances_version():
+    """Expire the cached balance reports of every process after a StudentBalance write."""
+    CacheVersion.bump(BALANCES_VERSION_KEY)
+
+
+def _aging_bucket(as_of):
+    return Case(
+        *[
+            When(reference_date__gte=as_of - timedelta(days=max_age), then=Value(label))
+            for label, max_age in AGING_BUCKETS
+            if max_age is not None
+        ],
+        default=Value(AGING_BUCKETS[-1][0]),
+        output_field=CharField(),
+    )
+
+
+def outstanding_aging_report(academic_year, as_of=None):
+    """
+    Bucket the outstanding debt of one academic year by age.
+
+    The age of a balance is the number of days since its last completed
+    payment, or since the start of the academic year when nothing was paid.
+    Debt is broken down by program and current level in one grouped query
+    over (academic_year, last_payment_date); results are cached until the
+    next balance write.
+    """
+    academic_year_id = getattr(academic_year, 'pk', academic_year)
+    as_of = as_of or timezone.localdate()
+    cache_key = (
+        f'finance:aging:v1:{academic_year_id}:{as_of.isoformat()}:{balances_version()}'
+    )
+    report = cache.get(cache_key)
+    if report is not None:
+        return report
+
+    rows = StudentBalance.objects.filter(
+        academic_year_id=academic_year_id,
+        total_due__gt=F('total_paid'),
+    ).annotate(
+        reference_date=Coalesce('last_payment_date', 'academic_year__start_date'),
+    ).annotate(
+        bucket=_aging_bucket(as_of),
+    ).order_by().values(
+        'bucket',
+        'student__program_id', 'student__program__name',
+        'student__current_level_id', 'student__current_level__name',
+    ).annotate(
+        amount=Sum(F('total_due') - F('total_paid')),
+        count=Count('id'),
+    )
+
+    labels = [label for label, _ in AGING_BUCKETS]
+    totals = {label: {'amount': Decimal('0.00'), 'count': 0} for label in labels}
+    breakdown = defaultdict(lambda: {
+        label: {'amount': Decimal('0.00'), 'count': 0} for label in labels
+    })
+    for row in rows:
+        bucket = row['bucket']
+        totals[bucket]['amount'] += row['amount']
+        totals[bucket]['count'] += row['count']
+        group = breakdown[(
+            row['student__program_id'], row['student__program__name'],
+            row['student__current_level_id'], row['student__current_level__name'],
+        )]
+        group[bucket]['amount'] += row['amount']
+        group[bucket]['count'] += row['count']
+
+    report = {
+        'academic_year': academic_year_id,
+        'as_of': as_of,
+        'buckets': labels,
+        'total_outstanding': sum(
+            (bucket['amount'] for bucket in totals.values()), Decimal('0.00')
+        ),
+        'total_students': sum(bucket['count'] for bucket in totals.values()),
+        'totals': totals,
+        'by_program_level': [
+            {
+                'program_id': program_id,
+                'program': program_name,
+                'level_id': level_id,
+                'level': level_name,
+                'total_outstanding': sum(
+                    (bucket['amount'] for bucket in buckets.values()), Decimal('0.00')
+                ),
+                'buckets': buckets,
+            }
+            for (program_id, program_name, level_id, level_name), buckets in sorted(
+                breakdown.items(), key=lambda item: (item[0][1] or '', item[0][3] or '')
+            )
+        ],
+    }
+    cache.set(cache_key, report, timeout=AGING_CACHE_TIMEOUT)
+    return report
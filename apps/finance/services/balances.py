@@ -1,35 +1,19 @@
 from decimal import Decimal
 
 from django.db import IntegrityError, transaction
-from django.db.models import Sum
+from django.db.models import Max, Sum
+from django.utils import timezone
 
-from apps.students.models import Enrollment
+from apps.students.models import Student
 
-from ..models import StudentBalance, TuitionFee, TuitionPayment
+from ..models import StudentBalance, TuitionPayment
+from .aging import bump_balances_version
+from .fees import FeeResolver
+from .rollups import rebuild_balance_rollup
 
 
 def _total_due(student, academic_year):
-    enrollment = Enrollment.objects.filter(
-        student=student,
-        academic_year=academic_year,
-        is_active=True,
-    ).select_related('level').first()
-    level = enrollment.level if enrollment else student.current_level
-
-    tuition_fee = TuitionFee.objects.filter(
-        program=student.program,
-        academic_year=academic_year,
-        level=level,
-    ).first()
-    if tuition_fee is None:
-        tuition_fee = TuitionFee.objects.filter(
-            program=student.program,
-            academic_year=academic_year,
-            level__isnull=True,
-        ).first()
-    if tuition_fee is not None:
-        return tuition_fee.amount
-    return getattr(student.program, 'tuition_fee', Decimal('0.00')) or Decimal('0.00')
+    return FeeResolver(academic_year).total_due_for_students([student])[student.pk]
 
 
 @transaction.atomic
@@ -57,16 +41,17 @@ def reconcile_student_balance(student, academic_year):
                 academic_year_id=academic_year_id,
             )
 
-    total_paid = TuitionPayment.objects.filter(
+    ledger = TuitionPayment.objects.filter(
         student_id=student_id,
         academic_year_id=academic_year_id,
         status=TuitionPayment.PaymentStatus.COMPLETED,
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+    ).aggregate(total=Sum('amount'), last=Max('payment_date'))
 
     # Resolve objects through the locked row to avoid extra caller assumptions.
     balance.total_due = _total_due(balance.student, balance.academic_year)
-    balance.total_paid = total_paid
-    balance.save(update_fields=['total_due', 'total_paid', 'updated_at'])
+    balance.total_paid = ledger['total'] or Decimal('0.00')
+    balance.last_payment_date = ledger['last']
+    balance.save(update_fields=['total_due', 'total_paid', 'last_payment_date', 'updated_at'])
     return balance
 
 
@@ -85,3 +70,123 @@ def reconcile_balance_pairs(*pairs):
         seen.add(key)
         balances.append(reconcile_student_balance(student, academic_year))
     return balances
+
+
+@transaction.atomic
+def reconcile_academic_year(academic_year, *, student_ids=None, dry_run=False):
+    """
+    Rebuild every cached balance of one academic year with set-based queries.
+
+    Payments are summed with one grouped aggregate, fees come from the
+    cached fee matrix and only drifted rows are written back. Enrolled or paying
+    students without a balance row get one. student_ids narrows the run to
+    those students, e.g. the ones touched by an import. Returns a drift report.
+    """
+    academic_year_id = getattr(academic_year, 'pk', academic_year)
+    if student_ids is not None:
+        student_ids = {getattr(student, 'pk', student) for student in student_ids}
+
+    payments = TuitionPayment.objects.filter(
+        academic_year_id=academic_year_id,
+        status=TuitionPayment.PaymentStatus.COMPLETED,
+    )
+    balance_rows = StudentBalance.objects.filter(academic_year_id=academic_year_id)
+    if student_ids is not None:
+        payments = payments.filter(student_id__in=student_ids)
+        balance_rows = balance_rows.filter(student_id__in=student_ids)
+
+    ledger_by_student = {
+        student_id: (total, last)
+        for student_id, total, last in payments.order_by().values('student_id').annotate(
+            total=Sum('amount'), last=Max('payment_date'),
+        ).values_list('student_id', 'total', 'last')
+    }
+    fee_resolver = FeeResolver(academic_year_id)
+    enrolled_levels = fee_resolver.enrolled_levels(student_ids)
+
+    balances = list(
+        balance_rows.select_for_update(of=('self',)).select_related('student').only(
+            'id', 'student_id', 'academic_year_id', 'total_due', 'total_paid',
+            'last_payment_date', 'student__program_id', 'student__current_level_id',
+        )
+    )
+
+    def expected(student_id, program_id, current_level_id):
+        level_id = enrolled_levels.get(student_id, current_level_id)
+        total_paid, last_payment_date = ledger_by_student.get(student_id, (None, None))
+        return (
+            fee_resolver.total_due(program_id, level_id),
+            total_paid or Decimal('0.00'),
+            last_payment_date,
+        )
+
+    now = timezone.now()
+    drifted = []
+    report = {
+        'academic_year': academic_year_id,
+        'checked': len(balances),
+        'drifted': [],
+        'created': 0,
+        'total_due_drift': Decimal('0.00'),
+        'total_paid_drift': Decimal('0.00'),
+    }
+    for balance in balances:
+        total_due, total_paid, last_payment_date = expected(
+            balance.student_id,
+            balance.student.program_id,
+            balance.student.current_level_id,
+        )
+        if balance.total_due == total_due and balance.total_paid == total_paid:
+            if balance.last_payment_date != last_payment_date:
+                balance.last_payment_date = last_payment_date
+                balance.updated_at = now
+                drifted.append(balance)
+            continue
+        report['drifted'].append({
+            'student': balance.student_id,
+            'total_due': (balance.total_due, total_due),
+            'total_paid': (balance.total_paid, total_paid),
+        })
+        report['total_due_drift'] += total_due - balance.total_due
+        report['total_paid_drift'] += total_paid - balance.total_paid
+        balance.total_due = total_due
+        balance.total_paid = total_paid
+        balance.last_payment_date = last_payment_date
+        balance.updated_at = now
+        drifted.append(balance)
+
+    known = {balance.student_id for balance in balances}
+    missing_ids = (set(enrolled_levels) | set(ledger_by_student)) - known
+    missing = [
+        StudentBalance(
+            student_id=student_id,
+            academic_year_id=academic_year_id,
+            total_due=total_due,
+            total_paid=total_paid,
+            last_payment_date=last_payment_date,
+        )
+        for student_id, program_id, current_level_id in Student.objects.filter(
+            pk__in=missing_ids,
+        ).values_list('id', 'program_id', 'current_level_id')
+        for total_due, total_paid, last_payment_date in [
+            expected(student_id, program_id, current_level_id)
+        ]
+    ]
+    report['created'] = len(missing)
+
+    if not dry_run:
+        StudentBalance.objects.bulk_update(
+            drifted,
+            ['total_due', 'total_paid', 'last_payment_date', 'updated_at'],
+            batch_size=500,
+        )
+        # Concurrent single-pair reconciliation may have created some rows.
+        StudentBalance.objects.bulk_create(
+            missing, batch_size=500, ignore_conflicts=True,
+        )
+        # Bulk writes skip the StudentBalance signals that expire cached
+        # reports and keep the outstanding rollup.
+        if drifted or missing:
+            bump_balances_version()
+            rebuild_balance_rollup(academic_year_id)
+    return report
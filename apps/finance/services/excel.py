@@ -1,12 +1,18 @@
 import io
+import uuid
+from collections import defaultdict
 from datetime import datetime, date
-from decimal import Decimal
-from openpyxl import Workbook, load_workbook
+from decimal import Decimal, InvalidOperation
+from openpyxl import Workbook
 from django.utils import timezone
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from ..models import TuitionPayment, Salary, Expense
-from .balances import reconcile_student_balance
+from .balances import reconcile_academic_year
+from .rollups import record_rollups
+from apps.audit.signals import audit_bulk_create
+from apps.core.services.export import EXPORT_CHUNK_SIZE, write_xlsx
+from apps.core.services.imports import ImportFileError, SpreadsheetReader
 from apps.students.models import Student
 from apps.university.models import Level, AcademicYear
 from django.contrib.auth import get_user_model
@@ -14,6 +20,61 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
+def _parse_date(value):
+    """Parse an Excel cell into a date; returns None when it is empty or unreadable."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y"):
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite() or amount <= 0:
+        raise ValidationError(f"Montant invalide: {value}")
+    return amount
+
+
+def _new_payment_references(count, today):
+    """Draw count PAY-YYYYMMDD-XXXXXX references unused in the batch and in the ledger."""
+    prefix = f"PAY-{today.strftime('%Y%m%d')}-"
+    references = set()
+    while len(references) < count:
+        drawn = {
+            f"{prefix}{uuid.uuid4().hex[:6].upper()}"
+            for _ in range(count - len(references))
+        } - references
+        drawn -= set(TuitionPayment.objects.filter(
+            reference__in=drawn,
+        ).values_list('reference', flat=True))
+        references |= drawn
+    return list(references)
+
+
+def _match_level(levels, name):
+    """Match a level name like the former iexact-then-icontains lookups, in memory."""
+    if not name:
+        return None
+    name = name.lower()
+    for level in levels:
+        if level.name.lower() == name:
+            return level
+    for level in levels:
+        if name in level.name.lower():
+            return level
+    return None
+
+
 class PaymentExcelService:
     """Service to handle Excel import/export for tuition payments."""
 
@@ -35,16 +96,12 @@ class PaymentExcelService:
     }
 
     @staticmethod
-    def export_payments(queryset):
-        """Export payments to an Excel workbook."""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Paiements"
-
-        ws.append(PaymentExcelService.HEADERS)
-
-        for payment in queryset.select_related('student__user', 'level'):
-            ws.append([
+    def export_rows(queryset):
+        """Yield one export row per payment, fetched in chunks."""
+        for payment in queryset.select_related('student__user', 'level').iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        ):
+            yield [
                 payment.student.student_id,
                 payment.student.user.get_full_name(),
                 float(payment.amount),
@@ -54,12 +111,14 @@ class PaymentExcelService:
                 payment.description,
                 payment.reference,
                 payment.get_status_display(),
-            ])
+            ]
 
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output
+    @staticmethod
+    def export_payments(queryset):
+        """Export payments to an Excel workbook."""
+        return write_xlsx(
+            PaymentExcelService.HEADERS, PaymentExcelService.export_rows(queryset), "Paiements"
+        )
 
     @staticmethod
     def download_template():
@@ -95,21 +154,56 @@ class PaymentExcelService:
         output.seek(0)
         return output
 
+    @staticmethod
+    def _payment_from_row(row, students, levels, academic_year, user, today):
+        # Headers: Matricule[0], Montant[1], Méthode[2],
+        #          Niveau[3], Date[4], Description[5]
+        matricule = str(row[0]).strip() if row[0] else None
+        amount_val = row[1]
+        method_raw = str(row[2]).strip().upper() if row[2] else 'CASH'
+        level_name = str(row[3]).strip() if row[3] else None
+        description = str(row[5]).strip() if row[5] and row[5] is not None else ''
+
+        if not matricule:
+            raise ValidationError("Le matricule est obligatoire.")
+
+        if not amount_val:
+            raise ValidationError("Le montant est obligatoire.")
+
+        amount = _parse_amount(amount_val)
+
+        student = students.get(matricule)
+        if student is None:
+            raise ValidationError(f"Étudiant avec matricule '{matricule}' introuvable.")
+
+        return TuitionPayment(
+            student=student,
+            academic_year=academic_year,
+            level=_match_level(levels, level_name),
+            amount=amount,
+            payment_method=PaymentExcelService.PAYMENT_METHODS.get(method_raw, 'CASH'),
+            status='COMPLETED',
+            description=description,
+            payment_date=_parse_date(row[4]) or today,
+            received_by=user,
+        )
+
     @staticmethod
     def import_payments(file_obj, user):
         """
-        Import payments from an Excel file.
+        Import payments from an Excel or CSV file.
+
+        The file is read in chunks; each chunk is validated in memory against
+        the students it references (one query per chunk) and the levels. The
+        valid rows are inserted with bulk_create in one transaction and each
+        affected balance is reconciled once.
         Returns (success_count, error_list)
         """
         try:
-            wb = load_workbook(file_obj, data_only=True)
-        except Exception as e:
-            return 0, [f"Format de fichier invalide: {str(e)}"]
-
-        ws = wb.active
-        rows = list(ws.iter_rows(min_row=2, values_only=True))
+            reader = SpreadsheetReader(file_obj, width=len(PaymentExcelService.IMPORT_HEADERS))
+        except ImportFileError as e:
+            return 0, [str(e)]
 
-        success_count = 0
         errors = []
 
         # Get current academic year
@@ -117,95 +211,49 @@ class PaymentExcelService:
         if not academic_year:
             academic_year = AcademicYear.objects.order_by('-start_date').first()
         if not academic_year:
+            reader.close()
             return 0, ["Aucune année académique trouvée."]
 
-        for row_idx, row in enumerate(rows, start=2):
-            if not any(row):
-                continue
+        levels = list(Level.objects.all())
+        today = timezone.now().date()
+        payments = []
 
-            try:
-                with transaction.atomic():
-                    # Headers: Matricule[0], Montant[1], Méthode[2],
-                    #          Niveau[3], Date[4], Description[5]
-
-                    matricule = str(row[0]).strip() if row[0] else None
-                    amount_val = row[1]
-                    method_raw = str(row[2]).strip().upper() if row[2] else 'CASH'
-                    level_name = str(row[3]).strip() if row[3] else None
-                    date_val = row[4]
-                    description = str(row[5]).strip() if row[5] and row[5] is not None else ''
-
-                    if not matricule:
-                        raise ValidationError("Le matricule est obligatoire.")
-
-                    if not amount_val:
-                        raise ValidationError("Le montant est obligatoire.")
-
-                    # Parse amount
-                    try:
-                        amount = Decimal(str(amount_val))
-                        if amount <= 0:
-                            raise ValueError()
-                    except (ValueError, Exception):
-                        raise ValidationError(f"Montant invalide: {amount_val}")
-
-                    # Find student
-                    try:
-                        student = Student.objects.get(student_id=matricule)
-                    except Student.DoesNotExist:
-                        raise ValidationError(f"Étudiant avec matricule '{matricule}' introuvable.")
-
-                    # Parse payment method
-                    payment_method = PaymentExcelService.PAYMENT_METHODS.get(method_raw, 'CASH')
-
-                    # Parse level
-                    level = None
-                    if level_name:
-                        level = Level.objects.filter(name__iexact=level_name).first()
-                        if not level:
-                            level = Level.objects.filter(name__icontains=level_name).first()
-
-                    # Parse date
-                    payment_date = None
-                    if date_val:
-                        if isinstance(date_val, (date, datetime)):
-                            payment_date = date_val.date() if isinstance(date_val, datetime) else date_val
-                        elif isinstance(date_val, str):
-                            for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y"):
-                                try:
-                                    payment_date = datetime.strptime(date_val, fmt).date()
-                                    break
-                                except ValueError:
-                                    continue
-                    if not payment_date:
-                        payment_date = timezone.now().date()
-
-                    # Generate reference
-                    import uuid
-                    reference = f"PAY-{timezone.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
-
-                    # Create payment
-                    payment = TuitionPayment.objects.create(
-                        student=student,
-                        academic_year=academic_year,
-                        level=level,
-                        amount=amount,
-                        payment_method=payment_method,
-                        status='COMPLETED',
-                        reference=reference,
-                        description=description,
-                        payment_date=payment_date,
-                        received_by=user,
+        try:
+            with reader:
+                for chunk in reader.chunks():
+                    students = Student.objects.in_bulk(
+                        {str(row[0]).strip() for _, row in chunk if row[0]},
+                        field_name='student_id',
                     )
+                    for row_idx, row in chunk:
+                        try:
+                            payments.append(PaymentExcelService._payment_from_row(
+                                row, students, levels, academic_year, user, today,
+                            ))
+                        except Exception as e:
+                            errors.append(f"Ligne {row_idx}: {str(e)}")
+        except ImportFileError as e:
+            return 0, [str(e)]
+
+        if not payments:
+            return 0, errors
+
+        for payment, reference in zip(payments, _new_payment_references(len(payments), today)):
+            payment.reference = reference
 
-                    reconcile_student_balance(student, academic_year)
-
-                    success_count += 1
-
-            except Exception as e:
-                errors.append(f"Ligne {row_idx}: {str(e)}")
+        try:
+            with transaction.atomic():
+                created = TuitionPayment.objects.bulk_create(payments, batch_size=500)
+                # bulk_create sends no post_save: maintain the derived data here.
+                record_rollups(added=created)
+                reconcile_academic_year(
+                    academic_year, student_ids={payment.student_id for payment in created},
+                )
+                audit_bulk_create(TuitionPayment, created)
+        except Exception as e:
+            return 0, errors + [f"Import annulé: {str(e)}"]
 
-        return success_count, errors
+        return len(created), errors
 
 
 class SalaryExcelService:
@@ -221,16 +269,12 @@ class SalaryExcelService:
     ]
 
     @staticmethod
-    def export_salaries(queryset):
-        """Export salaries to an Excel workbook."""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Salaires"
-
-        ws.append(SalaryExcelService.HEADERS)
-
-        for salary in queryset.select_related('employee'):
-            ws.append([
+    def export_rows(queryset):
+        """Yield one export row per salary, fetched in chunks."""
+        for salary in queryset.select_related('employee').iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        ):
+            yield [
                 salary.employee.get_full_name(),
                 salary.employee.email,
                 salary.month,
@@ -241,12 +285,14 @@ class SalaryExcelService:
                 float(salary.net_salary),
                 salary.get_status_display(),
                 salary.payment_date,
-            ])
+            ]
 
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output
+    @staticmethod
+    def export_salaries(queryset):
+        """Export salaries to an Excel workbook."""
+        return write_xlsx(
+            SalaryExcelService.HEADERS, SalaryExcelService.export_rows(queryset), "Salaires"
+        )
 
     @staticmethod
     def download_template():
@@ -266,72 +312,113 @@ class SalaryExcelService:
         output.seek(0)
         return output
 
+    @staticmethod
+    def _salary_from_row(row, employees_by_email, taken, user):
+        # Headers: Email[0], Mois[1], Année[2], Base[3], Primes[4], Déductions[5]
+        email = str(row[0]).strip() if row[0] else None
+        month_val = row[1]
+        year_val = row[2]
+        base_val = row[3]
+        bonuses_val = row[4] if row[4] else 0
+        deductions_val = row[5] if row[5] else 0
+
+        if not email:
+            raise ValidationError("L'email est obligatoire.")
+        if not month_val or not year_val or not base_val:
+            raise ValidationError("Mois, Année et Salaire de base sont obligatoires.")
+
+        employees = employees_by_email.get(email)
+        if not employees:
+            raise ValidationError(f"Employé avec email '{email}' introuvable.")
+        if len(employees) > 1:
+            raise ValidationError(f"Plusieurs employés partagent l'email '{email}'.")
+        employee = employees[0]
+
+        month = int(month_val)
+        year = int(year_val)
+        base_salary = Decimal(str(base_val))
+        bonuses = Decimal(str(bonuses_val))
+        deductions = Decimal(str(deductions_val))
+
+        # Also rejects a second line for the same month in this file.
+        if (employee.pk, month, year) in taken:
+            raise ValidationError(f"Salaire déjà enregistré pour {employee.get_full_name()} {month}/{year}.")
+        taken.add((employee.pk, month, year))
+
+        return Salary(
+            employee=employee,
+            month=month,
+            year=year,
+            base_salary=base_salary,
+            bonuses=bonuses,
+            deductions=deductions,
+            net_salary=base_salary + bonuses - deductions,
+            status='PENDING',
+            processed_by=user,
+        )
+
     @staticmethod
     def import_salaries(file_obj, user):
-        """Import salaries from an Excel file. Returns (success_count, error_list)"""
-        try:
-            wb = load_workbook(file_obj, data_only=True)
-        except Exception as e:
-            return 0, [f"Format de fichier invalide: {str(e)}"]
+        """
+        Import salaries from an Excel or CSV file with one bulk insert.
 
-        ws = wb.active
-        rows = list(ws.iter_rows(min_row=2, values_only=True))
+        Employees and already recorded salaries are loaded once per chunk.
+        Returns (success_count, error_list)
+        """
+        try:
+            reader = SpreadsheetReader(file_obj, width=len(SalaryExcelService.IMPORT_HEADERS))
+        except ImportFileError as e:
+            return 0, [str(e)]
 
-        success_count = 0
         errors = []
+        taken = set()
+        salaries = []
 
-        for row_idx, row in enumerate(rows, start=2):
-            if not any(row):
-                continue
-
-            try:
-                with transaction.atomic():
-                    # Headers: Email[0], Mois[1], Année[2], Base[3], Primes[4], Déductions[5]
-                    email = str(row[0]).strip() if row[0] else None
-                    month_val = row[1]
-                    year_val = row[2]
-                    base_val = row[3]
-                    bonuses_val = row[4] if row[4] else 0
-                    deductions_val = row[5] if row[5] else 0
-
-                    if not email:
-                        raise ValidationError("L'email est obligatoire.")
-                    if not month_val or not year_val or not base_val:
-                        raise ValidationError("Mois, Année et Salaire de base sont obligatoires.")
-
-                    try:
-                        employee = User.objects.get(email=email)
-                    except User.DoesNotExist:
-                        raise ValidationError(f"Employé avec email '{email}' introuvable.")
-
-                    month = int(month_val)
-                    year = int(year_val)
-                    base_salary = Decimal(str(base_val))
-                    bonuses = Decimal(str(bonuses_val))
-                    deductions = Decimal(str(deductions_val))
-                    net_salary = base_salary + bonuses - deductions
-
-                    if Salary.objects.filter(employee=employee, month=month, year=year).exists():
-                        raise ValidationError(f"Salaire déjà enregistré pour {employee.get_full_name()} {month}/{year}.")
-
-                    Salary.objects.create(
-                        employee=employee,
-                        month=month,
-                        year=year,
-                        base_salary=base_salary,
-                        bonuses=bonuses,
-                        deductions=deductions,
-                        net_salary=net_salary,
-                        status='PENDING',
-                        processed_by=user,
-                    )
-
-                    success_count += 1
+        try:
+            with reader:
+                for chunk in reader.chunks():
+                    employees_by_email = defaultdict(list)
+                    for employee in User.objects.filter(
+                        email__in={str(row[0]).strip() for _, row in chunk if row[0]},
+                    ):
+                        employees_by_email[employee.email].append(employee)
+                    years = set()
+                    for _, row in chunk:
+                        try:
+                            years.add(int(row[2]))
+                        except (TypeError, ValueError):
+                            continue
+                    taken.update(Salary.objects.filter(
+                        employee__in=[
+                            employee
+                            for employees in employees_by_email.values()
+                            for employee in employees
+                        ],
+                        year__in=years,
+                    ).values_list('employee_id', 'month', 'year'))
+
+                    for row_idx, row in chunk:
+                        try:
+                            salaries.append(SalaryExcelService._salary_from_row(
+                                row, employees_by_email, taken, user,
+                            ))
+                        except Exception as e:
+                            errors.append(f"Ligne {row_idx}: {str(e)}")
+        except ImportFileError as e:
+            return 0, [str(e)]
+
+        if not salaries:
+            return 0, errors
 
-            except Exception as e:
-                errors.append(f"Ligne {row_idx}: {str(e)}")
+        try:
+            with transaction.atomic():
+                created = Salary.objects.bulk_create(salaries, batch_size=500)
+                record_rollups(added=created)
+                audit_bulk_create(Salary, created)
+        except Exception as e:
+            return 0, errors + [f"Import annulé: {str(e)}"]
 
-        return success_count, errors
+        return len(created), errors
 
 
 class ExpenseExcelService:
@@ -355,27 +442,25 @@ class ExpenseExcelService:
     }
 
     @staticmethod
-    def export_expenses(queryset):
-        """Export expenses to an Excel workbook."""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Dépenses"
-
-        ws.append(ExpenseExcelService.HEADERS)
-
-        for expense in queryset.select_related('created_by'):
-            ws.append([
+    def export_rows(queryset):
+        """Yield one export row per expense, fetched in chunks."""
+        for expense in queryset.select_related('created_by').iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        ):
+            yield [
                 expense.date,
                 expense.get_category_display(),
                 expense.description,
                 float(expense.amount),
                 expense.created_by.get_full_name() if expense.created_by else '',
-            ])
+            ]
 
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output
+    @staticmethod
+    def export_expenses(queryset):
+        """Export expenses to an Excel workbook."""
+        return write_xlsx(
+            ExpenseExcelService.HEADERS, ExpenseExcelService.export_rows(queryset), "Dépenses"
+        )
 
     @staticmethod
     def download_template():
@@ -407,71 +492,64 @@ class ExpenseExcelService:
         output.seek(0)
         return output
 
+    @staticmethod
+    def _expense_from_row(row, user, today):
+        # Headers: Date[0], Catégorie[1], Description[2], Montant[3]
+        category_raw = str(row[1]).strip().upper() if row[1] else None
+        description = str(row[2]).strip() if row[2] else ''
+        amount_val = row[3]
+
+        if not category_raw:
+            raise ValidationError("La catégorie est obligatoire.")
+        if not amount_val:
+            raise ValidationError("Le montant est obligatoire.")
+
+        category = ExpenseExcelService.CATEGORIES.get(category_raw)
+        if not category:
+            raise ValidationError(f"Catégorie invalide: {category_raw}. Valeurs: SALARIES, UTILITIES, MAINTENANCE, EQUIPMENT, SUPPLIES, OTHER")
+
+        return Expense(
+            date=_parse_date(row[0]) or today,
+            category=category,
+            description=description,
+            amount=_parse_amount(amount_val),
+            created_by=user,
+        )
+
     @staticmethod
     def import_expenses(file_obj, user):
-        """Import expenses from an Excel file. Returns (success_count, error_list)"""
+        """
+        Import expenses from an Excel or CSV file with one bulk insert.
+        Returns (success_count, error_list)
+        """
         try:
-            wb = load_workbook(file_obj, data_only=True)
-        except Exception as e:
-            return 0, [f"Format de fichier invalide: {str(e)}"]
-
-        ws = wb.active
-        rows = list(ws.iter_rows(min_row=2, values_only=True))
+            reader = SpreadsheetReader(file_obj, width=len(ExpenseExcelService.IMPORT_HEADERS))
+        except ImportFileError as e:
+            return 0, [str(e)]
 
-        success_count = 0
         errors = []
+        today = timezone.now().date()
+        expenses = []
 
-        for row_idx, row in enumerate(rows, start=2):
-            if not any(row):
-                continue
-
-            try:
-                with transaction.atomic():
-                    # Headers: Date[0], Catégorie[1], Description[2], Montant[3]
-                    date_val = row[0]
-                    category_raw = str(row[1]).strip().upper() if row[1] else None
-                    description = str(row[2]).strip() if row[2] else ''
-                    amount_val = row[3]
-
-                    if not category_raw:
-                        raise ValidationError("La catégorie est obligatoire.")
-                    if not amount_val:
-                        raise ValidationError("Le montant est obligatoire.")
-
-                    category = ExpenseExcelService.CATEGORIES.get(category_raw)
-                    if not category:
-                        raise ValidationError(f"Catégorie invalide: {category_raw}. Valeurs: SALARIES, UTILITIES, MAINTENANCE, EQUIPMENT, SUPPLIES, OTHER")
-
-                    amount = Decimal(str(amount_val))
-                    if amount <= 0:
-                        raise ValidationError(f"Montant invalide: {amount_val}")
-
-                    # Parse date
-                    expense_date = None
-                    if date_val:
-                        if isinstance(date_val, (date, datetime)):
-                            expense_date = date_val.date() if isinstance(date_val, datetime) else date_val
-                        elif isinstance(date_val, str):
-                            for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y"):
-                                try:
-                                    expense_date = datetime.strptime(date_val, fmt).date()
-                                    break
-                                except ValueError:
-                                    continue
-                    if not expense_date:
-                        expense_date = timezone.now().date()
-
-                    Expense.objects.create(
-                        date=expense_date,
-                        category=category,
-                        description=description,
-                        amount=amount,
-                        created_by=user,
-                    )
+        try:
+            with reader:
+                for row_idx, row in reader.rows():
+                    try:
+                        expenses.append(ExpenseExcelService._expense_from_row(row, user, today))
+                    except Exception as e:
+                        errors.append(f"Ligne {row_idx}: {str(e)}")
+        except ImportFileError as e:
+            return 0, [str(e)]
 
-                    success_count += 1
+        if not expenses:
+            return 0, errors
 
-            except Exception as e:
-                errors.append(f"Ligne {row_idx}: {str(e)}")
+        try:
+            with transaction.atomic():
+                created = Expense.objects.bulk_create(expenses, batch_size=500)
+                record_rollups(added=created)
+                audit_bulk_create(Expense, created)
+        except Exception as e:
+            return 0, errors + [f"Import annulé: {str(e)}"]
 
-        return success_count, errors
+        return len(created), errors
@@ -0,0 +1,122 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from apps.students.models import Enrollment, Student
+from apps.university.models import CacheVersion, Program, ProgramFee
+
+from ..models import TuitionFee
+
+FEE_CACHE_TIMEOUT = 60 * 60
+FEES_VERSION_KEY = 'finance:fees-version'
+
+
+def fees_version():
+    return CacheVersion.current(FEES_VERSION_KEY)
+
+
+def bump_fees_version():
+    """Expire the cached fee tables of every process after a fee, program or year write."""
+    CacheVersion.bump(FEES_VERSION_KEY)
+
+
+def get_fee_matrix(academic_year_id, version=None):
+    """Return the cached {(program_id, level_id): amount} fee tables of a year."""
+    cache_key = f'finance:fee-matrix:v2:{academic_year_id}:{version or fees_version()}'
+    matrix = cache.get(cache_key)
+    if matrix is None:
+        matrix = {
+            'tuition': {
+                (program_id, level_id): amount
+                for program_id, level_id, amount in TuitionFee.objects.filter(
+                    academic_year_id=academic_year_id,
+                ).values_list('program_id', 'level_id', 'amount')
+            },
+            'program': {
+                (program_id, level_id): amount
+                for program_id, level_id, amount in ProgramFee.objects.filter(
+                    academic_year_id=academic_year_id,
+                ).values_list('program_id', 'level_id', 'amount')
+            },
+        }
+        cache.set(cache_key, matrix, timeout=FEE_CACHE_TIMEOUT)
+    return matrix
+
+
+def get_program_fees(version=None):
+    """Return the cached {program_id: Program.tuition_fee} defaults."""
+    cache_key = f'finance:program-fees:v2:{version or fees_version()}'
+    fees = cache.get(cache_key)
+    if fees is None:
+        fees = dict(Program.objects.order_by().values_list('id', 'tuition_fee'))
+        cache.set(cache_key, fees, timeout=FEE_CACHE_TIMEOUT)
+    return fees
+
+
+class FeeResolver:
+    """
+    Resolve the tuition due for a (program, level) in one academic year.
+
+    Lookup order: level-specific TuitionFee, level-specific ProgramFee,
+    program-wide TuitionFee, then Program.tuition_fee. Every lookup is served
+    from the cached fee matrix, so a resolver costs one version query once
+    warm and none per student.
+    """
+
+    def __init__(self, academic_year):
+        self.academic_year_id = getattr(academic_year, 'pk', academic_year)
+        version = fees_version()
+        matrix = (
+            get_fee_matrix(self.academic_year_id, version)
+            if self.academic_year_id else {'tuition': {}, 'program': {}}
+        )
+        self.tuition_fees = matrix['tuition']
+        self.program_fees = matrix['program']
+        self.default_fees = get_program_fees(version)
+
+    def total_due(self, program, level):
+        program_id = getattr(program, 'pk', program)
+        level_id = getattr(level, 'pk', level)
+        for amount in (
+            self.tuition_fees.get((program_id, level_id)),
+            self.program_fees.get((program_id, level_id)),
+            self.tuition_fees.get((program_id, None)),
+            self.default_fees.get(program_id),
+        ):
+            if amount is not None:
+                return amount
+        return Decimal('0.00')
+
+    def enrolled_levels(self, student_ids=None):
+        """Map student id -> level id of the active enrollment in this year."""
+        enrollments = Enrollment.objects.filter(
+            academic_year_id=self.academic_year_id,
+            is_active=True,
+        )
+        if student_ids is not None:
+            enrollments = enrollments.filter(student_id__in=student_ids)
+        return dict(enrollments.order_by().values_list('student_id', 'level_id'))
+
+    def total_due_for_students(self, students):
+        """
+        Resolve many students at once as {student_id: amount}.
+
+        Accepts Student instances or ids. The level comes from the active
+        enrollment of the year, falling back to the student's current level.
+        """
+        students = list(students)
+        student_ids = [getattr(student, 'pk', student) for student in students]
+        if all(isinstance(student, Student) for student in students):
+            rows = [
+                (student.pk, student.program_id, student.current_level_id)
+                for student in students
+            ]
+        else:
+            rows = Student.objects.filter(pk__in=student_ids).values_list(
+                'id', 'program_id', 'current_level_id',
+            )
+        levels = self.enrolled_levels(student_ids)
+        return {
+            student_id: self.total_due(program_id, levels.get(student_id, level_id))
+            for student_id, program_id, level_id in rows
+        }
@@ -0,0 +1,164 @@
+import calendar
+import copy
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from apps.audit.signals import audit_bulk_create, audit_bulk_update
+from apps.teachers.models import TeacherContract
+
+from ..models import Salary
+from .rollups import record_rollups
+
+User = get_user_model()
+
+PAYROLL_ROLES = [
+    User.Role.TEACHER,
+    User.Role.ADMIN,
+    User.Role.DEAN,
+    User.Role.ACCOUNTANT,
+    User.Role.SECRETARY,
+]
+
+
+def payroll_terms(month, year):
+    """
+    Return {employee_id: (base_salary, bonuses, deductions)} for a payroll month.
+
+    Every active staff user starts from their latest salary; a teacher with an
+    active contract covering the month is paid the contract base salary
+    instead. Users without either have no terms and are left out.
+    """
+    period_start = date(year, month, 1)
+    period_end = date(year, month, calendar.monthrange(year, month)[1])
+
+    latest_salary = Salary.objects.filter(
+        employee=OuterRef('pk'),
+    ).order_by('-year', '-month').values('pk')[:1]
+    employees = User.objects.filter(
+        is_active=True, role__in=PAYROLL_ROLES,
+    ).annotate(latest_salary_id=Subquery(latest_salary)).values_list('pk', 'latest_salary_id')
+    employee_ids = set()
+    salary_ids = []
+    for employee_id, salary_id in employees:
+        employee_ids.add(employee_id)
+        if salary_id:
+            salary_ids.append(salary_id)
+
+    terms = {
+        employee_id: (base_salary, bonuses, deductions)
+        for employee_id, base_salary, bonuses, deductions in Salary.objects.filter(
+            pk__in=salary_ids,
+        ).values_list('employee_id', 'base_salary', 'bonuses', 'deductions')
+    }
+
+    # Ordered by start date so the most recent contract of a teacher wins.
+    contracts = TeacherContract.objects.filter(
+        status=TeacherContract.ContractStatus.ACTIVE,
+        teacher__is_active=True,
+        teacher__user_id__in=employee_ids,
+        start_date__lte=period_end,
+    ).filter(
+        Q(end_date__isnull=True) | Q(end_date__gte=period_start),
+    ).order_by('start_date').values_list('teacher__user_id', 'base_salary')
+    for employee_id, base_salary in contracts:
+        terms[employee_id] = (base_salary, Decimal('0.00'), Decimal('0.00'))
+    return terms
+
+
+PAYROLL_INSERT_ATTEMPTS = 3
+
+
+@transaction.atomic
+def generate_payroll(month, year, processed_by=None):
+    """
+    Create the PENDING salaries of one month for every employee with terms.
+
+    Salaries that already exist for the month are left untouched: the
+    (employee, month, year) keys already taken are diffed out before one
+    bulk_create inserts the rest, so the count and the audit cover exactly
+    the rows this run created. If a concurrent run inserts some of them
+    first, the insert is rolled back and the diff taken again.
+    Returns {'created', 'skipped', 'total_net'}.
+    """
+    terms = payroll_terms(month, year)
+    for attempt in range(PAYROLL_INSERT_ATTEMPTS):
+        existing = set(Salary.objects.filter(
+            month=month, year=year, employee_id__in=terms,
+        ).values_list('employee_id', flat=True))
+        salaries = [
+            Salary(
+                employee_id=employee_id,
+                month=month,
+                year=year,
+                base_salary=base_salary,
+                bonuses=bonuses,
+                deductions=deductions,
+                net_salary=base_salary + bonuses - deductions,
+                status=Salary.PaymentStatus.PENDING,
+                processed_by=processed_by,
+            )
+            for employee_id, (base_salary, bonuses, deductions) in terms.items()
+            if employee_id not in existing
+        ]
+        try:
+            with transaction.atomic():
+                Salary.objects.bulk_create(salaries, batch_size=500)
+            break
+        except IntegrityError:
+            if attempt == PAYROLL_INSERT_ATTEMPTS - 1:
+                raise
+
+    if salaries:
+        # The audit labels a salary with its employee; load them in one query.
+        employees = User.objects.in_bulk([salary.employee_id for salary in salaries])
+        for salary in salaries:
+            salary.employee = employees[salary.employee_id]
+        audit_bulk_create(Salary, salaries)
+    return {
+        'created': len(salaries),
+        'skipped': len(existing),
+        'total_net': sum((salary.net_salary for salary in salaries), Decimal('0.00')),
+    }
+
+
+@transaction.atomic
+def pay_salaries(queryset, payment_date=None):
+    """
+    Mark the PENDING salaries of queryset as PAID with one UPDATE.
+
+    The rows are locked and read once so the rollups can move them to the
+    PAID bucket of the payment month. Returns the number of salaries paid.
+    """
+    payment_date = payment_date or timezone.now().date()
+    pending = list(
+        Salary.objects.select_for_update(of=('self',)).select_related('employee').filter(
+            pk__in=queryset.values('pk'),
+            status=Salary.PaymentStatus.PENDING,
+        )
+    )
+    if not pending:
+        return 0
+
+    now = timezone.now()
+    Salary.objects.filter(pk__in=[salary.pk for salary in pending]).update(
+        status=Salary.PaymentStatus.PAID,
+        payment_date=payment_date,
+        updated_at=now,
+    )
+
+    paid = []
+    for salary in pending:
+        row = copy.copy(salary)
+        row.status = Salary.PaymentStatus.PAID
+        row.payment_date = payment_date
+        row.updated_at = now
+        paid.append(row)
+    # The UPDATE sends no signals: move the rollups and audit the change here.
+    record_rollups(added=paid, removed=pending)
+    audit_bulk_update(Salary, paid)
+    return len(paid)
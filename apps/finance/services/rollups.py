@@ -0,0 +1,326 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from ..models import Expense, MonthlyFinanceRollup, Salary, StudentBalance, TuitionPayment
+
+Source = MonthlyFinanceRollup.Source
+ROLLUP_UPSERT = {
+    'update_conflicts': True,
+    'unique_fields': ['bucket'],
+    'update_fields': ['amount', 'count', 'updated_at'],
+}
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(value):
+    return month_start(month_start(value) + timedelta(days=32))
+
+
+def _rollup(key, amount, count):
+    """Unsaved rollup row of a bucket; bulk_create does not call save(), which sets bucket."""
+    return MonthlyFinanceRollup(
+        **key, amount=amount, count=count,
+        bucket=MonthlyFinanceRollup.bucket_key(*_key_tuple(key)),
+    )
+
+
+def _balance_key(academic_year_id):
+    return {
+        'source': Source.BALANCE, 'academic_year_id': academic_year_id,
+        'period': None, 'category': '', 'method': '', 'status': '',
+    }
+
+
+def _contribution(instance):
+    """Return (rollup key, amount) for one ledger row, or None if it is not rolled up."""
+    if instance is None:
+        return None
+    if isinstance(instance, TuitionPayment):
+        if not instance.payment_date:
+            return None
+        key = {
+            'source': Source.TUITION,
+            'academic_year_id': instance.academic_year_id,
+            'period': month_start(instance.payment_date),
+            'category': '',
+            'method': instance.payment_method,
+            'status': instance.status,
+        }
+        return key, instance.amount
+    if isinstance(instance, Salary):
+        # The dashboard books salaries on the month they were actually paid.
+        if not instance.payment_date:
+            return None
+        key = {
+            'source': Source.SALARY,
+            'academic_year_id': None,
+            'period': month_start(instance.payment_date),
+            'category': '',
+            'method': '',
+            'status': instance.status,
+        }
+        return key, instance.net_salary
+    if isinstance(instance, Expense):
+        key = {
+            'source': Source.EXPENSE,
+            'academic_year_id': None,
+            'period': month_start(instance.date),
+            'category': instance.category,
+            'method': '',
+            'status': '',
+        }
+        return key, instance.amount
+    if isinstance(instance, StudentBalance):
+        key = _balance_key(instance.academic_year_id)
+        return key, (instance.total_due or 0) - (instance.total_paid or 0)
+    return None
+
+
+def _key_tuple(key):
+    return tuple(key[field] for field in (
+        'source', 'academic_year_id', 'period', 'category', 'method', 'status',
+    ))
+
+
+@transaction.atomic
+def record_rollups(added=(), removed=()):
+    """
+    Apply the contribution of added ledger rows and withdraw removed ones.
+
+    Rows are grouped per bucket first, and an update that stays in its
+    bucket with the same amount writes nothing. The buckets are created if
+    missing, locked, then upserted in one statement, so a bulk import costs
+    three queries. Bulk writes that bypass model signals must call this.
+    """
+    deltas = {}
+    for sign, instances in ((1, added), (-1, removed)):
+        for instance in instances:
+            contribution = _contribution(instance)
+            if contribution is None:
+                continue
+            key, amount = contribution
+            bucket = MonthlyFinanceRollup.bucket_key(*_key_tuple(key))
+            delta = deltas.setdefault(bucket, [key, Decimal('0.00'), 0])
+            delta[1] += sign * (amount or Decimal('0.00'))
+            delta[2] += sign
+    deltas = {bucket: delta for bucket, delta in deltas.items() if delta[1] or delta[2]}
+    if not deltas:
+        return
+
+    # Every bucket gets its row first so the lock below covers new buckets
+    # too: concurrent writers of a bucket queue up instead of overwriting.
+    MonthlyFinanceRollup.objects.bulk_create(
+        [_rollup(key, Decimal('0.00'), 0) for key, _, _ in deltas.values()],
+        ignore_conflicts=True,
+    )
+    current = {
+        row.bucket: row
+        for row in MonthlyFinanceRollup.objects.select_for_update().filter(bucket__in=deltas)
+    }
+    MonthlyFinanceRollup.objects.bulk_create([
+        _rollup(key, current[bucket].amount + amount, current[bucket].count + count)
+        for bucket, (key, amount, count) in deltas.items()
+    ], **ROLLUP_UPSERT)
+
+
+@transaction.atomic
+def rebuild_balance_rollup(academic_year_id):
+    """
+    Re-aggregate the outstanding balances of one year.
+
+    For bulk balance writes whose rows cannot be diffed, such as inserts
+    that ignore conflicts. The bucket is locked before the aggregate, so a
+    concurrent record_rollups delta lands after it instead of being lost.
+    """
+    key = _balance_key(academic_year_id)
+    bucket = MonthlyFinanceRollup.bucket_key(*_key_tuple(key))
+    MonthlyFinanceRollup.objects.bulk_create(
+        [_rollup(key, Decimal('0.00'), 0)], ignore_conflicts=True,
+    )
+    MonthlyFinanceRollup.objects.select_for_update().filter(bucket=bucket).get()
+    totals = StudentBalance.objects.filter(academic_year_id=academic_year_id).aggregate(
+        total=Sum(F('total_due') - F('total_paid')), total_count=Count('id'),
+    )
+    MonthlyFinanceRollup.objects.bulk_create(
+        [_rollup(key, totals['total'] or Decimal('0.00'), totals['total_count'])],
+        **ROLLUP_UPSERT,
+    )
+
+
+def _aggregate_source(source, exclude_periods=(), date_ranges=None):
+    """
+    Aggregate one ledger into unsaved rollup rows.
+
+    exclude_periods skips whole months; date_ranges, a list of (start, end)
+    dates, keeps only the rows dated inside one of them.
+    """
+    if source == Source.BALANCE:
+        rows = StudentBalance.objects.order_by().values('academic_year_id').annotate(
+            total=Sum(F('total_due') - F('total_paid')), total_count=Count('id'),
+        )
+        for row in rows:
+            yield _rollup(
+                _balance_key(row['academic_year_id']),
+                row['total'] or Decimal('0.00'), row['total_count'],
+            )
+        return
+
+    if source == Source.TUITION:
+        queryset = TuitionPayment.objects.exclude(payment_date__isnull=True)
+        date_field, fields, amount_field = (
+            'payment_date', ('academic_year_id', 'payment_method', 'status'), 'amount',
+        )
+    elif source == Source.SALARY:
+        queryset = Salary.objects.exclude(payment_date__isnull=True)
+        date_field, fields, amount_field = 'payment_date', ('status',), 'net_salary'
+    else:
+        queryset = Expense.objects.all()
+        date_field, fields, amount_field = 'date', ('category',), 'amount'
+    queryset = queryset.annotate(period=TruncMonth(date_field))
+
+    if exclude_periods:
+        queryset = queryset.exclude(period__in=exclude_periods)
+    if date_ranges is not None:
+        queryset = queryset.filter(reduce(or_, (
+            Q(**{f'{date_field}__range': date_range}) for date_range in date_ranges
+        ), Q(pk__in=[])))
+    rows = queryset.order_by().values('period', *fields).annotate(
+        total=Sum(amount_field), total_count=Count('id'),
+    )
+    for row in rows:
+        key = {
+            'source': source,
+            'academic_year_id': row.get('academic_year_id'),
+            'period': month_start(row['period']),
+            'category': row.get('category', ''),
+            'method': row.get('payment_method', ''),
+            'status': row.get('status', ''),
+        }
+        yield _rollup(key, row['total'] or Decimal('0.00'), row['total_count'])
+
+
+@transaction.atomic
+def rebuild_rollups(include_closed=False):
+    """
+    Re-aggregate the rollup table from the ledgers.
+
+    Months before the current one that already have rollups are closed and
+    kept as-is unless include_closed is set; they only move through
+    record_rollups deltas. Outstanding balances have no month and are always
+    rebuilt. Rebuilt buckets are upserted and emptied ones deleted, so
+    readers never see a missing bucket. Returns {source: rebuilt row count}.
+    """
+    current_month = month_start(timezone.localdate())
+    rebuilt = {}
+    for source in Source.values:
+        existing = MonthlyFinanceRollup.objects.filter(source=source)
+        closed = set() if include_closed else set(
+            existing.filter(period__lt=current_month).values_list('period', flat=True)
+        )
+        rows = list(_aggregate_source(source, closed))
+        MonthlyFinanceRollup.objects.bulk_create(rows, batch_size=500, **ROLLUP_UPSERT)
+        existing.exclude(period__in=closed).exclude(
+            bucket__in=[row.bucket for row in rows],
+        ).delete()
+        rebuilt[source] = len(rows)
+    return rebuilt
+
+
+def year_months(academic_year):
+    """
+    Split the dates of an academic year into whole months and partial edges.
+
+    Returns (first_month, last_month, edges): the whole months run from
+    first_month to last_month (none if first_month is later), and edges are
+    the (start, end) date ranges of the months the year only partly covers.
+    """
+    start, end = academic_year.start_date, academic_year.end_date
+    first_month = start if start.day == 1 else next_month(start)
+    last_month = month_start(end)
+    if next_month(end) - timedelta(days=1) != end:
+        last_month = month_start(last_month - timedelta(days=1))
+    if first_month > last_month:
+        return first_month, last_month, [(start, end)]
+    edges = []
+    if start < first_month:
+        edges.append((start, first_month - timedelta(days=1)))
+    if end >= next_month(last_month):
+        edges.append((next_month(last_month), end))
+    return first_month, last_month, edges
+
+
+def dashboard_rollups(academic_year):
+    """
+    Load the finance dashboard figures of one academic year from the rollups.
+
+    Tuition and outstanding balances are attributed by academic year,
+    salaries and expenses by date within the year: its whole months come from
+    one query over the rollup table, and a year that starts or ends mid-month
+    adds one live query per ledger for those partial months.
+    """
+    first_month, last_month, edges = year_months(academic_year)
+    by_year = Q(source__in=[Source.TUITION, Source.BALANCE], academic_year=academic_year)
+    if first_month <= last_month:
+        by_year |= Q(
+            source__in=[Source.SALARY, Source.EXPENSE],
+            period__range=(first_month, last_month),
+        )
+    rows = list(MonthlyFinanceRollup.objects.filter(by_year).order_by())
+    if edges:
+        for source in (Source.SALARY, Source.EXPENSE):
+            rows += _aggregate_source(source, date_ranges=edges)
+
+    summary = {
+        'total_tuition': Decimal('0.00'),
+        'total_salaries': Decimal('0.00'),
+        'total_expenses': Decimal('0.00'),
+        'outstanding_balances': Decimal('0.00'),
+        'pending_payments': 0,
+        'monthly_revenue': defaultdict(Decimal),
+        'monthly_salaries': defaultdict(Decimal),
+        'monthly_expenses': defaultdict(Decimal),
+        'expense_categories': defaultdict(lambda: [Decimal('0.00'), 0]),
+        'payment_methods': defaultdict(lambda: [Decimal('0.00'), 0]),
+        'payment_statuses': defaultdict(lambda: [Decimal('0.00'), 0]),
+    }
+    for row in rows:
+        if row.source == Source.BALANCE:
+            summary['outstanding_balances'] += row.amount
+            continue
+        month = row.period.strftime('%Y-%m')
+        if row.source == Source.TUITION:
+            status_bucket = summary['payment_statuses'][row.status]
+            status_bucket[0] += row.amount
+            status_bucket[1] += row.count
+            if row.status == TuitionPayment.PaymentStatus.PENDING:
+                summary['pending_payments'] += row.count
+            if row.status != TuitionPayment.PaymentStatus.COMPLETED:
+                continue
+            summary['total_tuition'] += row.amount
+            summary['monthly_revenue'][month] += row.amount
+            method_bucket = summary['payment_methods'][row.method]
+            method_bucket[0] += row.amount
+            method_bucket[1] += row.count
+        elif row.source == Source.SALARY:
+            if row.status != Salary.PaymentStatus.PAID:
+                continue
+            summary['total_salaries'] += row.amount
+            summary['monthly_salaries'][month] += row.amount
+        else:
+            summary['total_expenses'] += row.amount
+            summary['monthly_expenses'][month] += row.amount
+            category_bucket = summary['expense_categories'][row.category]
+            category_bucket[0] += row.amount
+            category_bucket[1] += row.count
+    return summary
@@ -1,14 +1,17 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from apps.students.models import Student
-from apps.finance.models import StudentBalance
-from apps.university.models import AcademicYear
+from apps.finance.models import Expense, Salary, StudentBalance, TuitionFee, TuitionPayment
+from apps.finance.services.aging import bump_balances_version
+from apps.finance.services.fees import FeeResolver, bump_fees_version
+from apps.finance.services.rollups import record_rollups
+from apps.university.models import AcademicYear, Program, ProgramFee
 
 @receiver(post_save, sender=Student)
 def create_student_balance(sender, instance, created, **kwargs):
     """
     Automatically create a StudentBalance record when a new Student is created.
-    Uses the current academic year and the student's program tuition fee.
+    Uses the current academic year and the fee resolved for the student's program and level.
     """
     if created and instance.program:
         current_year = AcademicYear.objects.filter(is_current=True).first()
@@ -17,7 +20,58 @@ def create_student_balance(sender, instance, created, **kwargs):
                 student=instance,
                 academic_year=current_year,
                 defaults={
-                    'total_due': instance.program.tuition_fee,
+                    'total_due': FeeResolver(current_year).total_due(
+                        instance.program_id, instance.current_level_id
+                    ),
                     'total_paid': 0
                 }
             )
+
+
+@receiver(post_save, sender=StudentBalance)
+@receiver(post_delete, sender=StudentBalance)
+def expire_balance_reports(sender, instance, **kwargs):
+    bump_balances_version()
+
+
+@receiver(post_save, sender=TuitionFee)
+@receiver(post_delete, sender=TuitionFee)
+@receiver(post_save, sender=ProgramFee)
+@receiver(post_delete, sender=ProgramFee)
+@receiver(post_save, sender=AcademicYear)
+@receiver(post_delete, sender=AcademicYear)
+@receiver(post_save, sender=Program)
+@receiver(post_delete, sender=Program)
+def expire_fee_matrix(sender, instance, **kwargs):
+    # The version is stored with the write, so every worker sees it on commit.
+    bump_fees_version()
+
+
+@receiver(pre_save, sender=TuitionPayment)
+@receiver(pre_save, sender=Salary)
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=StudentBalance)
+def capture_previous_rollup_contribution(sender, instance, raw=False, **kwargs):
+    instance._previous_rollup_row = (
+        sender.objects.filter(pk=instance.pk).first()
+        if instance.pk and not raw else None
+    )
+
+
+@receiver(post_save, sender=TuitionPayment)
+@receiver(post_save, sender=Salary)
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=StudentBalance)
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rollup_row', None)
+    record_rollups(added=[instance], removed=[previous] if previous else [])
+
+
+@receiver(post_delete, sender=TuitionPayment)
+@receiver(post_delete, sender=Salary)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=StudentBalance)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    record_rollups(removed=[instance])
@@ -1,12 +1,13 @@
 from datetime import date
 from decimal import Decimal
 
+from django.db import transaction
 from django.test import TestCase
 from rest_framework.test import APIClient
 
 from apps.accounts.models import User
 from apps.finance.models import StudentBalance
-from apps.students.models import Student
+from apps.students.models import Enrollment, Student
 from apps.university.models import AcademicYear, Department, Faculty, Level, Program
 
 
@@ -95,3 +96,229 @@ class BalanceReconciliationRegressionTests(TestCase):
         self.assertEqual(response.status_code, 204)
         second_balance.refresh_from_db()
         self.assertEqual(second_balance.total_paid, Decimal('0.00'))
+
+    def test_academic_year_reconciliation_rewrites_only_drifted_balances(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from apps.finance.models import TuitionFee, TuitionPayment
+        from apps.finance.services.balances import reconcile_academic_year
+
+        TuitionFee.objects.create(
+            program=self.student.program, academic_year=self.year,
+            level=self.student.current_level, amount=Decimal('800.00'),
+            due_date=date(2097, 12, 1),
+        )
+        TuitionPayment.objects.create(
+            student=self.student, academic_year=self.year, amount=Decimal('300.00'),
+            status=TuitionPayment.PaymentStatus.COMPLETED, reference='BLS-BULK-1',
+            payment_date=date(2097, 10, 1),
+        )
+        TuitionPayment.objects.create(
+            student=self.student, academic_year=self.year, amount=Decimal('50.00'),
+            status=TuitionPayment.PaymentStatus.PENDING, reference='BLS-BULK-2',
+            payment_date=date(2097, 10, 2),
+        )
+        StudentBalance.objects.filter(student=self.second_student).update(
+            total_due=Decimal('800.00'),
+        )
+
+        report = reconcile_academic_year(self.year, dry_run=True)
+        self.assertEqual(report['checked'], 2)
+        self.assertEqual([row['student'] for row in report['drifted']], [self.student.pk])
+        self.assertEqual(report['total_paid_drift'], Decimal('300.00'))
+        self.assertEqual(report['total_due_drift'], Decimal('-200.00'))
+        balance = StudentBalance.objects.get(student=self.student, academic_year=self.year)
+        self.assertEqual(balance.total_paid, Decimal('0.00'))
+
+        StudentBalance.objects.filter(student=self.second_student).delete()
+        Enrollment.objects.create(
+            student=self.second_student, academic_year=self.year,
+            program=self.second_student.program, level=self.second_student.current_level,
+        )
+        output = StringIO()
+        call_command('fix_balances', academic_year=self.year.name, stdout=output)
+        self.assertIn('1 drifted, 1 created', output.getvalue())
+
+        balance.refresh_from_db()
+        self.assertEqual(balance.total_due, Decimal('800.00'))
+        self.assertEqual(balance.total_paid, Decimal('300.00'))
+        self.assertTrue(StudentBalance.objects.filter(
+            student=self.second_student, academic_year=self.year,
+        ).exists())
+        self.assertEqual(reconcile_academic_year(self.year)['drifted'], [])
+
+    def test_fee_resolver_precedence_and_invalidation(self):
+        from apps.finance.models import TuitionFee
+        from apps.finance.services.fees import FeeResolver, fees_version
+        from apps.university.models import ProgramFee
+
+        program = self.student.program
+        level = self.student.current_level
+        self.assertEqual(FeeResolver(self.year).total_due(program, level), Decimal('1000.00'))
+
+        generic = TuitionFee.objects.create(
+            program=program, academic_year=self.year, level=None,
+            amount=Decimal('900.00'), due_date=date(2097, 12, 1),
+        )
+        self.assertEqual(FeeResolver(self.year).total_due(program, level), Decimal('900.00'))
+
+        ProgramFee.objects.create(
+            program=program, level=level, academic_year=self.year, amount=Decimal('850.00'),
+        )
+        self.assertEqual(FeeResolver(self.year).total_due(program, level), Decimal('850.00'))
+
+        TuitionFee.objects.create(
+            program=program, academic_year=self.year, level=level,
+            amount=Decimal('800.00'), due_date=date(2097, 12, 1),
+        )
+        resolver = FeeResolver(self.year)
+        with self.assertNumQueries(2):
+            amounts = resolver.total_due_for_students([self.student.pk, self.second_student.pk])
+        self.assertEqual(amounts, {
+            self.student.pk: Decimal('800.00'),
+            self.second_student.pk: Decimal('800.00'),
+        })
+
+        generic.delete()
+        program.tuition_fee = Decimal('1200.00')
+        program.save()
+        # The fees version, then the two fee tables and the program defaults.
+        with self.assertNumQueries(4):
+            FeeResolver(self.year)
+        with self.assertNumQueries(1):
+            self.assertEqual(FeeResolver(self.year).total_due(program, None), Decimal('1200.00'))
+
+        # The version lives in the database: shared by every worker, and a
+        # rolled-back write leaves it as it was.
+        version = fees_version()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            program.save()
+            self.assertNotEqual(fees_version(), version)
+            raise RuntimeError
+        self.assertEqual(fees_version(), version)
+
+    def test_aging_report_buckets_by_last_payment_and_expires_on_writes(self):
+        from apps.finance.services.aging import outstanding_aging_report
+
+        response = self.client.post('/api/v1/finance/tuition-payments/', {
+            'student': self.student.id, 'academic_year': self.year.id,
+            'amount': '400.00', 'payment_method': 'CASH', 'payment_date': '2097-11-20',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        balance = StudentBalance.objects.get(student=self.student, academic_year=self.year)
+        self.assertEqual(balance.last_payment_date, date(2097, 11, 20))
+
+        as_of = date(2097, 12, 15)
+        report = outstanding_aging_report(self.year, as_of)
+        self.assertEqual(report['totals']['0-30'], {'amount': Decimal('600.00'), 'count': 1})
+        self.assertEqual(report['totals']['90+'], {'amount': Decimal('1000.00'), 'count': 1})
+        self.assertEqual(report['total_outstanding'], Decimal('1600.00'))
+        self.assertEqual(len(report['by_program_level']), 1)
+        with self.assertNumQueries(1):  # the shared balances version
+            self.assertEqual(outstanding_aging_report(self.year, as_of), report)
+
+        response = self.client.post('/api/v1/finance/tuition-payments/', {
+            'student': self.second_student.id, 'academic_year': self.year.id,
+            'amount': '1000.00', 'payment_method': 'CASH', 'payment_date': '2097-12-01',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        response = self.client.get(
+            '/api/v1/finance/student-balances/aging/',
+            {'academic_year_id': self.year.pk, 'as_of': '2097-12-15'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(str(response.data['total_outstanding'])), Decimal('600.00'))
+        self.assertEqual(response.data['totals']['90+']['count'], 0)
+
+        response = self.client.get('/api/v1/finance/student-balances/aging/', {'as_of': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_outstanding_lists_and_totals_only_the_requested_year(self):
+        other_year = AcademicYear.objects.create(
+            name='2095-2096', start_date=date(2095, 9, 1), end_date=date(2096, 7, 1),
+        )
+        current = StudentBalance.objects.update_or_create(
+            student=self.student, academic_year=self.year,
+            defaults={'total_due': Decimal('1000.00'), 'total_paid': Decimal('400.00')},
+        )[0]
+        StudentBalance.objects.update_or_create(
+            student=self.second_student, academic_year=self.year,
+            defaults={'total_due': Decimal('1000.00'), 'total_paid': Decimal('1000.00')},
+        )
+        StudentBalance.objects.update_or_create(
+            student=self.second_student, academic_year=other_year,
+            defaults={'total_due': Decimal('1000.00'), 'total_paid': Decimal('700.00')},
+        )
+        url = '/api/v1/finance/student-balances/outstanding/'
+
+        def outstanding(**params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            return (
+                [row['id'] for row in response.data['results']],
+                Decimal(str(response.data['total_outstanding'])),
+            )
+
+        self.assertEqual(outstanding(academic_year=self.year.pk), ([current.pk], Decimal('600.00')))
+        self.assertEqual(outstanding(academic_year=other_year.pk)[1], Decimal('300.00'))
+        self.assertEqual(len(outstanding(current_year_only='false')[0]), 2)
+        self.assertEqual(outstanding(current_year_only='false')[1], Decimal('900.00'))
+        self.assertEqual(
+            outstanding(academic_year=self.year.pk, student=self.second_student.pk),
+            ([], Decimal('0')),
+        )
+
+    def test_payment_import_bulk_inserts_and_reconciles_each_balance_once(self):
+        import io
+
+        from openpyxl import Workbook
+
+        from apps.audit.models import AuditLog
+        from apps.finance.models import TuitionPayment
+        from apps.finance.services.excel import PaymentExcelService
+        from apps.finance.services.rollups import dashboard_rollups
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(PaymentExcelService.IMPORT_HEADERS)
+        ws.append(['BLS0001', 100, 'CASH', 'L1', '2097-10-01', 'Versement 1'])
+        ws.append(['BLS0001', 150, 'VIREMENT', 'l1', date(2097, 10, 20), ''])
+        ws.append(['BLS0002', 200, 'MOBILE MONEY'])
+        ws.append(['BLS9999', 100, 'CASH', 'L1', '2097-10-01', ''])
+        ws.append(['BLS0002', 'abc', 'CASH', 'L1', '2097-10-01', ''])
+        upload = io.BytesIO()
+        wb.save(upload)
+        upload.seek(0)
+        upload.name = 'paiements.xlsx'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/v1/finance/tuition-payments/import_excel/', {'file': upload},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['success_count'], 3)
+        self.assertEqual(len(response.data['errors']), 2)
+        self.assertTrue(response.data['errors'][0].startswith('Ligne 5:'))
+
+        payments = TuitionPayment.objects.filter(academic_year=self.year)
+        self.assertEqual(payments.count(), 3)
+        self.assertEqual(len(set(payments.values_list('reference', flat=True))), 3)
+        self.assertEqual(
+            set(payments.values_list('level__name', flat=True)), {'L1', None},
+        )
+        balance = StudentBalance.objects.get(student=self.student, academic_year=self.year)
+        self.assertEqual(balance.total_paid, Decimal('250.00'))
+        self.assertEqual(balance.last_payment_date, date(2097, 10, 20))
+        self.assertEqual(
+            StudentBalance.objects.get(
+                student=self.second_student, academic_year=self.year,
+            ).total_paid,
+            Decimal('200.00'),
+        )
+        self.assertEqual(dashboard_rollups(self.year)['total_tuition'], Decimal('450.00'))
+        self.assertEqual(
+            AuditLog.objects.filter(model_name='TuitionPayment', action='CREATE').count(), 3,
+        )
@@ -109,3 +109,137 @@ class FinanceDashboardAnalyticsRegressionTests(TestCase):
         self.assertEqual(response.data['expense_categories'][0]['category'], 'UTILITIES')
         self.assertEqual(response.data['payment_methods'][0]['method'], 'MOBILE_MONEY')
         self.assertEqual(response.data['payment_statuses'][0]['status'], 'COMPLETED')
+
+    def test_rollups_follow_ledger_writes_and_match_a_rebuild(self):
+        from apps.finance.models import MonthlyFinanceRollup
+        from apps.finance.services.rollups import rebuild_rollups
+
+        payment = TuitionPayment.objects.get(reference='FIN-ANALYTICS-PAYMENT')
+        payment.status = TuitionPayment.PaymentStatus.REFUNDED
+        payment.save()
+        Expense.objects.get(description='Internet').delete()
+
+        response = self.client.get('/api/v1/finance/dashboard/')
+        self.assertEqual(Decimal(str(response.data['total_tuition_collected'])), Decimal('0'))
+        self.assertEqual(Decimal(str(response.data['total_expenses'])), Decimal('0'))
+        self.assertEqual(response.data['expense_categories'], [])
+        self.assertEqual(response.data['payment_statuses'][0]['status'], 'REFUNDED')
+
+        def snapshot():
+            return sorted(
+                (row.source, row.academic_year_id, row.period, row.category,
+                 row.method, row.status, row.amount, row.count)
+                for row in MonthlyFinanceRollup.objects.exclude(count=0)
+            )
+
+        incremental = snapshot()
+        rebuild_rollups(include_closed=True)
+        self.assertEqual(snapshot(), incremental)
+
+        # Closed months keep their rollups; only deltas may move them.
+        MonthlyFinanceRollup.objects.filter(source='SALARY').update(amount=Decimal('1.00'))
+        rebuild_rollups()
+        self.assertEqual(
+            MonthlyFinanceRollup.objects.get(source='SALARY').amount, Decimal('1.00')
+        )
+
+    def test_dashboard_keeps_exact_year_boundaries_and_reads_outstanding_from_rollups(self):
+        from apps.finance.models import MonthlyFinanceRollup
+
+        year = AcademicYear.objects.get(is_current=True)
+        year.start_date = date(2025, 9, 15)
+        year.end_date = date(2026, 7, 15)
+        year.save()
+        for description, amount, day in (
+            ('Avant la rentrée', '5000.00', date(2025, 9, 10)),
+            ('Fin d\'année', '3000.00', date(2026, 7, 10)),
+            ('Après la clôture', '7000.00', date(2026, 7, 20)),
+        ):
+            Expense.objects.create(
+                category=Expense.ExpenseCategory.UTILITIES, description=description,
+                amount=Decimal(amount), date=day,
+                approved_by=self.admin, created_by=self.admin,
+            )
+
+        response = self.client.get('/api/v1/finance/dashboard/')
+        self.assertEqual(Decimal(str(response.data['total_expenses'])), Decimal('13000.00'))
+        self.assertEqual(Decimal(str(response.data['total_salaries_paid'])), Decimal('20000.00'))
+        months = {row['month']: row for row in response.data['monthly_cash_flow']}
+        self.assertEqual(Decimal(str(months['2025-09']['expenses'])), Decimal('10000.00'))
+        self.assertEqual(Decimal(str(months['2026-07']['expenses'])), Decimal('3000.00'))
+        self.assertEqual(Decimal(str(response.data['outstanding_balances'])), Decimal('100000.00'))
+
+        balance = StudentBalance.objects.get(academic_year=year)
+        balance.total_paid = Decimal('150000.00')
+        balance.save()
+        response = self.client.get('/api/v1/finance/dashboard/')
+        self.assertEqual(Decimal(str(response.data['outstanding_balances'])), Decimal('50000.00'))
+        # One row per bucket: the key is unique and writes upsert it.
+        self.assertEqual(
+            MonthlyFinanceRollup.objects.filter(source='BALANCE', academic_year=year).get().amount,
+            Decimal('50000.00'),
+        )
+        self.assertEqual(
+            MonthlyFinanceRollup.objects.filter(source='EXPENSE', period=date(2025, 9, 1)).get().amount,
+            Decimal('15000.00'),
+        )
+
+    def test_payroll_run_generates_pays_and_exports_a_month(self):
+        import io
+
+        from openpyxl import load_workbook
+
+        from apps.teachers.models import Teacher, TeacherContract
+
+        employee = User.objects.get(username='finance-analytics-employee')
+        teacher = Teacher.objects.create(
+            user=employee, employee_id='FIN-T-001', hire_date=date(2024, 9, 1),
+        )
+        TeacherContract.objects.create(
+            teacher=teacher, contract_number='FIN-C-001', start_date=date(2024, 9, 1),
+            base_salary=Decimal('25000.00'),
+        )
+        accountant = User.objects.create_user(
+            username='finance-analytics-accountant', password='testpass123',
+            role=User.Role.ACCOUNTANT,
+        )
+        Salary.objects.create(
+            employee=accountant, month=8, year=2025, base_salary=Decimal('15000.00'),
+            bonuses=Decimal('1000.00'), net_salary=Decimal('16000.00'),
+        )
+
+        response = self.client.post(
+            '/api/v1/finance/salaries/generate_payroll/', {'month': 10, 'year': 2025},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Decimal(str(response.data['total_net'])), Decimal('41000.00'))
+
+        response = self.client.post(
+            '/api/v1/finance/salaries/generate_payroll/', {'month': 10, 'year': 2025},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['skipped']), (0, 2))
+
+        with self.assertNumQueries(9):
+            response = self.client.post('/api/v1/finance/salaries/pay_bulk/', {
+                'month': 10, 'year': 2025, 'payment_date': '2025-10-31',
+            }, format='json')
+        self.assertEqual(response.data['paid_count'], 2)
+        self.assertFalse(Salary.objects.filter(month=10, year=2025, status='PENDING').exists())
+
+        response = self.client.get('/api/v1/finance/dashboard/')
+        october = next(
+            row for row in response.data['monthly_cash_flow'] if row['month'] == '2025-10'
+        )
+        self.assertEqual(Decimal(str(october['salaries'])), Decimal('41000.00'))
+
+        response = self.client.get(
+            '/api/v1/finance/salaries/export_payroll/', {'month': 10, 'year': 2025},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('paie_2025_10.xlsx', response['Content-Disposition'])
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(sheet.max_row, 3)
@@ -17,12 +17,12 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db import transaction
 from django.db.models import Count, Sum, F, Q
-from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from datetime import date
 import uuid
 
 from apps.core.permissions import IsAccountantOrAdmin, IsFinanceViewer
+from apps.core.services.export import export_response
 from .models import TuitionPayment, TuitionFee, StudentBalance, Salary, Expense
 from .serializers import (
     TuitionPaymentListSerializer, TuitionPaymentDetailSerializer, TuitionPaymentCreateSerializer,
@@ -37,6 +37,9 @@ from .serializers import (
 from apps.university.models import AcademicYear
 from .services.excel import PaymentExcelService, SalaryExcelService, ExpenseExcelService
 from .services.balances import reconcile_balance_pairs, reconcile_student_balance
+from .services.aging import outstanding_aging_report
+from .services.payroll import generate_payroll, pay_salaries
+from .services.rollups import dashboard_rollups
 from django.http import HttpResponse
 
 
@@ -231,16 +234,12 @@ class TuitionPaymentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def export_excel(self, request):
-        """Export filtered payments to Excel."""
+        """Export filtered payments to Excel (or CSV with ?export_format=csv)."""
         queryset = self.filter_queryset(self.get_queryset())
-        excel_file = PaymentExcelService.export_payments(queryset)
-
-        response = HttpResponse(
-            excel_file,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return export_response(
+            request, PaymentExcelService.HEADERS, PaymentExcelService.export_rows(queryset),
+            filename='paiements', title='Paiements',
         )
-        response['Content-Disposition'] = 'attachment; filename="paiements.xlsx"'
-        return response
 
     @action(detail=False, methods=['get'])
     def download_template(self, request):
@@ -347,6 +346,7 @@ class StudentBalanceViewSet(viewsets.ModelViewSet):
     
     Custom Actions:
     - outstanding: GET /api/v1/student-balances/outstanding/
+    - aging: GET /api/v1/student-balances/aging/
     - recalculate: POST /api/v1/student-balances/{id}/recalculate/
     
     Permissions:
@@ -409,7 +409,7 @@ class StudentBalanceViewSet(viewsets.ModelViewSet):
         Returns students where total_paid < total_due.
         """
         # Annotate with computed balance field for filtering/ordering
-        queryset = self.get_queryset().annotate(
+        queryset = self.filter_queryset(self.get_queryset()).annotate(
             computed_balance=F('total_due') - F('total_paid')
         ).filter(computed_balance__gt=0)
         
@@ -426,7 +426,12 @@ class StudentBalanceViewSet(viewsets.ModelViewSet):
         
         queryset = queryset.order_by('-computed_balance')
         
-        total_outstanding = queryset.aggregate(total=Sum('computed_balance'))['total'] or 0
+        report_year_id = self._outstanding_year_id(request)
+        if report_year_id:
+            # Same scope as the cached aging report: reuse its total.
+            total_outstanding = outstanding_aging_report(report_year_id)['total_outstanding']
+        else:
+            total_outstanding = queryset.aggregate(total=Sum('computed_balance'))['total'] or 0
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -443,6 +448,63 @@ class StudentBalanceViewSet(viewsets.ModelViewSet):
             'results': serializer.data
         })
 
+    def _outstanding_year_id(self, request):
+        """
+        Return the single academic year the outstanding queryset is scoped
+        to, or None when it spans several years or another filter narrows it.
+        """
+        params = request.query_params
+        if any(params.get(name) for name in ('student', 'search', 'min_balance')):
+            return None
+        year_ids = {
+            str(params[name]) for name in ('academic_year', 'academic_year_id')
+            if params.get(name)
+        }
+        current_year_only = params.get('current_year_only', 'true').lower() == 'true'
+        if current_year_only and 'academic_year' not in params:
+            current_year_id = AcademicYear.objects.filter(
+                is_current=True
+            ).values_list('pk', flat=True).first()
+            if current_year_id:
+                year_ids.add(str(current_year_id))
+        if len(year_ids) != 1:
+            return None
+        year_id = year_ids.pop()
+        return int(year_id) if year_id.isdigit() else None
+
+    @action(detail=False, methods=['get'])
+    def aging(self, request):
+        """
+        Outstanding balances bucketed by days since the last payment.
+        
+        Query parameters:
+        - academic_year_id: Academic year (defaults to the current year)
+        - as_of: Reference date YYYY-MM-DD (defaults to today)
+        
+        Returns totals per bucket (0-30, 31-60, 61-90, 90+ days) and the
+        same breakdown per program and level.
+        """
+        academic_year_id = request.query_params.get('academic_year_id') or (
+            AcademicYear.objects.filter(is_current=True).values_list('pk', flat=True).first()
+        )
+        if not str(academic_year_id or '').isdigit():
+            return Response(
+                {"error": "Aucune année académique active trouvée."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        as_of = None
+        if request.query_params.get('as_of'):
+            try:
+                as_of = date.fromisoformat(request.query_params['as_of'])
+            except ValueError:
+                return Response(
+                    {"error": "as_of doit être au format AAAA-MM-JJ"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        return Response(outstanding_aging_report(academic_year_id, as_of))
+
     @action(detail=True, methods=['post'])
     def recalculate(self, request, pk=None):
         """
@@ -550,6 +612,9 @@ class SalaryViewSet(viewsets.ModelViewSet):
     Custom Actions:
     - pay: POST /api/v1/salaries/{id}/pay/
     - pending: GET /api/v1/salaries/pending/
+    - generate_payroll: POST /api/v1/salaries/generate_payroll/
+    - pay_bulk: POST /api/v1/salaries/pay_bulk/
+    - export_payroll: GET /api/v1/salaries/export_payroll/
     
     Permissions:
     - All operations: Accountant and Admin only
@@ -719,17 +784,105 @@ class SalaryViewSet(viewsets.ModelViewSet):
             'results': serializer.data
         })
 
+    @staticmethod
+    def _payroll_period(data):
+        """Return (month, year, None) from request data, or (None, None, error response)."""
+        try:
+            month = int(data.get('month'))
+            year = int(data.get('year'))
+        except (TypeError, ValueError):
+            month = year = None
+        if not month or not year or not 1 <= month <= 12:
+            return None, None, Response(
+                {"error": "month (1-12) et year sont requis"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return month, year, None
+
+    @action(detail=False, methods=['post'])
+    def generate_payroll(self, request):
+        """
+        Generate the pending salaries of a month for all active staff.
+        
+        Body:
+        - month: Month (1-12)
+        - year: Year
+        
+        Teachers are paid from their active contract, other staff from their
+        latest salary. Existing salaries of the month are kept.
+        """
+        month, year, error = self._payroll_period(request.data)
+        if error:
+            return error
+
+        run = generate_payroll(month, year, processed_by=request.user)
+        return Response({
+            "message": f"{run['created']} salaire(s) généré(s) pour {month}/{year}",
+            **run,
+        }, status=status.HTTP_201_CREATED if run['created'] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def pay_bulk(self, request):
+        """
+        Mark many pending salaries as paid in one update.
+        
+        Body:
+        - ids: Salary ids to pay, or
+        - month and year: Pay every pending salary of that month
+        - payment_date: Payment date YYYY-MM-DD (defaults to today)
+        """
+        ids = request.data.get('ids')
+        if ids:
+            if not isinstance(ids, list) or not all(str(pk).isdigit() for pk in ids):
+                return Response(
+                    {"error": "ids doit être une liste d'identifiants"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = Salary.objects.filter(pk__in=ids)
+        else:
+            month, year, error = self._payroll_period(request.data)
+            if error:
+                return error
+            queryset = Salary.objects.filter(month=month, year=year)
+
+        payment_date = None
+        if request.data.get('payment_date'):
+            try:
+                payment_date = date.fromisoformat(str(request.data['payment_date']))
+            except ValueError:
+                return Response(
+                    {"error": "payment_date doit être au format AAAA-MM-JJ"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        paid_count = pay_salaries(queryset, payment_date)
+        return Response({
+            "message": f"{paid_count} salaire(s) marqué(s) comme payé(s)",
+            "paid_count": paid_count,
+        })
+
+    @action(detail=False, methods=['get'])
+    def export_payroll(self, request):
+        """Export every salary of a payroll month (month, year) to Excel."""
+        month, year, error = self._payroll_period(request.query_params)
+        if error:
+            return error
+        queryset = Salary.objects.filter(month=month, year=year).order_by(
+            'employee__last_name', 'employee__first_name'
+        )
+        return export_response(
+            request, SalaryExcelService.HEADERS, SalaryExcelService.export_rows(queryset),
+            filename=f'paie_{year}_{month:02d}', title='Salaires',
+        )
+
     @action(detail=False, methods=['get'])
     def export_excel(self, request):
-        """Export filtered salaries to Excel."""
+        """Export filtered salaries to Excel (or CSV with ?export_format=csv)."""
         queryset = self.filter_queryset(self.get_queryset())
-        excel_file = SalaryExcelService.export_salaries(queryset)
-        response = HttpResponse(
-            excel_file,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return export_response(
+            request, SalaryExcelService.HEADERS, SalaryExcelService.export_rows(queryset),
+            filename='salaires', title='Salaires',
         )
-        response['Content-Disposition'] = 'attachment; filename="salaires.xlsx"'
-        return response
 
     @action(detail=False, methods=['get'])
     def download_template(self, request):
@@ -870,15 +1023,12 @@ class ExpenseViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def export_excel(self, request):
-        """Export filtered expenses to Excel."""
+        """Export filtered expenses to Excel (or CSV with ?export_format=csv)."""
         queryset = self.filter_queryset(self.get_queryset())
-        excel_file = ExpenseExcelService.export_expenses(queryset)
-        response = HttpResponse(
-            excel_file,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return export_response(
+            request, ExpenseExcelService.HEADERS, ExpenseExcelService.export_rows(queryset),
+            filename='depenses', title='Dépenses',
         )
-        response['Content-Disposition'] = 'attachment; filename="depenses.xlsx"'
-        return response
 
     @action(detail=False, methods=['get'])
     def download_template(self, request):
@@ -935,70 +1085,17 @@ class FinanceDashboardView(APIView):
         if not current_year:
             return Response({'error': 'No current academic year set'})
 
-        # Calculate totals
-        total_tuition = TuitionPayment.objects.filter(
-            academic_year=current_year,
-            status='COMPLETED'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        total_salaries = Salary.objects.filter(
-            status='PAID',
-            # Filter salaries within academic year range
-            payment_date__range=(current_year.start_date, current_year.end_date)
-        ).aggregate(total=Sum('net_salary'))['total'] or 0
-
-        total_expenses = Expense.objects.filter(
-            # Filter expenses within academic year range
-            date__range=(current_year.start_date, current_year.end_date)
-        ).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-
-        pending_payments = TuitionPayment.objects.filter(
-            academic_year=current_year,
-            status='PENDING'
-        ).count()
-        
-        # Outstanding balances
-        outstanding = StudentBalance.objects.filter(
-            academic_year=current_year
-        ).aggregate(
-            total=Sum(F('total_due') - F('total_paid'))
-        )['total'] or 0
-
-        completed_payments = TuitionPayment.objects.filter(
-            academic_year=current_year,
-            status='COMPLETED',
-        )
-        paid_salaries = Salary.objects.filter(
-            status='PAID',
-            payment_date__range=(current_year.start_date, current_year.end_date),
-        )
-        year_expenses = Expense.objects.filter(
-            date__range=(current_year.start_date, current_year.end_date),
-        )
+        # Every figure, the outstanding balances included, comes from the rollups.
+        rollups = dashboard_rollups(current_year)
+        total_tuition = rollups['total_tuition']
+        total_salaries = rollups['total_salaries']
+        total_expenses = rollups['total_expenses']
+        pending_payments = rollups['pending_payments']
+        outstanding = rollups['outstanding_balances']
 
-        def month_key(value):
-            return value.strftime('%Y-%m') if value else ''
-
-        monthly_revenue = {
-            month_key(row['period_month']): row['total'] or 0
-            for row in completed_payments.annotate(
-                period_month=TruncMonth('payment_date')
-            ).values('period_month').annotate(total=Sum('amount')).order_by('period_month')
-        }
-        monthly_salaries = {
-            month_key(row['period_month']): row['total'] or 0
-            for row in paid_salaries.annotate(
-                period_month=TruncMonth('payment_date')
-            ).values('period_month').annotate(total=Sum('net_salary')).order_by('period_month')
-        }
-        monthly_expenses = {
-            month_key(row['period_month']): row['total'] or 0
-            for row in year_expenses.annotate(
-                period_month=TruncMonth('date')
-            ).values('period_month').annotate(total=Sum('amount')).order_by('period_month')
-        }
+        monthly_revenue = rollups['monthly_revenue']
+        monthly_salaries = rollups['monthly_salaries']
+        monthly_expenses = rollups['monthly_expenses']
 
         monthly_cash_flow = []
         cursor = date(current_year.start_date.year, current_year.start_date.month, 1)
@@ -1021,55 +1118,50 @@ class FinanceDashboardView(APIView):
                 1,
             )
 
-        expense_category_rows = list(
-            year_expenses.values('category')
-            .annotate(amount=Sum('amount'), count=Count('id'))
-            .order_by('-amount')
-        )
         category_labels = dict(Expense.ExpenseCategory.choices)
         expense_categories = [
             {
-                'category': row['category'],
-                'label': category_labels.get(row['category'], row['category']),
-                'amount': row['amount'] or 0,
-                'count': row['count'],
-                'percentage': round(float(row['amount'] or 0) / float(total_expenses) * 100, 1)
+                'category': category,
+                'label': category_labels.get(category, category),
+                'amount': amount,
+                'count': count,
+                'percentage': round(float(amount) / float(total_expenses) * 100, 1)
                 if total_expenses else 0,
             }
-            for row in expense_category_rows
+            for category, (amount, count) in sorted(
+                rollups['expense_categories'].items(), key=lambda item: -item[1][0]
+            )
+            if count
         ]
 
-        payment_method_rows = list(
-            completed_payments.values('payment_method')
-            .annotate(amount=Sum('amount'), count=Count('id'))
-            .order_by('-amount')
-        )
         method_labels = dict(TuitionPayment.PaymentMethod.choices)
         payment_methods = [
             {
-                'method': row['payment_method'],
-                'label': method_labels.get(row['payment_method'], row['payment_method']),
-                'amount': row['amount'] or 0,
-                'count': row['count'],
-                'percentage': round(float(row['amount'] or 0) / float(total_tuition) * 100, 1)
+                'method': method,
+                'label': method_labels.get(method, method),
+                'amount': amount,
+                'count': count,
+                'percentage': round(float(amount) / float(total_tuition) * 100, 1)
                 if total_tuition else 0,
             }
-            for row in payment_method_rows
+            for method, (amount, count) in sorted(
+                rollups['payment_methods'].items(), key=lambda item: -item[1][0]
+            )
+            if count
         ]
 
         payment_status_labels = dict(TuitionPayment.PaymentStatus.choices)
         payment_statuses = [
             {
-                'status': row['status'],
-                'label': payment_status_labels.get(row['status'], row['status']),
-                'amount': row['amount'] or 0,
-                'count': row['count'],
+                'status': payment_status,
+                'label': payment_status_labels.get(payment_status, payment_status),
+                'amount': amount,
+                'count': count,
             }
-            for row in TuitionPayment.objects.filter(
-                academic_year=current_year
-            ).values('status').annotate(
-                amount=Sum('amount'), count=Count('id')
-            ).order_by('-count')
+            for payment_status, (amount, count) in sorted(
+                rollups['payment_statuses'].items(), key=lambda item: -item[1][1]
+            )
+            if count
         ]
 
         expected_revenue = total_tuition + max(outstanding, 0)
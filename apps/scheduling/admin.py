@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TimeSlot, Schedule, CourseSession, Announcement
+from .models import TimeSlot, Schedule, CourseSession, Holiday, Announcement
 
 
 @admin.register(TimeSlot)
@@ -11,8 +11,8 @@ class TimeSlotAdmin(admin.ModelAdmin):
 
 @admin.register(Schedule)
 class ScheduleAdmin(admin.ModelAdmin):
-    list_display = ['course', 'teacher', 'semester', 'time_slot', 'classroom', 'is_active']
-    list_filter = ['semester', 'is_active']
+    list_display = ['course', 'teacher', 'semester', 'time_slot', 'classroom', 'is_active', 'is_draft']
+    list_filter = ['semester', 'is_active', 'is_draft']
     raw_id_fields = ['course', 'teacher']
 
 
@@ -23,6 +23,13 @@ class CourseSessionAdmin(admin.ModelAdmin):
     raw_id_fields = ['schedule']
 
 
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ['name', 'start_date', 'end_date']
+    search_fields = ['name']
+    ordering = ['start_date']
+
+
 @admin.register(Announcement)
 class AnnouncementAdmin(admin.ModelAdmin):
     list_display = ['title', 'announcement_type', 'target_audience', 'is_published', 'is_pinned', 'created_at']
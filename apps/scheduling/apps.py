@@ -5,3 +5,6 @@ class SchedulingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.scheduling"
     verbose_name = "Emplois du temps"
+
+    def ready(self):
+        import apps.scheduling.signals
@@ -0,0 +1,91 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.scheduling.models import CourseSession
+from apps.scheduling.services.solver import SECTION_KINDS, TimetableSolver, weekly_sessions
+from apps.university.management.commands.seed_data import CLASSROOMS, FACULTIES, TIME_SLOTS
+
+LEVELS = (('L1', 40, 80), ('L2', 25, 45), ('L3', 15, 30))
+
+
+class Command(BaseCommand):
+    help = 'Times the timetable solver on copies of the seed_data university'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--campuses', type=int, default=3,
+            help='Copies of the seed programs, rooms and teachers (3 give about 570 sections)',
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed of the group sizes')
+
+    def _problem(self, campuses, rng):
+        # Plain data only: the benchmark never touches the database.
+        slots = []
+        for index, (day, start, end) in enumerate(TIME_SLOTS):
+            start_hour, start_minute = map(int, start.split(':'))
+            end_hour, end_minute = map(int, end.split(':'))
+            slots.append({
+                'id': index, 'day': day,
+                'start': start_hour * 60 + start_minute, 'end': end_hour * 60 + end_minute,
+            })
+        slot_minutes = slots[0]['end'] - slots[0]['start']
+
+        rooms = [
+            {'id': f'{campus}-{code}', 'capacity': capacity,
+             'has_projector': projector, 'has_computers': computers}
+            for campus in range(campuses)
+            for _, code, _, capacity, projector, computers in CLASSROOMS
+        ]
+
+        courses = [
+            course
+            for faculty in FACULTIES
+            for department in faculty['departments']
+            for course in department['courses_s1']
+        ]
+        sections = []
+        teacher = 0
+        for campus in range(campuses):
+            for level, smallest, largest in LEVELS:
+                for program in range(len(courses) // 5):
+                    group = (campus, program, level)
+                    size = rng.randint(smallest, largest)
+                    for _, code, _, *hours in courses[program * 5:(program + 1) * 5]:
+                        # Three courses per teacher, as in a well-staffed faculty.
+                        teacher += 1
+                        for (kind, _), kind_hours in zip(SECTION_KINDS, hours):
+                            for _ in range(weekly_sessions(kind_hours, slot_minutes)):
+                                sections.append({
+                                    'course_id': (group, code),
+                                    'course_code': code,
+                                    'kind': kind,
+                                    'teacher_id': teacher // 3,
+                                    'group': group,
+                                    'size': size,
+                                    'needs_projector': kind == CourseSession.SessionType.LECTURE,
+                                    'needs_computers': False,
+                                })
+        return slots, rooms, sections
+
+    def handle(self, *args, **options):
+        slots, rooms, sections = self._problem(options['campuses'], random.Random(options['seed']))
+        self.stdout.write(
+            f"{len(sections)} sections, {len(slots)} time slots, {len(rooms)} rooms, "
+            f"{len({section['teacher_id'] for section in sections})} teachers, "
+            f"{len({section['group'] for section in sections})} groups"
+        )
+        started = time.perf_counter()
+        result = TimetableSolver(slots, rooms, sections).solve()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Solved in {elapsed:.2f}s: {len(result['placements'])} placed, "
+            f"{len(result['unplaced'])} unplaced"
+        )
+        for item in result['unplaced'][:10]:
+            section = item['section']
+            self.stdout.write(self.style.WARNING(
+                f"{section['course_code']} {section['kind']} (group of {section['size']}): {item['reason']}"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"{len(sections) / elapsed:.0f} sections/s"))
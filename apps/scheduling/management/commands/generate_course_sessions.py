@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.scheduling.services.sessions import generate_course_sessions
+from apps.university.models import Semester
+
+
+class Command(BaseCommand):
+    help = "Creates the dated course sessions of a semester from its active schedules"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semester',
+            type=int,
+            help='Semester id (the current semester by default)',
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete upcoming untouched sessions that no longer match the timetable',
+        )
+
+    def handle(self, *args, **options):
+        semesters = Semester.objects.all()
+        if options['semester']:
+            semester = semesters.filter(pk=options['semester']).first()
+        else:
+            semester = semesters.filter(is_current=True).first()
+        if semester is None:
+            raise CommandError("Semester not found")
+
+        self.stdout.write(f"Generating course sessions for {semester}...")
+        result = generate_course_sessions(semester, prune=options['prune'])
+        self.stdout.write(
+            f"{result['created']} created, {result['existing']} already present, "
+            f"{result['pruned']} pruned"
+        )
+        self.stdout.write(self.style.SUCCESS("Course sessions are up to date"))
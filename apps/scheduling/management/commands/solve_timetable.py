@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.scheduling.services.solver import publish_draft_schedules, solve_timetable
+from apps.university.models import Semester
+
+
+class Command(BaseCommand):
+    help = "Generates the draft timetable of a semester for its unscheduled courses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semester',
+            type=int,
+            help='Semester id (the current semester by default)',
+        )
+        parser.add_argument(
+            '--publish',
+            action='store_true',
+            help='Activate the drafts right away when they raise no conflict',
+        )
+
+    def handle(self, *args, **options):
+        semesters = Semester.objects.all()
+        if options['semester']:
+            semester = semesters.filter(pk=options['semester']).first()
+        else:
+            semester = semesters.filter(is_current=True).first()
+        if semester is None:
+            raise CommandError("Semester not found")
+
+        self.stdout.write(f"Solving the timetable of {semester}...")
+        result = solve_timetable(semester)
+        self.stdout.write(
+            f"{result['created']}/{result['sections']} sections placed in {result['seconds']}s, "
+            f"{result['discarded_drafts']} previous drafts discarded"
+        )
+        for item in result['unplaced']:
+            self.stdout.write(self.style.WARNING(
+                f"{item['course_code']} ({item['kind']}): {item['reason']}"
+            ))
+        if result['unassigned_courses']:
+            self.stdout.write(self.style.WARNING(
+                f"No teacher assigned: {', '.join(result['unassigned_courses'])}"
+            ))
+
+        if options['publish']:
+            published = publish_draft_schedules(semester)
+            if published['conflicts']:
+                raise CommandError(
+                    f"{len(published['conflicts'])} drafts clash with the active timetable; nothing published"
+                )
+            self.stdout.write(f"{published['published']} schedules published")
+        self.stdout.write(self.style.SUCCESS("Draft timetable ready"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holiday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Nom')),
+                ('start_date', models.DateField(verbose_name='Date de début')),
+                ('end_date', models.DateField(verbose_name='Date de fin')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Jour férié',
+                'verbose_name_plural': 'Jours fériés',
+                'ordering': ['start_date'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0002_holiday'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='is_draft',
+            field=models.BooleanField(default=False, verbose_name='Brouillon'),
+        ),
+    ]
@@ -65,6 +65,7 @@ class Schedule(models.Model):
         verbose_name="Salle"
     )
     is_active = models.BooleanField(default=True, verbose_name="Actif")
+    is_draft = models.BooleanField(default=False, verbose_name="Brouillon")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -78,26 +79,17 @@ class Schedule(models.Model):
 
     def clean(self):
         from django.core.exceptions import ValidationError
-        # Check for teacher conflicts
-        conflicts = Schedule.objects.filter(
-            teacher=self.teacher,
-            semester=self.semester,
-            time_slot=self.time_slot,
-            is_active=True
-        ).exclude(pk=self.pk)
-        if conflicts.exists():
+        from .services.conflicts import ConflictIndex
+
+        if not (self.semester_id and self.time_slot_id):
+            return
+        index = ConflictIndex.live(
+            self.semester_id, teachers=[self.teacher_id], classrooms=[self.classroom_id],
+        )
+        if index.teacher_conflicts(self.teacher_id, self.time_slot, exclude=self.pk):
             raise ValidationError("L'enseignant a déjà un cours à ce créneau.")
-
-        # Check for classroom conflicts
-        if self.classroom:
-            room_conflicts = Schedule.objects.filter(
-                classroom=self.classroom,
-                semester=self.semester,
-                time_slot=self.time_slot,
-                is_active=True
-            ).exclude(pk=self.pk)
-            if room_conflicts.exists():
-                raise ValidationError("La salle est déjà occupée à ce créneau.")
+        if index.classroom_conflicts(self.classroom_id, self.time_slot, exclude=self.pk):
+            raise ValidationError("La salle est déjà occupée à ce créneau.")
 
 
 class CourseSession(models.Model):
@@ -145,6 +137,30 @@ class CourseSession(models.Model):
         return f"{self.schedule.course} - {self.date}"
 
 
+class Holiday(models.Model):
+    """Jour férié ou période de fermeture, sans séances de cours."""
+
+    name = models.CharField(max_length=200, verbose_name="Nom")
+    start_date = models.DateField(verbose_name="Date de début")
+    end_date = models.DateField(verbose_name="Date de fin")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Jour férié"
+        verbose_name_plural = "Jours fériés"
+        ordering = ['start_date']
+
+    def __str__(self):
+        if self.start_date == self.end_date:
+            return f"{self.name} ({self.start_date})"
+        return f"{self.name} ({self.start_date} - {self.end_date})"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.start_date and self.end_date and self.end_date < self.start_date:
+            raise ValidationError("La date de fin doit suivre la date de début.")
+
+
 class Announcement(models.Model):
     """Annonce/Notification."""
 
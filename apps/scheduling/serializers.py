@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import TimeSlot, Schedule, CourseSession, Announcement
+from apps.university.models import Program, Semester
+from .models import TimeSlot, Schedule, CourseSession, Holiday, Announcement
+from .services.conflicts import ConflictIndex
 
 
 # TimeSlot Serializers
@@ -85,7 +87,8 @@ class ScheduleListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'course', 'course_name', 'course_code', 'teacher',
             'teacher_name', 'semester', 'semester_name', 'time_slot',
-            'time_slot_display', 'classroom', 'classroom_name', 'is_active'
+            'time_slot_display', 'classroom', 'classroom_name', 'is_active',
+            'is_draft'
         ]
 
 
@@ -148,48 +151,52 @@ class ScheduleCreateSerializer(serializers.ModelSerializer):
         is_active = attrs.get('is_active', True)
         
         # Only check for conflicts if the schedule is active
-        if is_active:
+        if is_active and semester and time_slot:
+            index = ConflictIndex.live(semester, teachers=[teacher], classrooms=[classroom])
+            exclude = self.instance.pk if self.instance else None
+            
             # Check for teacher conflicts
-            if teacher and semester and time_slot:
-                teacher_conflicts = Schedule.objects.filter(
-                    teacher=teacher,
-                    semester=semester,
-                    time_slot=time_slot,
-                    is_active=True
-                )
-                
-                # Exclude current instance if updating
-                if self.instance:
-                    teacher_conflicts = teacher_conflicts.exclude(pk=self.instance.pk)
-                
-                if teacher_conflicts.exists():
-                    conflict = teacher_conflicts.first()
+            if teacher:
+                conflicts = index.teacher_conflicts(teacher, time_slot, exclude=exclude)
+                if conflicts:
                     raise serializers.ValidationError({
-                        "teacher": f"L'enseignant a déjà un cours à ce créneau: {conflict.course.name}"
+                        "teacher": f"L'enseignant a déjà un cours à ce créneau: {conflicts[0]['course_name']}"
                     })
             
             # Check for classroom conflicts
-            if classroom and semester and time_slot:
-                classroom_conflicts = Schedule.objects.filter(
-                    classroom=classroom,
-                    semester=semester,
-                    time_slot=time_slot,
-                    is_active=True
-                )
-                
-                # Exclude current instance if updating
-                if self.instance:
-                    classroom_conflicts = classroom_conflicts.exclude(pk=self.instance.pk)
-                
-                if classroom_conflicts.exists():
-                    conflict = classroom_conflicts.first()
+            if classroom:
+                conflicts = index.classroom_conflicts(classroom, time_slot, exclude=exclude)
+                if conflicts:
                     raise serializers.ValidationError({
-                        "classroom": f"La salle est déjà occupée à ce créneau: {conflict.course.name}"
+                        "classroom": f"La salle est déjà occupée à ce créneau: {conflicts[0]['course_name']}"
                     })
         
         return attrs
 
 
+class ScheduleBatchRowSerializer(serializers.Serializer):
+    """One row of a batch timetable; related objects are resolved in bulk."""
+    course = serializers.IntegerField()
+    teacher = serializers.IntegerField()
+    time_slot = serializers.IntegerField()
+    classroom = serializers.IntegerField(required=False, allow_null=True)
+    is_active = serializers.BooleanField(default=True)
+
+
+class ScheduleBatchSerializer(serializers.Serializer):
+    """Input of the batch schedule creation."""
+    semester = serializers.PrimaryKeyRelatedField(queryset=Semester.objects.all())
+    program = serializers.PrimaryKeyRelatedField(
+        queryset=Program.objects.all(), required=False, allow_null=True
+    )
+    schedules = ScheduleBatchRowSerializer(many=True, allow_empty=False, max_length=2000)
+
+
+class TimetableSolveSerializer(serializers.Serializer):
+    """Semester whose draft timetable is generated or published."""
+    semester = serializers.PrimaryKeyRelatedField(queryset=Semester.objects.all())
+
+
 # CourseSession Serializers
 class CourseSessionListSerializer(serializers.ModelSerializer):
     """List serializer for CourseSession with basic fields."""
@@ -435,6 +442,45 @@ class CourseSessionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class CourseSessionGenerateSerializer(serializers.Serializer):
+    """Input of the semester session generator."""
+    semester = serializers.PrimaryKeyRelatedField(
+        queryset=Semester.objects.all()
+    )
+    schedules = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    prune = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date')
+        end_date = attrs.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            raise serializers.ValidationError({
+                'end_date': "La date de fin doit suivre la date de début."
+            })
+        return attrs
+
+
+class HolidaySerializer(serializers.ModelSerializer):
+    """Serializer for Holiday."""
+
+    class Meta:
+        model = Holiday
+        fields = '__all__'
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date < start_date:
+            raise serializers.ValidationError({
+                'end_date': "La date de fin doit suivre la date de début."
+            })
+        return attrs
+
+
 class AnnouncementSerializer(serializers.ModelSerializer):
     """Default serializer for Announcement (backward compatibility)."""
     announcement_type_display = serializers.CharField(
@@ -0,0 +1,88 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.university.models import CacheVersion
+
+from ..models import Announcement
+from ..serializers import AnnouncementSerializer
+
+ANNOUNCEMENTS_FEED_TIMEOUT = 60 * 60
+ANNOUNCEMENTS_VERSION_KEY = 'scheduling:announcements-version'
+
+
+def announcements_version():
+    return CacheVersion.current(ANNOUNCEMENTS_VERSION_KEY)
+
+
+def bump_announcements_version():
+    """Expire the cached announcements feeds of every process after an announcement write."""
+    CacheVersion.bump(ANNOUNCEMENTS_VERSION_KEY)
+
+
+def _build_feed(target_audience, faculty_id, program_id, now):
+    queryset = Announcement.objects.filter(
+        is_published=True, publish_date__isnull=False,
+    ).filter(
+        Q(expiry_date__isnull=True) | Q(expiry_date__gte=now)
+    ).select_related('faculty', 'program', 'created_by')
+    if target_audience:
+        queryset = queryset.filter(target_audience=target_audience)
+    if faculty_id:
+        queryset = queryset.filter(Q(faculty_id=faculty_id) | Q(faculty__isnull=True))
+    if program_id:
+        queryset = queryset.filter(Q(program_id=program_id) | Q(program__isnull=True))
+
+    # One query for the live and the scheduled announcements: the feed next
+    # changes when one of the former expires or one of the latter goes live.
+    live = []
+    changes = []
+    for announcement in queryset.order_by('-is_pinned', '-publish_date'):
+        if announcement.publish_date > now:
+            changes.append(announcement.publish_date)
+            continue
+        live.append(announcement)
+        if announcement.expiry_date:
+            changes.append(announcement.expiry_date)
+
+    results = json.loads(json.dumps(AnnouncementSerializer(live, many=True).data, default=str))
+    return {
+        'count': len(results),
+        'results': results,
+        'etag': '"' + hashlib.sha256(
+            json.dumps(results, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:32] + '"',
+        'next_change': min(changes) if changes else None,
+    }
+
+
+def announcements_feed(target_audience=None, faculty_id=None, program_id=None):
+    """
+    Published, non-expired announcements for an audience, faculty and program.
+
+    Feeds are cached per (audience, faculty, program) under the
+    announcements version, which every Announcement write bumps and every
+    process reads from the database. Each feed also records when it next
+    changes by itself (the earliest expiry of an announcement in it, or the
+    publish date of a scheduled one), so a read is one version query, one
+    cache get and a timestamp comparison instead of the feed query on
+    now(). Returns {'count', 'results', 'etag', 'next_change'}.
+    """
+    now = timezone.now()
+    cache_key = (
+        f'scheduling:announcements-feed:{target_audience or "-"}:{faculty_id or "-"}:'
+        f'{program_id or "-"}:{announcements_version()}'
+    )
+    feed = cache.get(cache_key)
+    if feed is not None and (feed['next_change'] is None or now < feed['next_change']):
+        return feed
+
+    feed = _build_feed(target_audience, faculty_id, program_id, now)
+    timeout = ANNOUNCEMENTS_FEED_TIMEOUT
+    if feed['next_change'] is not None:
+        timeout = max(1, min(timeout, int((feed['next_change'] - now).total_seconds()) + 1))
+    cache.set(cache_key, feed, timeout=timeout)
+    return feed
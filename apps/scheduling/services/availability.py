@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from apps.university.models import Classroom
+
+from ..models import TimeSlot
+from .conflicts import CONFLICT_INDEX_TIMEOUT, ConflictIndex, timetable_version
+
+
+def _clock(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def classroom_matrix(semester):
+    """
+    Weekly occupancy of every available classroom in a semester.
+
+    The matrix is read off the semester's conflict index (one Schedule
+    query, itself cached) and one Classroom query, then cached under the
+    timetable version, so any Schedule, TimeSlot or Classroom write expires
+    it. A classroom is occupied during a time slot when one of its active
+    schedules overlaps it. Returns {'time_slots': [...], 'classrooms':
+    [{..., 'occupied': {time_slot_id: [{'id', 'course', 'teacher'}]}}]},
+    time slots in weekly order and classrooms by building and name.
+    """
+    semester_id = getattr(semester, 'pk', semester)
+    cache_key = f'scheduling:classroom-matrix:{semester_id}:{timetable_version()}'
+    matrix = cache.get(cache_key)
+    if matrix is not None:
+        return matrix
+
+    index = ConflictIndex.for_semester(semester_id)
+    slot_ids = sorted(index.slots, key=lambda pk: (index.slots[pk]['day'], index.slots[pk]['start'], pk))
+    slots_by_day = defaultdict(list)
+    for pk in slot_ids:
+        slots_by_day[index.slots[pk]['day']].append(pk)
+
+    classrooms = []
+    for classroom in Classroom.objects.filter(is_available=True).order_by('building', 'name').values(
+        'id', 'name', 'code', 'building', 'capacity', 'has_projector', 'has_computers',
+    ):
+        occupied = {}
+        for day, day_slot_ids in slots_by_day.items():
+            if not index.by_classroom.get((classroom['id'], day)):
+                continue
+            for pk in day_slot_ids:
+                entries = index.classroom_conflicts(classroom['id'], pk)
+                if entries:
+                    occupied[pk] = [
+                        {'id': entry['id'], 'course': entry['course_name'], 'teacher': entry['teacher_name']}
+                        for entry in entries
+                    ]
+        classrooms.append({**classroom, 'occupied': occupied})
+
+    matrix = {
+        'time_slots': [
+            {
+                'id': pk,
+                'day': str(TimeSlot.DayOfWeek(index.slots[pk]['day']).label),
+                'start_time': _clock(index.slots[pk]['start']),
+                'end_time': _clock(index.slots[pk]['end']),
+            }
+            for pk in slot_ids
+        ],
+        'classrooms': classrooms,
+    }
+    cache.set(cache_key, matrix, timeout=CONFLICT_INDEX_TIMEOUT)
+    return matrix
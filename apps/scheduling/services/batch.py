@@ -0,0 +1,102 @@
+from django.db import transaction
+
+from apps.academics.models import Course
+from apps.audit.signals import audit_bulk_create
+from apps.teachers.models import Teacher
+from apps.university.models import Classroom
+
+from ..models import Schedule, TimeSlot
+from .conflicts import ConflictIndex, bump_timetable_version
+
+
+def resolve_schedule_rows(rows, program=None):
+    """
+    Replace the primary keys of batch rows by instances, four queries in all.
+
+    rows are {'course', 'teacher', 'time_slot', 'classroom', 'is_active'}
+    dicts numbered from 1. With program, courses of other programs are
+    rejected. Returns (resolved rows, error messages).
+    """
+    def ids(field):
+        return {row[field] for row in rows if row.get(field)}
+
+    courses = Course.objects.in_bulk(ids('course'))
+    teachers = Teacher.objects.select_related('user').in_bulk(ids('teacher'))
+    time_slots = TimeSlot.objects.in_bulk(ids('time_slot'))
+    classrooms = Classroom.objects.in_bulk(ids('classroom'))
+
+    resolved = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        missing = [
+            label for field, label, found in (
+                ('course', 'Cours', courses),
+                ('teacher', 'Enseignant', teachers),
+                ('time_slot', 'Créneau horaire', time_slots),
+            )
+            if row.get(field) not in found
+        ]
+        if row.get('classroom') and row['classroom'] not in classrooms:
+            missing.append('Salle')
+        if missing:
+            errors.append(f"Ligne {number}: {', '.join(missing)} non trouvé(s)")
+            continue
+        course = courses[row['course']]
+        if program is not None and course.program_id != program.pk:
+            errors.append(f"Ligne {number}: Le cours {course.code} n'appartient pas au programme {program.code}")
+            continue
+        resolved.append({
+            'row': number,
+            'course': course,
+            'teacher': teachers[row['teacher']],
+            'time_slot': time_slots[row['time_slot']],
+            'classroom': classrooms.get(row.get('classroom')),
+            'is_active': row.get('is_active', True),
+        })
+    return resolved, errors
+
+
+@transaction.atomic
+def create_schedules(semester, rows, errors=()):
+    """
+    Create a batch of schedules of one semester, all or nothing.
+
+    Every active row is checked against the semester's schedules, read from
+    the database, and against the rows before it in the batch. If any row is invalid (errors
+    from parsing or resolution) or clashes, nothing is written; otherwise the
+    whole batch goes in with one bulk_create. Returns the consolidated report
+    {'created', 'schedule_ids', 'errors', 'conflicts'}.
+    """
+    errors = list(errors)
+    active = [row for row in rows if row['is_active']]
+    results = ConflictIndex.live(
+        semester,
+        teachers=[row['teacher'] for row in active],
+        classrooms=[row['classroom'] for row in active],
+    ).check_many(active)
+    conflicts = [
+        {'row': row['row'], 'conflicts': row_conflicts}
+        for row, row_conflicts in zip(active, results)
+        if row_conflicts
+    ]
+    report = {'created': 0, 'schedule_ids': [], 'errors': errors, 'conflicts': conflicts}
+    if errors or conflicts or not rows:
+        return report
+
+    schedules = Schedule.objects.bulk_create([
+        Schedule(
+            course=row['course'],
+            teacher=row['teacher'],
+            semester=semester,
+            time_slot=row['time_slot'],
+            classroom=row['classroom'],
+            is_active=row['is_active'],
+        )
+        for row in rows
+    ], batch_size=500)
+    # bulk_create sends no signals: expire the timetable caches and audit here.
+    bump_timetable_version()
+    audit_bulk_create(Schedule, schedules)
+    report['created'] = len(schedules)
+    report['schedule_ids'] = [schedule.pk for schedule in schedules]
+    return report
@@ -0,0 +1,347 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from apps.university.models import CacheVersion
+
+from ..models import Schedule, TimeSlot
+
+CONFLICT_INDEX_TIMEOUT = 60 * 60
+TIMETABLE_VERSION_KEY = 'scheduling:timetable-version'
+
+TEACHER_CONFLICT_MESSAGE = "L'enseignant a déjà un cours à ce créneau"
+CLASSROOM_CONFLICT_MESSAGE = "La salle est déjà occupée à ce créneau"
+GROUP_CONFLICT_MESSAGE = "Le groupe a déjà un cours à ce créneau"
+
+
+def timetable_version():
+    return CacheVersion.current(TIMETABLE_VERSION_KEY)
+
+
+def bump_timetable_version():
+    """Expire the cached conflict indexes of every process after a timetable write."""
+    CacheVersion.bump(TIMETABLE_VERSION_KEY)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _slot_interval(time_slot):
+    return {
+        'day': time_slot.day,
+        'start': _minutes(time_slot.start_time),
+        'end': _minutes(time_slot.end_time),
+        'label': str(time_slot),
+    }
+
+
+def _schedule_entry(schedule):
+    return {
+        'id': schedule.id,
+        'teacher_id': schedule.teacher_id,
+        'teacher_name': schedule.teacher.user.get_full_name(),
+        'classroom_id': schedule.classroom_id,
+        'classroom_name': schedule.classroom.name if schedule.classroom else None,
+        'time_slot_id': schedule.time_slot_id,
+        'time_slot': str(schedule.time_slot),
+        'day': schedule.time_slot.day,
+        'start': _minutes(schedule.time_slot.start_time),
+        'end': _minutes(schedule.time_slot.end_time),
+        'course_id': schedule.course_id,
+        'course_name': schedule.course.name,
+        'group': (schedule.course.program_id, schedule.course.level_id),
+    }
+
+
+def _pk(value):
+    return getattr(value, 'pk', value)
+
+
+def _conflicting(entry):
+    if 'row' in entry:
+        return {'conflicting_row': entry['row']}
+    return {'conflicting_schedule_id': entry['id']}
+
+
+def _interval_key(entry):
+    return entry['start'], entry['end']
+
+
+def _overlaps(entry, start, end):
+    return entry['start'] < end and start < entry['end']
+
+
+class ConflictIndex:
+    """
+    In-memory index of the active schedules of one semester.
+
+    Time slots are treated as [start, end) intervals of their weekday, so
+    08:00-10:00 and 09:00-11:00 clash while 08:00-10:00 and 10:00-12:00 do
+    not. Schedules are kept in lists sorted by start time per (teacher, day),
+    (classroom, day) and (group, day), a group being the students of one
+    (program_id, level_id); single checks, batch checks and the semester report
+    need no query once the index is loaded. The entries of a semester and
+    the time slot table are cached under the timetable version, which every
+    Schedule, TimeSlot, Course or Classroom write bumps; that index serves
+    the read-only report and availability views. Writes are checked against
+    live(), loaded from the database for the teachers and rooms involved.
+    """
+
+    def __init__(self, semester_id, entries, slots):
+        self.semester_id = semester_id
+        self.slots = slots
+        self.entries = {entry['id']: entry for entry in entries}
+        self.by_teacher = defaultdict(list)
+        self.by_classroom = defaultdict(list)
+        self.by_group = defaultdict(list)
+        for entry in sorted(entries, key=_interval_key):
+            self._add(entry)
+
+    @classmethod
+    def for_semester(cls, semester):
+        semester_id = _pk(semester)
+        cache_key = f'scheduling:conflict-index:v3:{semester_id}:{timetable_version()}'
+        payload = cache.get(cache_key)
+        if payload is None:
+            payload = {
+                'entries': [
+                    _schedule_entry(schedule)
+                    for schedule in Schedule.objects.filter(
+                        semester_id=semester_id, is_active=True,
+                    ).select_related(
+                        'teacher__user', 'classroom', 'time_slot', 'course',
+                    ).order_by('pk')
+                ],
+                'slots': {
+                    time_slot.pk: _slot_interval(time_slot)
+                    for time_slot in TimeSlot.objects.order_by()
+                },
+            }
+            cache.set(cache_key, payload, timeout=CONFLICT_INDEX_TIMEOUT)
+        return cls(semester_id, payload['entries'], payload['slots'])
+
+    @classmethod
+    def live(cls, semester, teachers=(), classrooms=(), groups=()):
+        """
+        Uncached index of the active schedules of semester given by one of
+        teachers, in one of classrooms (instances or primary keys) or to one
+        of groups ((program_id, level_id) pairs).
+
+        One query, read in the caller's transaction, so a conflict check
+        sees every committed write whatever process made it.
+        """
+        teacher_ids = {_pk(teacher) for teacher in teachers if teacher}
+        classroom_ids = {_pk(classroom) for classroom in classrooms if classroom}
+        involved = Q(teacher_id__in=teacher_ids) | Q(classroom_id__in=classroom_ids)
+        for program_id, level_id in set(groups):
+            involved |= Q(course__program_id=program_id, course__level_id=level_id)
+        entries = []
+        if teacher_ids or classroom_ids or groups:
+            entries = [
+                _schedule_entry(schedule)
+                for schedule in Schedule.objects.filter(
+                    involved, semester_id=_pk(semester), is_active=True,
+                ).select_related(
+                    'teacher__user', 'classroom', 'time_slot', 'course',
+                ).order_by('pk')
+            ]
+        slots = {
+            entry['time_slot_id']: {
+                'day': entry['day'], 'start': entry['start'],
+                'end': entry['end'], 'label': entry['time_slot'],
+            }
+            for entry in entries
+        }
+        return cls(_pk(semester), entries, slots)
+
+    def _add(self, entry):
+        insort(self.by_teacher[(entry['teacher_id'], entry['day'])], entry, key=_interval_key)
+        if entry['classroom_id']:
+            insort(self.by_classroom[(entry['classroom_id'], entry['day'])], entry, key=_interval_key)
+        if entry['group']:
+            insort(self.by_group[(entry['group'], entry['day'])], entry, key=_interval_key)
+
+    def _remove(self, entry):
+        self.by_teacher[(entry['teacher_id'], entry['day'])].remove(entry)
+        if entry['classroom_id']:
+            self.by_classroom[(entry['classroom_id'], entry['day'])].remove(entry)
+        if entry['group']:
+            self.by_group[(entry['group'], entry['day'])].remove(entry)
+
+    def interval(self, time_slot):
+        """Return {'day', 'start', 'end', 'label'} of a time slot instance or primary key."""
+        pk = _pk(time_slot)
+        if pk not in self.slots:
+            if not isinstance(time_slot, TimeSlot):
+                time_slot = TimeSlot.objects.get(pk=pk)
+            self.slots[pk] = _slot_interval(time_slot)
+        return self.slots[pk]
+
+    def _overlapping(self, index, owner, time_slot, exclude=None):
+        slot = self.interval(time_slot)
+        entries = index.get((_pk(owner), slot['day']), ())
+        # Sorted by start: only the entries starting before the slot ends can overlap.
+        candidates = entries[:bisect_left(entries, (slot['end'], 0), key=_interval_key)]
+        return [
+            entry for entry in candidates
+            if entry['id'] != exclude and _overlaps(entry, slot['start'], slot['end'])
+        ]
+
+    def teacher_conflicts(self, teacher, time_slot, exclude=None):
+        """Active schedules of teacher overlapping time_slot, other than exclude."""
+        if not teacher:
+            return []
+        return self._overlapping(self.by_teacher, teacher, time_slot, exclude)
+
+    def classroom_conflicts(self, classroom, time_slot, exclude=None):
+        """Active schedules in classroom overlapping time_slot, other than exclude."""
+        if not classroom:
+            return []
+        return self._overlapping(self.by_classroom, classroom, time_slot, exclude)
+
+    def group_conflicts(self, group, time_slot, exclude=None):
+        """Active schedules of a (program_id, level_id) group overlapping time_slot."""
+        if not group:
+            return []
+        return self._overlapping(self.by_group, tuple(group), time_slot, exclude)
+
+    def occupied_classrooms(self, time_slot):
+        """Return {classroom_id: [entries]} of the rooms busy during time_slot."""
+        day = self.interval(time_slot)['day']
+        occupied = {}
+        for (classroom_id, classroom_day) in self.by_classroom:
+            if classroom_day == day:
+                conflicts = self.classroom_conflicts(classroom_id, time_slot)
+                if conflicts:
+                    occupied[classroom_id] = conflicts
+        return occupied
+
+    def check(self, teacher, classroom, time_slot, exclude=None, group=None):
+        """
+        Return the conflicts of one schedule as the API reports them.
+
+        Arguments can be instances or primary keys; exclude is the primary
+        key of the schedule being updated. A group, when given, is checked
+        too. A clash with an earlier row of a check_many batch names that
+        row instead of a schedule.
+        """
+        conflicts = []
+        if teacher:
+            for entry in self.teacher_conflicts(teacher, time_slot, exclude):
+                conflicts.append({
+                    'type': 'teacher',
+                    'message': TEACHER_CONFLICT_MESSAGE,
+                    'teacher_name': entry['teacher_name'],
+                    'time_slot': entry['time_slot'],
+                    'conflicting_course': entry['course_name'],
+                    **_conflicting(entry),
+                })
+        for entry in self.classroom_conflicts(classroom, time_slot, exclude):
+            conflicts.append({
+                'type': 'classroom',
+                'message': CLASSROOM_CONFLICT_MESSAGE,
+                'classroom_name': entry['classroom_name'],
+                'time_slot': entry['time_slot'],
+                'conflicting_course': entry['course_name'],
+                **_conflicting(entry),
+            })
+        for entry in self.group_conflicts(group, time_slot, exclude):
+            conflicts.append({
+                'type': 'group',
+                'message': GROUP_CONFLICT_MESSAGE,
+                'time_slot': entry['time_slot'],
+                'conflicting_course': entry['course_name'],
+                **_conflicting(entry),
+            })
+        return conflicts
+
+    def check_many(self, candidates):
+        """
+        Check a batch of schedules against the index and against each other.
+
+        candidates are dicts with 'teacher', 'classroom', 'time_slot' and
+        'course' (instances or primary keys), an optional 'group', an
+        optional 'exclude', the
+        schedule a candidate replaces, and an optional 'row' number. Each
+        accepted candidate takes its slots for the ones after it. Returns one
+        conflict list per candidate.
+        """
+        results = []
+        for number, candidate in enumerate(candidates, start=1):
+            exclude = candidate.get('exclude')
+            conflicts = self.check(
+                candidate.get('teacher'), candidate.get('classroom'),
+                candidate.get('time_slot'), exclude, candidate.get('group'),
+            )
+            results.append(conflicts)
+            if not conflicts:
+                if exclude in self.entries:
+                    self._remove(self.entries.pop(exclude))
+                entry = self._candidate_entry(candidate, exclude or f'new-{number}')
+                self.entries[entry['id']] = entry
+                self._add(entry)
+        return results
+
+    def _candidate_entry(self, candidate, entry_id):
+        """Index entry of a schedule that is not saved yet; labels need instances."""
+        teacher = candidate.get('teacher')
+        classroom = candidate.get('classroom')
+        course = candidate.get('course')
+        slot = self.interval(candidate.get('time_slot'))
+        entry = {
+            'id': entry_id,
+            'teacher_id': _pk(teacher),
+            'teacher_name': teacher.user.get_full_name() if hasattr(teacher, 'user') else '',
+            'classroom_id': _pk(classroom),
+            'classroom_name': getattr(classroom, 'name', None),
+            'time_slot_id': _pk(candidate.get('time_slot')),
+            'time_slot': slot['label'],
+            'day': slot['day'],
+            'start': slot['start'],
+            'end': slot['end'],
+            'course_id': _pk(course),
+            'course_name': getattr(course, 'name', ''),
+            'group': tuple(candidate['group']) if candidate.get('group') else None,
+        }
+        if candidate.get('row') is not None:
+            entry['row'] = candidate['row']
+        return entry
+
+    def report(self):
+        """
+        Every pair of overlapping schedules of a teacher or a classroom.
+
+        Each sorted (owner, day) list is swept once, keeping only the
+        schedules still running, so the cost is O(n log n) plus one step per
+        clash reported.
+        """
+        conflicts = []
+        for conflict_type, index, owner_field, owner_name in (
+            ('teacher', self.by_teacher, 'teacher_id', 'teacher_name'),
+            ('classroom', self.by_classroom, 'classroom_id', 'classroom_name'),
+        ):
+            for entries in index.values():
+                running = []
+                for entry in entries:
+                    running = [other for other in running if other['end'] > entry['start']]
+                    for other in running:
+                        conflicts.append({
+                            'type': conflict_type,
+                            owner_field: entry[owner_field],
+                            owner_name: entry[owner_name],
+                            'time_slot': entry['time_slot'],
+                            'courses': [
+                                {
+                                    'id': clash['course_id'],
+                                    'name': clash['course_name'],
+                                    'schedule_id': clash['id'],
+                                    'time_slot': clash['time_slot'],
+                                }
+                                for clash in (other, entry)
+                            ],
+                        })
+                    running.append(entry)
+        return conflicts
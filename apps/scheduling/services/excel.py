@@ -0,0 +1,139 @@
+import io
+import re
+import unicodedata
+from datetime import datetime, time
+
+from openpyxl import Workbook
+
+from apps.academics.models import Course
+from apps.core.services.imports import ImportFileError, SpreadsheetReader
+from apps.teachers.models import Teacher
+from apps.university.models import Classroom
+
+from ..models import TimeSlot
+from .batch import create_schedules
+
+
+def _normalize(value):
+    text = unicodedata.normalize('NFKD', str(value))
+    return text.encode('ascii', 'ignore').decode('ascii').strip().lower()
+
+
+DAYS = {_normalize(label): day for day, label in TimeSlot.DayOfWeek.choices}
+
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        return value.time().replace(second=0, microsecond=0)
+    if isinstance(value, time):
+        return value.replace(second=0, microsecond=0)
+    match = re.fullmatch(r'(\d{1,2})\s*[:hH]\s*(\d{2})?(?::\d{2})?', str(value or '').strip())
+    if not match:
+        return None
+    try:
+        return time(int(match.group(1)), int(match.group(2) or 0))
+    except ValueError:
+        return None
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ''
+
+
+class ScheduleExcelService:
+    """Service to handle Excel import of weekly timetables."""
+
+    HEADERS = ['Code Cours', 'Matricule Enseignant', 'Jour', 'Début', 'Fin', 'Salle']
+
+    # Import field -> accepted header names, matched case-insensitively.
+    IMPORT_COLUMNS = {
+        'course': ['Code Cours', 'Cours', 'Course'],
+        'teacher': ['Matricule Enseignant', 'Enseignant', 'Teacher'],
+        'day': ['Jour', 'Day'],
+        'start_time': ['Début', 'Debut', 'Heure Début', 'Start'],
+        'end_time': ['Fin', 'Heure Fin', 'End'],
+        'classroom': ['Salle', 'Code Salle', 'Classroom'],
+    }
+
+    @staticmethod
+    def download_template():
+        """Generate a template Excel file for timetable import."""
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Template Import"
+        ws.append(ScheduleExcelService.HEADERS)
+        ws.append(["INFO101", "ENS-INFO-001", "Lundi", "08:00", "10:00", "A101"])
+
+        output = io.BytesIO()
+        wb.save(output)
+        output.seek(0)
+        return output
+
+    @staticmethod
+    def import_schedules(file_obj, semester, program=None):
+        """
+        Import a weekly timetable into a semester, all rows or none.
+
+        Courses, teachers, classrooms and time slots are looked up by code,
+        matricule and (day, start, end) with one query each for the whole
+        file. Every row is then checked against the semester's conflict index
+        and the rows above it, and the batch is written by create_schedules.
+        Returns its report {'created', 'schedule_ids', 'errors', 'conflicts'}.
+        """
+        try:
+            with SpreadsheetReader(file_obj, columns=ScheduleExcelService.IMPORT_COLUMNS) as reader:
+                if reader.column('course') is None or reader.column('day') is None:
+                    raise ImportFileError("Colonnes 'Code Cours' et 'Jour' requises.")
+                rows = list(reader.rows())
+        except ImportFileError as e:
+            return {'created': 0, 'schedule_ids': [], 'errors': [str(e)], 'conflicts': []}
+
+        courses = Course.objects.in_bulk(
+            {_text(row['course']) for _, row in rows if row['course']}, field_name='code',
+        )
+        teachers = Teacher.objects.select_related('user').in_bulk(
+            {_text(row['teacher']) for _, row in rows if row['teacher']}, field_name='employee_id',
+        )
+        classrooms = Classroom.objects.in_bulk(
+            {_text(row['classroom']) for _, row in rows if row['classroom']}, field_name='code',
+        )
+        time_slots = {
+            (time_slot.day, time_slot.start_time, time_slot.end_time): time_slot
+            for time_slot in TimeSlot.objects.all()
+        }
+
+        resolved = []
+        errors = []
+        for row_number, row in rows:
+            course = courses.get(_text(row['course']))
+            teacher = teachers.get(_text(row['teacher']))
+            classroom = classrooms.get(_text(row['classroom'])) if row['classroom'] else None
+            day = DAYS.get(_normalize(row['day'] or ''))
+            start_time = _parse_time(row['start_time'])
+            end_time = _parse_time(row['end_time'])
+
+            if course is None:
+                errors.append(f"Ligne {row_number}: Cours '{_text(row['course'])}' non trouvé")
+            elif program is not None and course.program_id != program.pk:
+                errors.append(f"Ligne {row_number}: Le cours {course.code} n'appartient pas au programme {program.code}")
+            elif teacher is None:
+                errors.append(f"Ligne {row_number}: Enseignant '{_text(row['teacher'])}' non trouvé")
+            elif row['classroom'] and classroom is None:
+                errors.append(f"Ligne {row_number}: Salle '{_text(row['classroom'])}' non trouvée")
+            elif day is None or start_time is None or end_time is None:
+                errors.append(f"Ligne {row_number}: Jour ou horaires invalides")
+            elif (day, start_time, end_time) not in time_slots:
+                errors.append(
+                    f"Ligne {row_number}: Aucun créneau {_text(row['day'])} "
+                    f"{start_time:%H:%M}-{end_time:%H:%M}"
+                )
+            else:
+                resolved.append({
+                    'row': row_number,
+                    'course': course,
+                    'teacher': teacher,
+                    'time_slot': time_slots[(day, start_time, end_time)],
+                    'classroom': classroom,
+                    'is_active': True,
+                })
+        return create_schedules(semester, resolved, errors)
@@ -0,0 +1,109 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.audit.signals import audit_bulk_create
+
+from ..models import CourseSession, Holiday, Schedule
+
+
+def closed_dates(start_date, end_date):
+    """Return the set of dates between start_date and end_date covered by a holiday."""
+    dates = set()
+    holidays = Holiday.objects.filter(
+        start_date__lte=end_date, end_date__gte=start_date,
+    ).values_list('start_date', 'end_date')
+    for holiday_start, holiday_end in holidays:
+        day = max(holiday_start, start_date)
+        while day <= min(holiday_end, end_date):
+            dates.add(day)
+            day += timedelta(days=1)
+    return dates
+
+
+def teaching_days(start_date, end_date):
+    """Return {weekday: [dates]} of the open days between start_date and end_date."""
+    closed = closed_dates(start_date, end_date)
+    days = defaultdict(list)
+    day = start_date
+    while day <= end_date:
+        if day not in closed:
+            days[day.weekday()].append(day)
+        day += timedelta(days=1)
+    return days
+
+
+@transaction.atomic
+def generate_course_sessions(semester, schedule_ids=None, start_date=None, end_date=None, prune=False):
+    """
+    Expand the active schedules of a semester into dated course sessions.
+
+    Every schedule gets one session per week on its time slot's weekday
+    between the semester bounds (optionally narrowed by start_date and
+    end_date), holidays excepted. Existing sessions, cancelled ones
+    included, are never touched, so the generator can be re-run after
+    timetable edits; the new rows go in with one
+    bulk_create(ignore_conflicts=True). With prune, upcoming sessions that
+    no longer match the timetable and have no attendance, topic or notes
+    are deleted. Returns {'created', 'existing', 'pruned'}.
+    """
+    start_date = max(start_date or semester.start_date, semester.start_date)
+    end_date = min(end_date or semester.end_date, semester.end_date)
+    if start_date > end_date:
+        return {'created': 0, 'existing': 0, 'pruned': 0}
+
+    semester_schedules = Schedule.objects.filter(semester=semester)
+    if schedule_ids is not None:
+        semester_schedules = semester_schedules.filter(pk__in=schedule_ids)
+    schedules = semester_schedules.filter(is_active=True).order_by().values_list(
+        'pk', 'time_slot__day',
+    )
+    days = teaching_days(start_date, end_date)
+    expected = {
+        (schedule_id, day)
+        for schedule_id, weekday in schedules
+        for day in days.get(weekday, ())
+    }
+
+    in_range = CourseSession.objects.filter(
+        schedule__in=semester_schedules, date__range=(start_date, end_date),
+    )
+    existing = set(in_range.order_by().values_list('schedule_id', 'date'))
+    sessions = [
+        CourseSession(schedule_id=schedule_id, date=day)
+        for schedule_id, day in sorted(expected - existing)
+    ]
+    CourseSession.objects.bulk_create(sessions, batch_size=1000, ignore_conflicts=True)
+
+    # ignore_conflicts leaves primary keys unset; reload the run for the audit.
+    if sessions:
+        created = {(session.schedule_id, session.date) for session in sessions}
+        audit_bulk_create(CourseSession, [
+            session for session in in_range.select_related('schedule__course').filter(
+                schedule_id__in={schedule_id for schedule_id, _ in created},
+                date__in={day for _, day in created},
+            ).order_by()
+            if (session.schedule_id, session.date) in created
+        ])
+
+    pruned = 0
+    if prune:
+        stale = [
+            pk for pk, schedule_id, day in in_range.filter(
+                date__gte=timezone.localdate(),
+                is_cancelled=False,
+                attendances__isnull=True,
+                topic='',
+                notes='',
+            ).order_by().values_list('pk', 'schedule_id', 'date')
+            if (schedule_id, day) not in expected
+        ]
+        if stale:
+            pruned, _ = CourseSession.objects.filter(pk__in=stale).delete()
+    return {
+        'created': len(sessions),
+        'existing': len(existing & expected),
+        'pruned': pruned,
+    }
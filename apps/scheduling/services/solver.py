@@ -0,0 +1,457 @@
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.academics.models import Course
+from apps.audit.signals import audit_bulk_create, audit_bulk_update
+from apps.students.models import Enrollment
+from apps.teachers.models import TeacherCourse
+from apps.university.models import Classroom
+
+from ..models import CourseSession, Schedule, TimeSlot
+from .conflicts import ConflictIndex, bump_timetable_version
+
+# Teaching weeks a course's hours are spread over to get its weekly sessions.
+SEMESTER_TEACHING_WEEKS = getattr(settings, 'SEMESTER_TEACHING_WEEKS', 14)
+
+# Blocking sections the repair pass tries to move per unplaced section.
+SOLVER_REPAIR_ATTEMPTS = 200
+
+# Placement rounds; each one starts with the sections the previous left over.
+# The solver stops early after SOLVER_PATIENCE rounds without improvement.
+SOLVER_ROUNDS = getattr(settings, 'TIMETABLE_SOLVER_ROUNDS', 30)
+SOLVER_PATIENCE = 3
+
+SECTION_KINDS = (
+    (CourseSession.SessionType.LECTURE, 'hours_lecture'),
+    (CourseSession.SessionType.TUTORIAL, 'hours_tutorial'),
+    (CourseSession.SessionType.PRACTICAL, 'hours_practical'),
+)
+
+NO_ROOM_REASON = "Aucune salle assez grande et équipée pour cette section"
+NO_SLOT_REASON = "Aucun créneau libre à la fois pour l'enseignant, le groupe et une salle"
+
+
+def weekly_sessions(hours, slot_minutes, weeks=SEMESTER_TEACHING_WEEKS):
+    """Weekly sessions needed to teach hours over the semester, at least one if any."""
+    if not hours:
+        return 0
+    return max(1, int(hours * 60 / (weeks * slot_minutes) + 0.5))
+
+
+class TimetableSolver:
+    """
+    Constraint solver placing weekly course sections on time slots and rooms.
+
+    It works on plain data, so it runs (and is benchmarked) without the
+    database:
+
+        slots     [{'id', 'day', 'start', 'end'}], minutes since midnight
+        rooms     [{'id', 'capacity', 'has_projector', 'has_computers'}]
+        sections  [{'course_id', 'teacher_id', 'group', 'size',
+                    'needs_projector', 'needs_computers', ...}]
+        fixed     [{'time_slot_id', 'teacher_id', 'classroom_id', 'group'}]
+
+    A teacher, a room and a group (students of one program and level) never
+    hold two overlapping slots, and a section only goes in a room that seats
+    its group and has the equipment it needs. Sections are placed most
+    constrained first, each in the smallest free room that fits, spreading a
+    course's sessions over different days. A repair pass then moves a single
+    blocking section aside for each section left over. Occupancy is one
+    bitmask of slots per teacher, group and room, so every feasibility test
+    is a few integer ANDs.
+    """
+
+    def __init__(self, slots, rooms, sections, fixed=()):
+        self.slots = sorted(slots, key=lambda slot: (slot['day'], slot['start'], slot['end']))
+        self.rooms = sorted(rooms, key=lambda room: (room['capacity'], room['id']))
+        self.sections = list(sections)
+
+        self.overlapping = [
+            [
+                index for index, other in enumerate(self.slots)
+                if other['day'] == slot['day']
+                and other['start'] < slot['end'] and slot['start'] < other['end']
+            ]
+            for slot in self.slots
+        ]
+        self.overlap_masks = [
+            sum(1 << index for index in overlapping) for overlapping in self.overlapping
+        ]
+        self.suitable = [
+            [
+                index for index, room in enumerate(self.rooms)
+                if room['capacity'] >= section['size']
+                and (room['has_projector'] or not section['needs_projector'])
+                and (room['has_computers'] or not section['needs_computers'])
+            ]
+            for section in self.sections
+        ]
+
+        self.fixed = list(fixed)
+        self._reset()
+
+    def _reset(self):
+        self.busy = defaultdict(int)
+        # (resource, slot index) -> section index holding it, -1 for fixed schedules.
+        self.holders = {}
+        self.placements = {}
+        self.course_days = Counter()
+        self.group_days = Counter()
+
+        slot_index = {slot['id']: index for index, slot in enumerate(self.slots)}
+        room_index = {room['id']: index for index, room in enumerate(self.rooms)}
+        for schedule in self.fixed:
+            slot = slot_index.get(schedule['time_slot_id'])
+            if slot is None:
+                continue
+            keys = [('teacher', schedule['teacher_id']), ('group', schedule['group'])]
+            if schedule['classroom_id'] in room_index:
+                keys.append(('room', room_index[schedule['classroom_id']]))
+            for key in keys:
+                self.busy[key] |= 1 << slot
+                self.holders[key, slot] = -1
+            self.group_days[schedule['group'], self.slots[slot]['day']] += 1
+
+    def _keys(self, section, room):
+        data = self.sections[section]
+        return ('teacher', data['teacher_id']), ('group', data['group']), ('room', room)
+
+    def _place(self, section, slot, room):
+        for key in self._keys(section, room):
+            self.busy[key] |= 1 << slot
+            self.holders[key, slot] = section
+        data = self.sections[section]
+        day = self.slots[slot]['day']
+        self.course_days[data['course_id'], day] += 1
+        self.group_days[data['group'], day] += 1
+        self.placements[section] = (slot, room)
+
+    def _unplace(self, section):
+        slot, room = self.placements.pop(section)
+        for key in self._keys(section, room):
+            self.busy[key] &= ~(1 << slot)
+            del self.holders[key, slot]
+        data = self.sections[section]
+        day = self.slots[slot]['day']
+        self.course_days[data['course_id'], day] -= 1
+        self.group_days[data['group'], day] -= 1
+        return slot, room
+
+    def _best_spot(self, section):
+        """Best free (slot, room) for a section, or None."""
+        data = self.sections[section]
+        people = self.busy[('teacher', data['teacher_id'])] | self.busy[('group', data['group'])]
+        best = None
+        best_score = None
+        for slot, mask in enumerate(self.overlap_masks):
+            if people & mask:
+                continue
+            room = next(
+                (room for room in self.suitable[section] if not self.busy[('room', room)] & mask),
+                None,
+            )
+            if room is None:
+                continue
+            day = self.slots[slot]['day']
+            score = (
+                self.course_days[data['course_id'], day],
+                self.group_days[data['group'], day],
+                slot,
+            )
+            if best_score is None or score < best_score:
+                best, best_score = (slot, room), score
+        return best
+
+    def _blockers(self, section, slot, room):
+        """Sections (-1 for fixed schedules) standing in the way of a placement."""
+        found = set()
+        mask = self.overlap_masks[slot]
+        for key in self._keys(section, room):
+            if self.busy[key] & mask:
+                for other in self.overlapping[slot]:
+                    holder = self.holders.get((key, other))
+                    if holder is not None:
+                        found.add(holder)
+        return found
+
+    def _repair(self, section):
+        """Place a section by moving one blocking section elsewhere."""
+        attempts = 0
+        for slot in range(len(self.slots)):
+            for room in self.suitable[section]:
+                blockers = self._blockers(section, slot, room)
+                if len(blockers) != 1 or -1 in blockers:
+                    continue
+                attempts += 1
+                if attempts > SOLVER_REPAIR_ATTEMPTS:
+                    return False
+                blocker = blockers.pop()
+                previous = self._unplace(blocker)
+                self._place(section, slot, room)
+                spot = self._best_spot(blocker)
+                if spot is not None:
+                    self._place(blocker, *spot)
+                    return True
+                self._unplace(section)
+                self._place(blocker, *previous)
+        return False
+
+    def _difficulty(self, section):
+        data = self.sections[section]
+        return (
+            len(self.suitable[section]),
+            -data['size'],
+            data['course_id'],
+        )
+
+    def _round(self, order):
+        """Place sections in order from an empty timetable; return those left over."""
+        self._reset()
+        unplaced = []
+        for section in order:
+            spot = self._best_spot(section) if self.suitable[section] else None
+            if spot is None:
+                unplaced.append(section)
+            else:
+                self._place(section, *spot)
+        return [
+            section for section in unplaced
+            if not self.suitable[section] or not self._repair(section)
+        ]
+
+    def solve(self, rounds=SOLVER_ROUNDS):
+        """
+        Place every section that can be placed.
+
+        Each round after the first moves the sections left over to the front
+        of the order (squeaky wheel), and the best round is kept; the search
+        stops once SOLVER_PATIENCE rounds in a row bring no improvement. Returns
+        {'placements': [{'section', 'time_slot_id', 'classroom_id'}],
+        'unplaced': [{'section', 'reason'}]}, sections being the input dicts.
+        """
+        order = sorted(range(len(self.sections)), key=self._difficulty)
+        best = None
+        stale = 0
+        for _ in range(max(rounds, 1)):
+            unplaced = self._round(order)
+            if best is None or len(unplaced) < len(best[1]):
+                best = (dict(self.placements), unplaced)
+                stale = 0
+            else:
+                stale += 1
+            if stale >= SOLVER_PATIENCE or not any(self.suitable[section] for section in unplaced):
+                break
+            left_over = set(unplaced)
+            order = unplaced + [section for section in order if section not in left_over]
+        placements, unplaced = best
+        self.placements = placements
+        return {
+            'placements': [
+                {
+                    'section': self.sections[section],
+                    'time_slot_id': self.slots[slot]['id'],
+                    'classroom_id': self.rooms[room]['id'],
+                }
+                for section, (slot, room) in sorted(placements.items())
+            ],
+            'unplaced': [
+                {
+                    'section': self.sections[section],
+                    'reason': NO_SLOT_REASON if self.suitable[section] else NO_ROOM_REASON,
+                }
+                for section in unplaced
+            ],
+        }
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def load_timetable_problem(semester):
+    """
+    Read the solver inputs of a semester with a fixed number of queries.
+
+    Courses of the semester's type that have a teacher assigned for the
+    semester and no active schedule yet become sections; the active
+    schedules are fixed. Group sizes are the active enrollments of the
+    academic year per program and level. Returns (slots, rooms, sections, fixed,
+    courses without a teacher).
+    """
+    slots = [
+        {'id': pk, 'day': day, 'start': _minutes(start), 'end': _minutes(end)}
+        for pk, day, start, end in TimeSlot.objects.order_by().values_list(
+            'pk', 'day', 'start_time', 'end_time',
+        )
+    ]
+    rooms = list(Classroom.objects.filter(is_available=True).order_by().values(
+        'id', 'capacity', 'has_projector', 'has_computers',
+    ))
+    fixed = [
+        {
+            'time_slot_id': time_slot_id,
+            'teacher_id': teacher_id,
+            'classroom_id': classroom_id,
+            'group': (program_id, level_id),
+        }
+        for time_slot_id, teacher_id, classroom_id, program_id, level_id in Schedule.objects.filter(
+            semester=semester, is_active=True,
+        ).order_by().values_list(
+            'time_slot_id', 'teacher_id', 'classroom_id', 'course__program_id', 'course__level_id',
+        )
+    ]
+    sizes = {
+        (row['program_id'], row['level_id']): row['students']
+        for row in Enrollment.objects.filter(
+            academic_year_id=semester.academic_year_id, is_active=True,
+        ).order_by().values('program_id', 'level_id').annotate(students=Count('id'))
+    }
+    # Primary teachers first: the first assignment of a course wins.
+    teachers = {}
+    for course_id, teacher_id in TeacherCourse.objects.filter(
+        semester=semester,
+    ).order_by('-is_primary', 'pk').values_list('course_id', 'teacher_id'):
+        teachers.setdefault(course_id, teacher_id)
+
+    durations = Counter(slot['end'] - slot['start'] for slot in slots)
+    slot_minutes = durations.most_common(1)[0][0] if durations else 90
+
+    sections = []
+    unassigned = []
+    courses = Course.objects.filter(
+        semester_type=semester.semester_type, is_active=True,
+    ).exclude(
+        pk__in=Schedule.objects.filter(semester=semester, is_active=True).values('course_id'),
+    ).order_by('code')
+    for course in courses:
+        if course.pk not in teachers:
+            unassigned.append(course.code)
+            continue
+        group = (course.program_id, course.level_id)
+        for kind, hours_field in SECTION_KINDS:
+            for _ in range(weekly_sessions(getattr(course, hours_field), slot_minutes)):
+                sections.append({
+                    'course_id': course.pk,
+                    'course_code': course.code,
+                    'kind': kind,
+                    'teacher_id': teachers[course.pk],
+                    'group': group,
+                    'size': sizes.get(group, 0),
+                    'needs_projector': kind == CourseSession.SessionType.LECTURE,
+                    'needs_computers': (
+                        kind == CourseSession.SessionType.PRACTICAL
+                        and course.course_type == Course.CourseType.PRACTICAL
+                    ),
+                })
+    return slots, rooms, sections, fixed, unassigned
+
+
+@transaction.atomic
+def solve_timetable(semester):
+    """
+    Generate the draft timetable of a semester.
+
+    The previous drafts of the semester are discarded, the remaining courses
+    are placed around the active schedules, and the placements go in with
+    one bulk_create as inactive schedules flagged is_draft, which no conflict
+    check or session generation sees until they are published. Returns
+    {'sections', 'created', 'schedule_ids', 'unplaced', 'unassigned_courses',
+    'discarded_drafts', 'seconds'}.
+    """
+    started = time.perf_counter()
+    discarded, _ = Schedule.objects.filter(semester=semester, is_draft=True).delete()
+    slots, rooms, sections, fixed, unassigned = load_timetable_problem(semester)
+    result = TimetableSolver(slots, rooms, sections, fixed).solve()
+
+    schedules = Schedule.objects.bulk_create([
+        Schedule(
+            course_id=placement['section']['course_id'],
+            teacher_id=placement['section']['teacher_id'],
+            semester=semester,
+            time_slot_id=placement['time_slot_id'],
+            classroom_id=placement['classroom_id'],
+            is_active=False,
+            is_draft=True,
+        )
+        for placement in result['placements']
+    ], batch_size=500)
+    schedule_ids = [schedule.pk for schedule in schedules]
+    if schedules:
+        # bulk_create sends no signals: expire the timetable caches and audit here.
+        bump_timetable_version()
+        audit_bulk_create(Schedule, list(Schedule.objects.select_related(
+            'course', 'time_slot', 'classroom',
+        ).filter(pk__in=schedule_ids)))
+    return {
+        'sections': len(sections),
+        'created': len(schedules),
+        'schedule_ids': schedule_ids,
+        'unplaced': [
+            {
+                'course_id': item['section']['course_id'],
+                'course_code': item['section']['course_code'],
+                'kind': item['section']['kind'],
+                'reason': item['reason'],
+            }
+            for item in result['unplaced']
+        ],
+        'unassigned_courses': unassigned,
+        'discarded_drafts': discarded,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+@transaction.atomic
+def publish_draft_schedules(semester):
+    """
+    Activate the draft timetable of a semester, all or nothing.
+
+    The drafts are checked, teacher, room and group (program and level),
+    against the active schedules, read from the database since they may
+    have changed after the solver ran, and against each other; on any clash
+    nothing is published.
+    Returns {'published', 'conflicts'}.
+    """
+    drafts = list(Schedule.objects.select_for_update(of=('self',)).select_related(
+        'course', 'teacher__user', 'time_slot', 'classroom',
+    ).filter(semester=semester, is_draft=True).order_by('pk'))
+    results = ConflictIndex.live(
+        semester,
+        teachers=[draft.teacher_id for draft in drafts],
+        classrooms=[draft.classroom_id for draft in drafts],
+        groups=[(draft.course.program_id, draft.course.level_id) for draft in drafts],
+    ).check_many([
+        {
+            'course': draft.course,
+            'teacher': draft.teacher,
+            'time_slot': draft.time_slot,
+            'classroom': draft.classroom,
+            'group': (draft.course.program_id, draft.course.level_id),
+        }
+        for draft in drafts
+    ])
+    conflicts = [
+        {'schedule_id': draft.pk, 'conflicts': draft_conflicts}
+        for draft, draft_conflicts in zip(drafts, results)
+        if draft_conflicts
+    ]
+    if conflicts or not drafts:
+        return {'published': 0, 'conflicts': conflicts}
+
+    now = timezone.now()
+    Schedule.objects.filter(pk__in=[draft.pk for draft in drafts]).update(
+        is_draft=False, is_active=True, updated_at=now,
+    )
+    for draft in drafts:
+        draft.is_draft = False
+        draft.is_active = True
+        draft.updated_at = now
+    # The UPDATE sends no signals: expire the timetable caches and audit here.
+    bump_timetable_version()
+    audit_bulk_update(Schedule, drafts)
+    return {'published': len(drafts), 'conflicts': []}
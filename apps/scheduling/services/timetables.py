@@ -0,0 +1,303 @@
+import hashlib
+import json
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from apps.students.models import Enrollment
+from apps.university.models import CacheVersion, Semester
+
+from ..models import CourseSession, Schedule
+from .conflicts import TIMETABLE_VERSION_KEY
+from .sessions import closed_dates
+
+PERSONAL_TIMETABLE_TIMEOUT = 24 * 60 * 60
+PERSONAL_TIMETABLES_VERSION_KEY = 'scheduling:personal-timetables-version'
+
+# Personal data: browsers keep a copy but revalidate it with the ETag.
+TIMETABLE_CACHE_CONTROL = 'private, max-age=0, must-revalidate'
+ICS_CONTENT_TYPE = 'text/calendar; charset=utf-8'
+ICS_LINE_LENGTH = 75
+
+
+def personal_timetables_version():
+    return CacheVersion.current(PERSONAL_TIMETABLES_VERSION_KEY)
+
+
+def bump_personal_timetables_version():
+    """Expire every cached personal timetable after a session, holiday, enrollment, semester or name write."""
+    CacheVersion.bump(PERSONAL_TIMETABLES_VERSION_KEY)
+
+
+def timetable_semester(semester_id=None):
+    """The semester asked for by id, the current one by default, or None."""
+    semesters = Semester.objects.select_related('academic_year')
+    if semester_id:
+        return semesters.filter(pk=semester_id).first()
+    return semesters.filter(is_current=True).first()
+
+
+def _entry(schedule):
+    classroom = schedule.classroom
+    return {
+        'id': schedule.id,
+        'course_id': schedule.course_id,
+        'course_code': schedule.course.code,
+        'course_name': schedule.course.name,
+        'teacher_name': schedule.teacher.user.get_full_name(),
+        'classroom': classroom.name if classroom else None,
+        'building': classroom.building if classroom else None,
+        'time_slot_id': schedule.time_slot_id,
+        'day': schedule.time_slot.day,
+        'day_display': schedule.time_slot.get_day_display(),
+        'start_time': schedule.time_slot.start_time.strftime('%H:%M'),
+        'end_time': schedule.time_slot.end_time.strftime('%H:%M'),
+    }
+
+
+def _ics_text(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;')
+        .replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def _ics_fold(line):
+    """Split a content line into 75-octet lines, continuations starting with a space."""
+    if len(line.encode('utf-8')) <= ICS_LINE_LENGTH:
+        return line
+    parts = ['']
+    for char in line:
+        limit = ICS_LINE_LENGTH if len(parts) == 1 else ICS_LINE_LENGTH - 1
+        if len((parts[-1] + char).encode('utf-8')) > limit:
+            parts.append('')
+        parts[-1] += char
+    return '\r\n '.join(parts)
+
+
+def _ics_time(value):
+    return value.replace(':', '') + '00'
+
+
+def _ics_offset(offset):
+    minutes = int(offset.total_seconds()) // 60
+    return f"{'-' if minutes < 0 else '+'}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+
+
+def _ics_timezone(tzid, start, end):
+    """
+    VTIMEZONE component of tzid from start to end: the offset in force on
+    start, then one observance per change of offset (daylight saving time)
+    up to end, found by a daily scan narrowed down to the second.
+    """
+    zone = ZoneInfo(tzid)
+
+    def offset(timestamp):
+        return datetime.fromtimestamp(timestamp, zone).utcoffset()
+
+    moment = int(datetime.combine(start, time(), zone).timestamp())
+    until = int(datetime.combine(end + timedelta(days=1), time(), zone).timestamp())
+    changes = [(moment, offset(moment), offset(moment))]
+    while moment < until:
+        following = moment + 24 * 60 * 60
+        if offset(following) != offset(moment):
+            low, high = moment, following
+            while high - low > 1:
+                middle = (low + high) // 2
+                if offset(middle) == offset(moment):
+                    low = middle
+                else:
+                    high = middle
+            changes.append((high, offset(moment), offset(high)))
+        moment = following
+
+    lines = ['BEGIN:VTIMEZONE', f'TZID:{tzid}']
+    for timestamp, before, after in changes:
+        local = datetime.fromtimestamp(timestamp, zone)
+        kind = 'DAYLIGHT' if local.dst() else 'STANDARD'
+        # The onset is given in the local time in force before it.
+        onset = (local - after + before).replace(tzinfo=None)
+        lines += [
+            f'BEGIN:{kind}',
+            f'DTSTART:{onset:%Y%m%dT%H%M%S}',
+            f'TZOFFSETFROM:{_ics_offset(before)}',
+            f'TZOFFSETTO:{_ics_offset(after)}',
+            f'TZNAME:{local.tzname()}',
+            f'END:{kind}',
+        ]
+    lines.append('END:VTIMEZONE')
+    return lines
+
+
+def timetable_ics(title, timetable, closed):
+    """
+    Render a personal timetable as an iCalendar feed (RFC 5545).
+
+    Every schedule is one weekly recurring event from its first weekday in
+    the semester to the semester end, in the server time zone, which the
+    feed defines in a VTIMEZONE; holidays (closed) and cancelled sessions
+    are excluded with EXDATE.
+    """
+    semester = timetable['semester']
+    start = date.fromisoformat(semester['start_date'])
+    end = date.fromisoformat(semester['end_date'])
+    tzid = settings.TIME_ZONE
+    cancelled = defaultdict(set)
+    for cancellation in timetable['cancellations']:
+        cancelled[cancellation['schedule_id']].add(date.fromisoformat(cancellation['date']))
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Gestion universitaire//Emploi du temps//FR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_ics_text(title)}',
+        f'X-WR-TIMEZONE:{tzid}',
+        *_ics_timezone(tzid, start, end),
+    ]
+    for entry in timetable['schedules']:
+        first = start + timedelta(days=(entry['day'] - start.weekday()) % 7)
+        if first > end:
+            continue
+        starts_at = _ics_time(entry['start_time'])
+        lines += [
+            'BEGIN:VEVENT',
+            f"UID:schedule-{entry['id']}-semester-{semester['id']}@emploi-du-temps",
+            f'DTSTAMP:{start:%Y%m%d}T000000Z',
+            f'DTSTART;TZID={tzid}:{first:%Y%m%d}T{starts_at}',
+            f"DTEND;TZID={tzid}:{first:%Y%m%d}T{_ics_time(entry['end_time'])}",
+            f'RRULE:FREQ=WEEKLY;UNTIL={end:%Y%m%d}T235959Z',
+        ]
+        skipped = sorted(
+            day for day in closed | cancelled[entry['id']]
+            if day.weekday() == entry['day'] and first <= day <= end
+        )
+        if skipped:
+            lines.append(f'EXDATE;TZID={tzid}:' + ','.join(
+                f'{day:%Y%m%d}T{starts_at}' for day in skipped
+            ))
+        lines.append(f"SUMMARY:{_ics_text(entry['course_code'] + ' - ' + entry['course_name'])}")
+        if entry['classroom']:
+            location = ' - '.join(part for part in (entry['building'], entry['classroom']) if part)
+            lines.append(f'LOCATION:{_ics_text(location)}')
+        lines += [
+            f"DESCRIPTION:{_ics_text('Enseignant: ' + entry['teacher_name'])}",
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_ics_fold(line) for line in lines) + '\r\n'
+
+
+def _digest(value):
+    return '"' + hashlib.sha256(value.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def _cached_timetable(kind, person, semester, title, schedules):
+    """
+    Build or read one personal timetable, keyed by person and semester.
+
+    The key carries the timetable version (Schedule, TimeSlot, Course and
+    Classroom writes) and the personal timetables version (CourseSession,
+    Holiday, Enrollment and Semester writes, and name changes), both read
+    in one query from the versions every process shares, so any change
+    behind a timetable expires it. The cached dict holds the JSON payload, its iCalendar
+    rendering and an ETag for each.
+    """
+    cache_key = (
+        f'scheduling:personal-timetable:{kind}:{person.pk}:{semester.pk}:'
+        f'{CacheVersion.current(TIMETABLE_VERSION_KEY, PERSONAL_TIMETABLES_VERSION_KEY)}'
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    entries = [
+        _entry(schedule)
+        for schedule in schedules().select_related(
+            'course', 'teacher__user', 'classroom', 'time_slot',
+        ).order_by('time_slot__day', 'time_slot__start_time', 'pk')
+    ]
+    cancellations = [
+        {'schedule_id': schedule_id, 'date': day.isoformat(), 'reason': reason}
+        for schedule_id, day, reason in CourseSession.objects.filter(
+            schedule_id__in=[entry['id'] for entry in entries],
+            is_cancelled=True,
+            date__range=(semester.start_date, semester.end_date),
+        ).order_by('date', 'schedule_id').values_list('schedule_id', 'date', 'cancellation_reason')
+    ]
+    timetable = {
+        'semester': {
+            'id': semester.pk,
+            'name': str(semester),
+            'start_date': semester.start_date.isoformat(),
+            'end_date': semester.end_date.isoformat(),
+        },
+        'schedules': entries,
+        'cancellations': cancellations,
+    }
+    ics = timetable_ics(
+        f'Emploi du temps - {title}', timetable,
+        closed_dates(semester.start_date, semester.end_date) if entries else set(),
+    )
+    cached = {
+        'timetable': timetable,
+        'etag': _digest(json.dumps(timetable, sort_keys=True)),
+        'ics': ics,
+        'ics_etag': _digest(ics),
+    }
+    cache.set(cache_key, cached, timeout=PERSONAL_TIMETABLE_TIMEOUT)
+    return cached
+
+
+def student_timetable(student, semester):
+    """Weekly timetable of the program and level a student is enrolled in for semester."""
+    def schedules():
+        enrollment = Enrollment.objects.filter(
+            student=student, academic_year_id=semester.academic_year_id, is_active=True,
+        ).order_by('-pk').values_list('program_id', 'level_id').first()
+        if enrollment is None:
+            return Schedule.objects.none()
+        program_id, level_id = enrollment
+        return Schedule.objects.filter(
+            semester=semester, is_active=True,
+            course__program_id=program_id, course__level_id=level_id,
+        )
+
+    return _cached_timetable(
+        'student', student, semester, student.user.get_full_name(), schedules,
+    )
+
+
+def teacher_timetable(teacher, semester):
+    """Weekly timetable of the active schedules a teacher gives in semester."""
+    return _cached_timetable(
+        'teacher', teacher, semester, teacher.user.get_full_name(),
+        lambda: Schedule.objects.filter(semester=semester, teacher=teacher, is_active=True),
+    )
+
+
+def timetable_response(request, cached, filename=None):
+    """
+    Serve a cached personal timetable as JSON, or as an .ics file with filename.
+
+    A matching If-None-Match gets a bodiless 304, so clients polling an
+    unchanged timetable cost one version query and one cache read.
+    """
+    etag = cached['ics_etag'] if filename else cached['etag']
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if filename:
+            response = HttpResponse(cached['ics'], content_type=ICS_CONTENT_TYPE)
+            response['Content-Disposition'] = f'attachment; filename="{filename}.ics"'
+        else:
+            response = Response(cached['timetable'])
+    response['ETag'] = etag
+    response['Cache-Control'] = TIMETABLE_CACHE_CONTROL
+    return response
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.academics.models import Course
+from apps.students.models import Enrollment
+from apps.university.models import Classroom, Faculty, Program, Semester
+
+from .models import Announcement, CourseSession, Holiday, Schedule, TimeSlot
+from .services.announcements import bump_announcements_version
+from .services.conflicts import bump_timetable_version
+from .services.timetables import bump_personal_timetables_version
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Classroom)
+@receiver(post_delete, sender=Classroom)
+def expire_timetable_indexes(sender, instance, **kwargs):
+    # The version is stored with the write, so every worker sees it on commit.
+    bump_timetable_version()
+
+
+@receiver(post_save, sender=CourseSession)
+@receiver(post_delete, sender=CourseSession)
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_save, sender=Semester)
+@receiver(post_delete, sender=Semester)
+def expire_personal_timetables(sender, instance, **kwargs):
+    bump_personal_timetables_version()
+
+
+@receiver(post_save, sender=get_user_model())
+def expire_personal_timetables_on_rename(sender, instance, created, update_fields=None, **kwargs):
+    # Names go into timetable titles and teacher_name; last_login saves do not.
+    if created or instance.role not in (instance.Role.TEACHER, instance.Role.STUDENT):
+        return
+    if update_fields is None or {'first_name', 'last_name'} & set(update_fields):
+        bump_personal_timetables_version()
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+@receiver(post_delete, sender=Faculty)
+@receiver(post_delete, sender=Program)
+def expire_announcements_feeds(sender, instance, **kwargs):
+    # Deleting a faculty or program nulls its announcements without signals.
+    bump_announcements_version()
@@ -0,0 +1,68 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.scheduling.models import Announcement
+from apps.university.models import Faculty
+
+
+class AnnouncementFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.other_faculty = Faculty.objects.create(name='Other Faculty', code='RTO')
+        self.client = APIClient()
+
+    def test_announcements_feed_is_cached_until_a_write_or_the_next_expiry(self):
+        now = self.now
+        other_faculty = self.other_faculty
+        pinned = Announcement.objects.create(
+            title='Rentrée', content='...', is_published=True, is_pinned=True,
+            publish_date=now - timedelta(days=2),
+        )
+        expiring = Announcement.objects.create(
+            title='Inscriptions', content='...', is_published=True,
+            publish_date=now - timedelta(days=1), expiry_date=now + timedelta(hours=1),
+        )
+        scheduled = Announcement.objects.create(
+            title='Examens', content='...', is_published=True,
+            publish_date=now + timedelta(hours=2),
+        )
+        Announcement.objects.create(title='Brouillon', content='...', publish_date=now)
+        Announcement.objects.create(
+            title='Autre faculté', content='...', is_published=True,
+            publish_date=now - timedelta(days=1), faculty=other_faculty,
+        )
+        url = '/api/v1/scheduling/announcements/active/'
+
+        response = self.client.get(f'{url}?faculty_id={other_faculty.id + 1}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([item['id'] for item in response.data['results']], [pinned.id, expiring.id])
+        etag = response['ETag']
+
+        # Warm cache: only the shared version is read.
+        with self.assertNumQueries(1):
+            unchanged = self.client.get(f'{url}?faculty_id={other_faculty.id + 1}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(self.client.get(f'{url}?faculty_id={other_faculty.id}').data['count'], 3)
+
+        expiring.title = 'Inscriptions prolongées'
+        expiring.save()
+        edited = self.client.get(f'{url}?faculty_id={other_faculty.id + 1}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(edited.status_code, 200)
+        self.assertEqual(edited.data['results'][1]['title'], 'Inscriptions prolongées')
+
+        # No write in between: the recorded expiry and publish dates move the feed on.
+        with mock.patch('django.utils.timezone.now', return_value=now + timedelta(minutes=90)):
+            expired = self.client.get(f'{url}?faculty_id={other_faculty.id + 1}')
+        self.assertEqual([item['id'] for item in expired.data['results']], [pinned.id])
+        with mock.patch('django.utils.timezone.now', return_value=now + timedelta(hours=3)):
+            live = self.client.get(f'{url}?faculty_id={other_faculty.id + 1}')
+        self.assertEqual([item['id'] for item in live.data['results']], [pinned.id, scheduled.id])
+
+        self.assertEqual(self.client.get(f'{url}?target_audience=NOBODY').status_code, 400)
@@ -0,0 +1,576 @@
+import io
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from apps.academics.models import Course
+from apps.accounts.models import User
+from apps.scheduling.models import CourseSession, Holiday, Schedule, TimeSlot
+from apps.scheduling.services.conflicts import ConflictIndex
+from apps.students.models import Attendance, Enrollment, Student
+from apps.teachers.models import Teacher, TeacherCourse
+from apps.university.models import (
+    AcademicYear, Classroom, Department, Faculty, Level, Program, Semester,
+)
+
+
+def create_user(username, role):
+    return User.objects.create_user(username=username, password='ComplexPass123!', role=role)
+
+
+def create_semester():
+    year = AcademicYear.objects.create(
+        name='2096-2097', start_date=date(2096, 9, 1),
+        end_date=date(2097, 7, 1), is_current=True,
+    )
+    return Semester.objects.create(
+        academic_year=year, semester_type='S1',
+        start_date=date(2096, 9, 1), end_date=date(2097, 1, 31),
+        is_current=True,
+    )
+
+
+def create_program():
+    faculty = Faculty.objects.create(name='Runtime Faculty', code='RTF')
+    department = Department.objects.create(
+        name='Runtime Department', code='RTD', faculty=faculty,
+    )
+    level = Level.objects.get_or_create(name='L1', defaults={'order': 1})[0]
+    program = Program.objects.create(
+        name='Runtime Program', code='RTP', department=department,
+        duration_years=1,
+    )
+    program.levels.add(level)
+    return program, level
+
+
+def create_teacher(username, employee_id, department):
+    return Teacher.objects.create(
+        user=create_user(username, 'TEACHER'), employee_id=employee_id,
+        department=department, hire_date=date(2090, 1, 1),
+    )
+
+
+def enroll_student(username, student_id, semester, program, level):
+    student = Student.objects.create(
+        user=create_user(username, 'STUDENT'), student_id=student_id, program=program,
+        current_level=level, enrollment_date=date(2096, 9, 1),
+    )
+    Enrollment.objects.create(
+        student=student, academic_year=semester.academic_year, program=program,
+        level=level, is_active=True,
+    )
+    return student
+
+
+def create_course(program, level, code, name, **fields):
+    return Course.objects.create(
+        name=name, code=code, program=program, level=level,
+        semester_type='S1', credits=3, **fields,
+    )
+
+
+def weekly_schedule(course, teacher, semester):
+    """An active 08:00-10:00 schedule on today's weekday."""
+    time_slot = TimeSlot.objects.create(
+        day=timezone.localdate().weekday(), start_time='08:00', end_time='10:00'
+    )
+    return Schedule.objects.create(
+        course=course, teacher=teacher, semester=semester,
+        time_slot=time_slot, is_active=True,
+    )
+
+
+class SessionGenerationTests(TestCase):
+    def setUp(self):
+        self.semester = create_semester()
+        program, level = create_program()
+        self.teacher = create_teacher('sessions_teacher', 'RTT0001', program.department)
+        self.student = enroll_student('sessions_student', 'RTS0001', self.semester, program, level)
+        self.schedule = weekly_schedule(
+            create_course(program, level, 'RTC101', 'Runtime Course'), self.teacher, self.semester,
+        )
+        self.admin = create_user('sessions_admin', 'ADMIN')
+        self.client = APIClient()
+
+    def test_semester_sessions_are_generated_idempotently_around_holidays(self):
+        schedule = self.schedule
+        Holiday.objects.create(name='Vacances', start_date=date(2096, 12, 20), end_date=date(2097, 1, 3))
+
+        def open_days(weekday):
+            day, days = self.semester.start_date, []
+            while day <= self.semester.end_date:
+                if day.weekday() == weekday and not date(2096, 12, 20) <= day <= date(2097, 1, 3):
+                    days.append(day)
+                day += timedelta(days=1)
+            return days
+
+        weekday = schedule.time_slot.day
+        first_day = open_days(weekday)[0]
+        CourseSession.objects.create(schedule=schedule, date=first_day, is_cancelled=True)
+
+        self.client.force_authenticate(self.admin)
+        url = '/api/v1/scheduling/sessions/generate/'
+        response = self.client.post(url, {'semester': self.semester.id}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            (response.data['created'], response.data['existing']),
+            (len(open_days(weekday)) - 1, 1),
+        )
+        sessions = CourseSession.objects.filter(schedule=schedule, date__gte=self.semester.start_date)
+        self.assertEqual(sorted(sessions.values_list('date', flat=True)), open_days(weekday))
+        self.assertTrue(sessions.get(date=first_day).is_cancelled)
+
+        again = self.client.post(url, {'semester': self.semester.id}, format='json')
+        self.assertEqual((again.data['created'], again.data['pruned']), (0, 0))
+
+        # Move the course to another day: untouched sessions of the old day go.
+        kept = sessions.get(date=open_days(weekday)[1])
+        Attendance.objects.create(student=self.student, course_session=kept, status='PRESENT')
+        schedule.time_slot = TimeSlot.objects.create(
+            day=(weekday + 1) % 7, start_time='08:00', end_time='10:00',
+        )
+        schedule.save()
+        moved = self.client.post(url, {'semester': self.semester.id, 'prune': True}, format='json')
+        self.assertEqual(moved.data['created'], len(open_days((weekday + 1) % 7)))
+        self.assertEqual(moved.data['pruned'], len(open_days(weekday)) - 2)
+        self.assertTrue(sessions.filter(pk=kept.pk).exists())
+
+        self.client.force_authenticate(self.teacher.user)
+        self.assertEqual(self.client.post(url, {'semester': self.semester.id}, format='json').status_code, 403)
+
+
+class ScheduleConflictTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.semester = create_semester()
+        program, level = create_program()
+        self.teacher = create_teacher('conflicts_teacher', 'RTT0001', program.department)
+        self.other_teacher = create_teacher('conflicts_other_teacher', 'RTT0002', program.department)
+        self.schedule = weekly_schedule(
+            create_course(program, level, 'RTC101', 'Runtime Course'), self.teacher, self.semester,
+        )
+        self.admin = create_user('conflicts_admin', 'ADMIN')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_timetable_writes_are_checked_against_the_database(self):
+        schedule = self.schedule
+        room = Classroom.objects.create(name='Salle A', code='RT-A')
+        schedule.classroom = room
+        schedule.save()
+        other_slot = TimeSlot.objects.create(day=schedule.time_slot.day, start_time='14:00', end_time='16:00')
+        other_course = create_course(
+            schedule.course.program, schedule.course.level, 'RTC102', 'Runtime Course 2',
+        )
+        other_teacher = self.other_teacher
+        payload = {
+            'course': other_course.id, 'teacher': other_teacher.id, 'semester': self.semester.id,
+            'time_slot': schedule.time_slot_id, 'classroom': room.id, 'is_active': True,
+        }
+
+        clash = self.client.post('/api/v1/scheduling/schedules/', payload, format='json')
+        self.assertEqual(clash.status_code, 400)
+        self.assertIn('Runtime Course', str(clash.data['error']['details']['classroom']))
+
+        # Write checks read the database: one query for the teachers and rooms involved.
+        with self.assertNumQueries(1):
+            index = ConflictIndex.live(self.semester, teachers=[self.teacher.id], classrooms=[room.id])
+            conflicts = index.check(self.teacher.id, room.id, schedule.time_slot)
+        self.assertEqual(
+            [(conflict['type'], conflict['conflicting_schedule_id']) for conflict in conflicts],
+            [('teacher', schedule.id), ('classroom', schedule.id)],
+        )
+        self.assertEqual(index.check(self.teacher.id, room.id, schedule.time_slot_id, exclude=schedule.id), [])
+        self.assertEqual(
+            [bool(result) for result in index.check_many([
+                {'teacher': other_teacher.id, 'classroom': room.id, 'time_slot': other_slot.id},
+                {'teacher': self.teacher.id, 'classroom': None, 'time_slot': other_slot.id},
+                {'teacher': other_teacher.id, 'classroom': None, 'time_slot': other_slot.id},
+            ])],
+            [False, False, True],
+        )
+
+        created = self.client.post(
+            '/api/v1/scheduling/schedules/', {**payload, 'time_slot': other_slot.id}, format='json',
+        )
+        self.assertEqual(created.status_code, 201, created.data)
+        with self.assertRaisesMessage(ValidationError, "L'enseignant"):
+            Schedule(
+                course=other_course, teacher=other_teacher, semester=self.semester,
+                time_slot=other_slot,
+            ).clean()
+        # A write the cached index has not seen still blocks the next one.
+        ConflictIndex.for_semester(self.semester)
+        Schedule.objects.filter(course=other_course).update(is_active=False)
+        self.assertEqual(ConflictIndex.live(self.semester, teachers=[other_teacher]).check(
+            other_teacher, None, other_slot.id,
+        ), [])
+        Schedule.objects.filter(course=other_course).update(is_active=True)
+        # Every schedule write expires the cached index.
+        with self.assertNumQueries(1):
+            ConflictIndex.for_semester(self.semester.id)
+        moved = Schedule.objects.get(course=other_course)
+        moved.time_slot = schedule.time_slot
+        moved.save()
+        report = self.client.post(
+            '/api/v1/scheduling/schedules/check_conflicts/', {'semester_id': self.semester.id}, format='json',
+        )
+        self.assertEqual(report.status_code, 200, report.data)
+        self.assertEqual(
+            [(conflict['type'], [course['schedule_id'] for course in conflict['courses']])
+             for conflict in report.data['conflicts']],
+            [('classroom', [schedule.id, moved.id])],
+        )
+
+    def test_overlapping_time_slots_clash_and_block_classrooms(self):
+        schedule = self.schedule  # 08:00-10:00
+        room, spare = Classroom.objects.create(name='Salle B', code='RT-B'), Classroom.objects.create(name='Salle C', code='RT-C')
+        schedule.classroom = room
+        schedule.save()
+        day = schedule.time_slot.day
+        overlapping = TimeSlot.objects.create(day=day, start_time='09:00', end_time='11:00')
+        adjacent = TimeSlot.objects.create(day=day, start_time='10:00', end_time='12:00')
+        other_day = TimeSlot.objects.create(day=(day + 1) % 7, start_time='09:00', end_time='11:00')
+
+        index = ConflictIndex.for_semester(self.semester)
+        self.assertEqual(len(index.check(self.teacher, room, overlapping)), 2)
+        self.assertEqual(index.check(self.teacher.id, room.id, adjacent.id), [])
+        self.assertEqual(index.check(self.teacher, room, other_day), [])
+
+        Schedule.objects.create(
+            course=create_course(schedule.course.program, schedule.course.level, 'RTC103', 'Runtime Course 3'),
+            teacher=self.other_teacher, semester=self.semester, time_slot=overlapping,
+            classroom=room, is_active=True,
+        )
+        report = self.client.post(
+            '/api/v1/scheduling/schedules/check_conflicts/', {'semester_id': self.semester.id}, format='json',
+        )
+        self.assertEqual(
+            [(conflict['type'], [course['time_slot'] for course in conflict['courses']])
+             for conflict in report.data['conflicts']],
+            [('classroom', [str(TimeSlot.objects.get(pk=pk)) for pk in (schedule.time_slot_id, overlapping.pk)])],
+        )
+
+        available = self.client.get('/api/v1/university/classrooms/available/', {'time_slot_id': adjacent.id})
+        self.assertEqual(available.status_code, 200, available.data)
+        self.assertEqual({row['id'] for row in available.data['results']}, {spare.id})
+        check = self.client.post(
+            f'/api/v1/university/classrooms/{room.id}/check_availability/',
+            {'time_slot_id': other_day.id}, format='json',
+        )
+        self.assertTrue(check.data['is_available'])
+        check = self.client.post(
+            f'/api/v1/university/classrooms/{room.id}/check_availability/',
+            {'time_slot_id': adjacent.id}, format='json',
+        )
+        self.assertEqual([conflict['course'] for conflict in check.data['conflicts']], ['Runtime Course 3'])
+
+
+class BatchTimetableTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.semester = create_semester()
+        program, level = create_program()
+        self.teacher = create_teacher('batch_teacher', 'RTT0001', program.department)
+        self.other_teacher = create_teacher('batch_other_teacher', 'RTT0002', program.department)
+        self.schedule = weekly_schedule(
+            create_course(program, level, 'RTC101', 'Runtime Course'), self.teacher, self.semester,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('batch_admin', 'ADMIN'))
+
+    def test_batch_timetables_are_checked_as_a_whole_and_written_all_or_nothing(self):
+        schedule = self.schedule
+        program = schedule.course.program
+        day = schedule.time_slot.day
+        morning = TimeSlot.objects.create(day=day, start_time='10:00', end_time='12:00')
+        overlap = TimeSlot.objects.create(day=day, start_time='11:00', end_time='13:00')
+        room = Classroom.objects.create(name='Salle D', code='RT-D')
+        other_teacher = self.other_teacher
+        courses = [
+            create_course(program, schedule.course.level, f'RTB10{index}', f'Batch Course {index}')
+            for index in range(3)
+        ]
+        url = '/api/v1/scheduling/schedules/batch/'
+
+        rejected = self.client.post(url, {
+            'semester': self.semester.id,
+            'program': program.id,
+            'schedules': [
+                {'course': courses[0].id, 'teacher': self.teacher.id, 'time_slot': schedule.time_slot_id},
+                {'course': courses[1].id, 'teacher': other_teacher.id, 'time_slot': morning.id, 'classroom': room.id},
+                {'course': courses[2].id, 'teacher': self.teacher.id, 'time_slot': overlap.id, 'classroom': room.id},
+                {'course': courses[2].id, 'teacher': 999999, 'time_slot': morning.id},
+            ],
+        }, format='json')
+        self.assertEqual(rejected.status_code, 400)
+        self.assertEqual(rejected.data['created'], 0)
+        self.assertEqual(rejected.data['errors'], ['Ligne 4: Enseignant non trouvé(s)'])
+        self.assertEqual(
+            [(row['row'], [conflict.get('conflicting_schedule_id', conflict.get('conflicting_row'))
+                           for conflict in row['conflicts']])
+             for row in rejected.data['conflicts']],
+            [(1, [schedule.id]), (3, [2])],
+        )
+        self.assertFalse(Schedule.objects.filter(course__in=courses).exists())
+
+        accepted = self.client.post(url, {
+            'semester': self.semester.id,
+            'schedules': [
+                {'course': courses[1].id, 'teacher': other_teacher.id, 'time_slot': morning.id, 'classroom': room.id},
+                {'course': courses[2].id, 'teacher': self.teacher.id, 'time_slot': morning.id},
+            ],
+        }, format='json')
+        self.assertEqual(accepted.status_code, 201, accepted.data)
+        self.assertEqual(
+            set(Schedule.objects.filter(course__in=courses).values_list('pk', flat=True)),
+            set(accepted.data['schedule_ids']),
+        )
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['Code Cours', 'Matricule Enseignant', 'Jour', 'Début', 'Fin', 'Salle'])
+        day_label = TimeSlot.DayOfWeek(day).label
+        sheet.append(['RTB100', 'RTT0002', day_label, '11:00', '13:00', 'RT-D'])
+        sheet.append(['RTB100', 'RTT0002', day_label.upper(), '14h00', '16:00', ''])
+        upload = io.BytesIO()
+        workbook.save(upload)
+        upload.seek(0)
+        upload.name = 'emploi.xlsx'
+        imported = self.client.post(
+            '/api/v1/scheduling/schedules/import_excel/',
+            {'file': upload, 'semester': self.semester.id}, format='multipart',
+        )
+        self.assertEqual(imported.status_code, 400)
+        self.assertEqual(imported.data['errors'], [f'Ligne 3: Aucun créneau {day_label.upper()} 14:00-16:00'])
+        self.assertEqual([row['row'] for row in imported.data['conflicts']], [2])
+
+
+class TimetableSolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.semester = create_semester()
+        self.program, self.level = create_program()
+        self.teacher = create_teacher('solver_teacher', 'RTT0001', self.program.department)
+        self.other_teacher = create_teacher('solver_other_teacher', 'RTT0002', self.program.department)
+        # One student: the group needs a room with at least one seat.
+        enroll_student('solver_student', 'RTS0001', self.semester, self.program, self.level)
+        self.schedule = weekly_schedule(
+            create_course(self.program, self.level, 'RTC101', 'Runtime Course'), self.teacher, self.semester,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('solver_admin', 'ADMIN'))
+
+    def test_timetable_solver_writes_clash_free_drafts_and_publishes_them(self):
+        program, level = self.program, self.level
+        day = self.schedule.time_slot.day
+        next_day = (timezone.localdate() + timedelta(days=1)).weekday()
+        overlap = TimeSlot.objects.create(day=day, start_time='09:00', end_time='11:00')
+        free_slots = {
+            TimeSlot.objects.create(day=day, start_time='10:00', end_time='12:00').pk,
+            TimeSlot.objects.create(day=next_day, start_time='14:00', end_time='16:00').pk,
+            TimeSlot.objects.create(day=next_day, start_time='16:00', end_time='18:00').pk,
+        }
+        projector_room = Classroom.objects.create(name='Salle P', code='RT-P', capacity=30, has_projector=True)
+        Classroom.objects.create(name='Salle N', code='RT-N', capacity=30)
+        closet = Classroom.objects.create(name='Placard', code='RT-Z', capacity=0, has_projector=True)
+        other_teacher = self.other_teacher
+        lecture_and_tutorial = create_course(program, level, 'RTS201', 'Solver Course 1', hours_tutorial=20)
+        lecture_only = create_course(program, level, 'RTS202', 'Solver Course 2')
+        create_course(program, level, 'RTS203', 'Solver Course 3')
+        TeacherCourse.objects.create(teacher=self.teacher, course=lecture_and_tutorial, semester=self.semester)
+        TeacherCourse.objects.create(teacher=other_teacher, course=lecture_only, semester=self.semester)
+
+        solved = self.client.post(
+            '/api/v1/scheduling/schedules/solve/', {'semester': self.semester.id}, format='json',
+        )
+        self.assertEqual(solved.status_code, 201, solved.data)
+        self.assertEqual((solved.data['sections'], solved.data['created']), (3, 3))
+        self.assertEqual(solved.data['unplaced'], [])
+        self.assertIn('RTS203', solved.data['unassigned_courses'])
+        self.assertNotIn('RTS202', solved.data['unassigned_courses'])
+
+        drafts = list(Schedule.objects.filter(is_draft=True).select_related('classroom'))
+        self.assertEqual({draft.pk for draft in drafts}, set(solved.data['schedule_ids']))
+        self.assertTrue(all(not draft.is_active for draft in drafts))
+        # One group: every section on its own free slot, away from the fixed 08:00-10:00 course.
+        self.assertEqual({draft.time_slot_id for draft in drafts}, free_slots)
+        self.assertNotIn(overlap.pk, {draft.time_slot_id for draft in drafts})
+        self.assertNotIn(closet.pk, {draft.classroom_id for draft in drafts})
+        self.assertEqual(
+            {draft.classroom_id for draft in drafts if draft.course_id == lecture_only.pk},
+            {projector_room.pk},
+        )
+        # Drafts stay out of the live timetable until published.
+        self.assertEqual(len(ConflictIndex.for_semester(self.semester).entries), 1)
+
+        resolved = self.client.post(
+            '/api/v1/scheduling/schedules/solve/', {'semester': self.semester.id}, format='json',
+        )
+        self.assertEqual((resolved.data['discarded_drafts'], resolved.data['created']), (3, 3))
+        self.assertEqual(Schedule.objects.filter(is_draft=True).count(), 3)
+
+        # A course of the same group given meanwhile at a draft's slot blocks publishing.
+        draft = Schedule.objects.filter(is_draft=True, teacher=self.teacher).first()
+        clash = Schedule.objects.create(
+            course=Course.objects.get(code='RTS203'), teacher=other_teacher,
+            semester=self.semester, time_slot=draft.time_slot, is_active=True,
+        )
+        blocked = self.client.post(
+            '/api/v1/scheduling/schedules/publish_drafts/', {'semester': self.semester.id}, format='json',
+        )
+        self.assertEqual((blocked.status_code, blocked.data['published']), (400, 0))
+        self.assertEqual(
+            [(item['schedule_id'], [conflict['type'] for conflict in item['conflicts']])
+             for item in blocked.data['conflicts']],
+            [(draft.pk, ['group'])],
+        )
+        clash.delete()
+
+        published = self.client.post(
+            '/api/v1/scheduling/schedules/publish_drafts/', {'semester': self.semester.id}, format='json',
+        )
+        self.assertEqual(published.status_code, 200, published.data)
+        self.assertEqual(published.data['published'], 3)
+        self.assertEqual(Schedule.objects.filter(semester=self.semester, is_active=True).count(), 4)
+        self.assertEqual(ConflictIndex.for_semester(self.semester).report(), [])
+
+        nothing_left = self.client.post(
+            '/api/v1/scheduling/schedules/solve/', {'semester': self.semester.id}, format='json',
+        )
+        self.assertEqual((nothing_left.data['sections'], nothing_left.data['created']), (0, 0))
+
+
+class ClassroomAvailabilityMatrixTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.semester = create_semester()
+        program, level = create_program()
+        self.teacher = create_teacher('matrix_teacher', 'RTT0001', program.department)
+        self.other_teacher = create_teacher('matrix_other_teacher', 'RTT0002', program.department)
+        self.schedule = weekly_schedule(
+            create_course(program, level, 'RTC101', 'Runtime Course'), self.teacher, self.semester,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
+
+    def test_classroom_availability_matrix_is_cached_until_the_timetable_changes(self):
+        schedule = self.schedule
+        day = schedule.time_slot.day
+        overlap = TimeSlot.objects.create(day=day, start_time='09:00', end_time='11:00')
+        later = TimeSlot.objects.create(day=day, start_time='10:00', end_time='12:00')
+        hall = Classroom.objects.create(name='Amphi M', code='RT-AM', building='A', capacity=120, has_projector=True)
+        lab = Classroom.objects.create(name='Labo M', code='RT-LM', building='B', capacity=20, has_computers=True)
+        Classroom.objects.create(name='Fermée', code='RT-FM', capacity=50, is_available=False)
+        schedule.classroom = hall
+        schedule.save()
+        url = f'/api/v1/university/classrooms/availability_matrix/?semester_id={self.semester.id}'
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [slot['id'] for slot in response.data['time_slots']],
+            [schedule.time_slot_id, overlap.id, later.id],
+        )
+        rooms = {room['id']: room for room in response.data['classrooms']}
+        self.assertEqual(set(rooms), {hall.id, lab.id})
+        # 08:00-10:00 overlaps 09:00-11:00 but not 10:00-12:00.
+        self.assertEqual(set(rooms[hall.id]['occupied']), {schedule.time_slot_id, overlap.id})
+        self.assertEqual(rooms[hall.id]['occupied'][overlap.id][0]['id'], schedule.id)
+        self.assertEqual(rooms[lab.id]['occupied'], {})
+
+        # Only the semester and timetable version lookups are left once the
+        # matrix is cached.
+        with self.assertNumQueries(2):
+            filtered = self.client.get(f'{url}&has_computers=true&min_capacity=10')
+        self.assertEqual([room['id'] for room in filtered.data['classrooms']], [lab.id])
+
+        Schedule.objects.create(
+            course=schedule.course, teacher=self.other_teacher,
+            semester=self.semester, time_slot=later, classroom=lab,
+        )
+        refreshed = self.client.get(f'{url}&building=B')
+        self.assertEqual(set(refreshed.data['classrooms'][0]['occupied']), {overlap.id, later.id})
+
+
+class PersonalTimetableTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.semester = create_semester()
+        program, level = create_program()
+        self.teacher = create_teacher('timetable_teacher', 'RTT0001', program.department)
+        self.student = enroll_student('timetable_student', 'RTS0001', self.semester, program, level)
+        self.schedule = weekly_schedule(
+            create_course(program, level, 'RTC101', 'Runtime Course'), self.teacher, self.semester,
+        )
+        self.client = APIClient()
+
+    def test_personal_timetables_are_cached_with_etags_and_exported_as_icalendar(self):
+        schedule = self.schedule
+        first = self.semester.start_date + timedelta(
+            days=(schedule.time_slot.day - self.semester.start_date.weekday()) % 7
+        )
+        Holiday.objects.create(name='Fête', start_date=first + timedelta(days=7), end_date=first + timedelta(days=7))
+        url = f'/api/v1/students/{self.student.id}/timetable/'
+        self.client.force_authenticate(self.student.user)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['id'] for entry in response.data['schedules']], [schedule.id])
+        self.assertEqual(response.data['schedules'][0]['start_time'], '08:00')
+        etag = response['ETag']
+
+        # Warm cache: the student, semester and shared versions lookups are all that is left.
+        with self.assertNumQueries(3):
+            unchanged = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+
+        ics = self.client.get(f'/api/v1/students/{self.student.id}/timetable_ics/')
+        self.assertEqual(ics.status_code, 200)
+        self.assertTrue(ics['Content-Type'].startswith('text/calendar'))
+        body = ics.content.decode()
+        self.assertIn(
+            'BEGIN:VTIMEZONE\r\nTZID:Africa/Bamako\r\nBEGIN:STANDARD\r\nDTSTART:20960901T000000\r\n'
+            'TZOFFSETFROM:+0000\r\nTZOFFSETTO:+0000\r\n', body,
+        )
+        self.assertIn(f'DTSTART;TZID=Africa/Bamako:{first:%Y%m%d}T080000\r\n', body)
+        self.assertIn('RRULE:FREQ=WEEKLY;UNTIL=20970131T235959Z\r\n', body)
+        self.assertIn(f'EXDATE;TZID=Africa/Bamako:{first + timedelta(days=7):%Y%m%d}T080000\r\n', body)
+        self.assertIn('SUMMARY:RTC101 - Runtime Course\r\n', body)
+
+        # A cancelled session expires the cached timetable and is skipped in the feed.
+        CourseSession.objects.create(
+            schedule=schedule, date=first + timedelta(days=14), is_cancelled=True,
+            cancellation_reason='Grève',
+        )
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.data['cancellations'][0]['reason'], 'Grève')
+        body = self.client.get(f'/api/v1/students/{self.student.id}/timetable_ics/').content.decode()
+        self.assertIn(f'{first + timedelta(days=7):%Y%m%d}T080000,{first + timedelta(days=14):%Y%m%d}T080000', body)
+
+        # Semester dates and teacher names are part of the cached timetable too.
+        self.semester.end_date = self.semester.end_date.replace(day=30)
+        self.semester.save()
+        self.assertEqual(self.client.get(url).data['semester']['end_date'], self.semester.end_date.isoformat())
+        self.teacher.user.last_name = 'Renamed'
+        self.teacher.user.save(update_fields=['last_name'])
+        self.assertIn('Renamed', self.client.get(url).data['schedules'][0]['teacher_name'])
+
+        self.client.force_authenticate(self.teacher.user)
+        teacher = self.client.get(f'/api/v1/teachers/teachers/{self.teacher.id}/timetable/')
+        self.assertEqual([entry['id'] for entry in teacher.data['schedules']], [schedule.id])
+        week = self.client.get(f'/api/v1/teachers/teachers/{self.teacher.id}/schedules/')
+        self.assertEqual(week.data['count'], 1)
+
+        Enrollment.objects.filter(student=self.student).update(is_active=False)
+        Enrollment.objects.get(student=self.student).save()
+        self.client.force_authenticate(self.student.user)
+        self.assertEqual(self.client.get(url).data['schedules'], [])
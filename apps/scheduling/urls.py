@@ -6,6 +6,7 @@ router = DefaultRouter()
 router.register(r'time-slots', views.TimeSlotViewSet)
 router.register(r'schedules', views.ScheduleViewSet)
 router.register(r'sessions', views.CourseSessionViewSet)
+router.register(r'holidays', views.HolidayViewSet)
 router.register(r'announcements', views.AnnouncementViewSet)
 
 urlpatterns = [
@@ -5,6 +5,7 @@ This module provides ViewSets for managing scheduling-related data:
 - TimeSlot: Time slot definitions for scheduling
 - Schedule: Course schedules with conflict detection
 - CourseSession: Individual course session instances
+- Holiday: Closure days without course sessions
 - Announcement: System announcements with target audience
 """
 
@@ -14,16 +15,24 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from django.db.models import Q
 
 from apps.core.permissions import IsAdminOrReadOnly, IsSecretaryOrAdmin, IsTeacherOrAdmin
-from .models import TimeSlot, Schedule, CourseSession, Announcement
+from .models import TimeSlot, Schedule, CourseSession, Holiday, Announcement
 from .serializers import (
     TimeSlotSerializer, ScheduleSerializer,
     CourseSessionSerializer, AnnouncementSerializer,
     ScheduleListSerializer, ScheduleDetailSerializer,
-    ScheduleCreateSerializer
+    ScheduleCreateSerializer, CourseSessionGenerateSerializer,
+    HolidaySerializer, ScheduleBatchSerializer, TimetableSolveSerializer
 )
+from .services.announcements import announcements_feed
+from .services.batch import create_schedules, resolve_schedule_rows
+from .services.conflicts import ConflictIndex
+from .services.excel import ScheduleExcelService
+from .services.sessions import generate_course_sessions
+from .services.solver import publish_draft_schedules, solve_timetable
 
 
 class TimeSlotViewSet(viewsets.ModelViewSet):
@@ -66,6 +75,9 @@ class ScheduleViewSet(viewsets.ModelViewSet):
     - by_teacher: GET /api/scheduling/schedules/by_teacher/?teacher_id=X
     - by_program: GET /api/scheduling/schedules/by_program/?program_id=X
     - check_conflicts: POST /api/scheduling/schedules/check_conflicts/
+    - batch: POST /api/scheduling/schedules/batch/
+    - import_excel: POST /api/scheduling/schedules/import_excel/
+    - download_template: GET /api/scheduling/schedules/download_template/
     
     Permissions:
     - Read: All authenticated users
@@ -86,7 +98,7 @@ class ScheduleViewSet(viewsets.ModelViewSet):
 
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['course', 'teacher', 'semester', 'classroom', 'is_active']
+    filterset_fields = ['course', 'teacher', 'semester', 'classroom', 'is_active', 'is_draft']
     search_fields = ['course__name', 'course__code', 'teacher__user__first_name', 
                      'teacher__user__last_name', 'classroom__name']
     ordering_fields = ['created_at', 'time_slot__day', 'time_slot__start_time']
@@ -99,7 +111,9 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         - Read operations: All authenticated users
         - Write operations: Admin and Secretary only
         """
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'check_conflicts']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'check_conflicts',
+                           'batch', 'import_excel', 'download_template', 'solve',
+                           'publish_drafts']:
             return [IsAuthenticated(), IsSecretaryOrAdmin()]
         return [IsAuthenticated()]
 
@@ -109,48 +123,16 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         
         Returns a tuple: (has_conflicts, conflicts_list)
         """
-        conflicts = []
-        teacher = schedule_data.get('teacher')
-        classroom = schedule_data.get('classroom')
         semester = schedule_data.get('semester')
         time_slot = schedule_data.get('time_slot')
+        if not (semester and time_slot):
+            return False, []
         
-        # Build base query
-        base_query = Schedule.objects.filter(
-            semester=semester,
-            time_slot=time_slot,
-            is_active=True
-        )
-        
-        if exclude_pk:
-            base_query = base_query.exclude(pk=exclude_pk)
-        
-        # Check teacher conflicts
-        if teacher:
-            teacher_conflicts = base_query.filter(teacher=teacher)
-            for conflict in teacher_conflicts:
-                conflicts.append({
-                    'type': 'teacher',
-                    'message': f"L'enseignant a déjà un cours à ce créneau",
-                    'teacher_name': conflict.teacher.user.get_full_name(),
-                    'time_slot': str(conflict.time_slot),
-                    'conflicting_course': conflict.course.name,
-                    'conflicting_schedule_id': conflict.id
-                })
-        
-        # Check classroom conflicts
-        if classroom:
-            classroom_conflicts = base_query.filter(classroom=classroom)
-            for conflict in classroom_conflicts:
-                conflicts.append({
-                    'type': 'classroom',
-                    'message': f"La salle est déjà occupée à ce créneau",
-                    'classroom_name': conflict.classroom.name,
-                    'time_slot': str(conflict.time_slot),
-                    'conflicting_course': conflict.course.name,
-                    'conflicting_schedule_id': conflict.id
-                })
-        
+        teacher = schedule_data.get('teacher')
+        classroom = schedule_data.get('classroom')
+        conflicts = ConflictIndex.live(
+            semester, teachers=[teacher], classrooms=[classroom],
+        ).check(teacher, classroom, time_slot, exclude=exclude_pk)
         return len(conflicts) > 0, conflicts
 
     def create(self, request, *args, **kwargs):
@@ -260,65 +242,7 @@ class ScheduleViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        schedules = Schedule.objects.filter(
-            semester_id=semester_id,
-            is_active=True
-        ).select_related('teacher', 'teacher__user', 'classroom', 'time_slot', 'course')
-        
-        conflicts = []
-        
-        # Check teacher conflicts
-        teacher_slots = {}
-        for schedule in schedules:
-            key = (schedule.teacher_id, schedule.time_slot_id)
-            if key in teacher_slots:
-                conflicts.append({
-                    'type': 'teacher',
-                    'teacher_id': schedule.teacher_id,
-                    'teacher_name': schedule.teacher.user.get_full_name(),
-                    'time_slot': str(schedule.time_slot),
-                    'courses': [
-                        {
-                            'id': teacher_slots[key].course.id,
-                            'name': teacher_slots[key].course.name,
-                            'schedule_id': teacher_slots[key].id
-                        },
-                        {
-                            'id': schedule.course.id,
-                            'name': schedule.course.name,
-                            'schedule_id': schedule.id
-                        }
-                    ]
-                })
-            else:
-                teacher_slots[key] = schedule
-        
-        # Check classroom conflicts
-        classroom_slots = {}
-        for schedule in schedules:
-            if schedule.classroom:
-                key = (schedule.classroom_id, schedule.time_slot_id)
-                if key in classroom_slots:
-                    conflicts.append({
-                        'type': 'classroom',
-                        'classroom_id': schedule.classroom_id,
-                        'classroom_name': schedule.classroom.name,
-                        'time_slot': str(schedule.time_slot),
-                        'courses': [
-                            {
-                                'id': classroom_slots[key].course.id,
-                                'name': classroom_slots[key].course.name,
-                                'schedule_id': classroom_slots[key].id
-                            },
-                            {
-                                'id': schedule.course.id,
-                                'name': schedule.course.name,
-                                'schedule_id': schedule.id
-                            }
-                        ]
-                    })
-                else:
-                    classroom_slots[key] = schedule
+        conflicts = ConflictIndex.for_semester(semester_id).report()
         
         return Response({
             'semester_id': semester_id,
@@ -327,6 +251,120 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         })
 
 
+    def _batch_response(self, report):
+        return Response(
+            report,
+            status=status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
+    def batch(self, request):
+        """
+        Create a whole weekly timetable in one transaction.
+        
+        Expected payload:
+        {
+            "semester": <semester_id>,
+            "program": <program_id>,   (optional, rejects courses of other programs)
+            "schedules": [
+                {"course": <id>, "teacher": <id>, "time_slot": <id>, "classroom": <id>},
+                ...
+            ]
+        }
+        
+        Rows are checked against the semester and against each other; if any
+        row is invalid or clashes nothing is created and the consolidated
+        report lists every problem.
+        """
+        serializer = ScheduleBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        rows, errors = resolve_schedule_rows(data['schedules'], program=data.get('program'))
+        return self._batch_response(create_schedules(data['semester'], rows, errors))
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
+    def import_excel(self, request):
+        """
+        Import a weekly timetable from Excel or CSV, all rows or none.
+        
+        Form fields: file, semester (id), program (optional id).
+        """
+        from apps.university.models import Program, Semester
+
+        file_obj = request.FILES.get('file')
+        if not file_obj:
+            return Response(
+                {"error": "Aucun fichier fourni"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        semester = Semester.objects.filter(pk=request.data.get('semester') or None).first()
+        if semester is None:
+            return Response(
+                {"error": "Semestre non trouvé"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        program = None
+        if request.data.get('program'):
+            program = Program.objects.filter(pk=request.data['program']).first()
+            if program is None:
+                return Response(
+                    {"error": "Programme non trouvé"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        return self._batch_response(
+            ScheduleExcelService.import_schedules(file_obj, semester, program=program)
+        )
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
+    def download_template(self, request):
+        """Download the timetable import template."""
+        from django.http import HttpResponse
+
+        excel_file = ScheduleExcelService.download_template()
+
+        response = HttpResponse(
+            excel_file,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        response['Content-Disposition'] = 'attachment; filename="template_import_emploi_du_temps.xlsx"'
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
+    def solve(self, request):
+        """
+        Generate a draft timetable for the unscheduled courses of a semester.
+        
+        Expected payload: {"semester": <semester_id>}
+        
+        Previous drafts are replaced; the new ones are inactive schedules
+        (is_draft=true) to review, then activate with publish_drafts.
+        """
+        serializer = TimetableSolveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        semester = serializer.validated_data['semester']
+        return Response(
+            {'semester_id': semester.id, **solve_timetable(semester)},
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
+    def publish_drafts(self, request):
+        """
+        Activate the draft timetable of a semester, or none of it on a clash.
+        
+        Expected payload: {"semester": <semester_id>}
+        """
+        serializer = TimetableSolveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        semester = serializer.validated_data['semester']
+        result = publish_draft_schedules(semester)
+        return Response(
+            {'semester_id': semester.id, **result},
+            status=status.HTTP_400_BAD_REQUEST if result['conflicts'] else status.HTTP_200_OK
+        )
+
+
 class CourseSessionViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing course sessions.
@@ -340,6 +378,7 @@ class CourseSessionViewSet(viewsets.ModelViewSet):
     
     Custom Actions:
     - cancel: POST /api/scheduling/course-sessions/{id}/cancel/
+    - generate: POST /api/scheduling/course-sessions/generate/
     
     Permissions:
     - Read: All authenticated users
@@ -363,7 +402,10 @@ class CourseSessionViewSet(viewsets.ModelViewSet):
         
         - Read operations: All authenticated users
         - Write operations: Teachers and Admin only
+        - generate: Admin and Secretary only
         """
+        if self.action == 'generate':
+            return [IsAuthenticated(), IsSecretaryOrAdmin()]
         if self.action in ['create', 'update', 'partial_update', 'destroy', 'cancel']:
             return [IsAuthenticated(), IsTeacherOrAdmin()]
         return [IsAuthenticated()]
@@ -402,6 +444,63 @@ class CourseSessionViewSet(viewsets.ModelViewSet):
             'reason': reason
         })
 
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """
+        Create the sessions of a whole semester from its active schedules.
+        
+        Expected payload:
+        {
+            "semester": <semester_id>,
+            "schedules": [<schedule_id>, ...],   (optional, all by default)
+            "start_date": "YYYY-MM-DD",          (optional)
+            "end_date": "YYYY-MM-DD",            (optional)
+            "prune": false                       (optional)
+        }
+        
+        Holidays are skipped and existing sessions are kept, so the call
+        can be repeated after timetable edits.
+        """
+        serializer = CourseSessionGenerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = generate_course_sessions(
+            data['semester'],
+            schedule_ids=data.get('schedules'),
+            start_date=data.get('start_date'),
+            end_date=data.get('end_date'),
+            prune=data['prune'],
+        )
+        return Response({'semester_id': data['semester'].id, **result})
+
+
+class HolidayViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet for managing holidays and closure periods.
+    
+    Provides:
+    - List: GET /api/scheduling/holidays/
+    - Create: POST /api/scheduling/holidays/
+    - Retrieve: GET /api/scheduling/holidays/{id}/
+    - Update: PUT/PATCH /api/scheduling/holidays/{id}/
+    - Delete: DELETE /api/scheduling/holidays/{id}/
+    
+    Permissions:
+    - Read: All authenticated users
+    - Write: Admin and Secretary only
+    """
+    queryset = Holiday.objects.all()
+    serializer_class = HolidaySerializer
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name']
+    ordering_fields = ['start_date']
+    ordering = ['start_date']
+
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve']:
+            return [IsAuthenticated()]
+        return [IsAuthenticated(), IsSecretaryOrAdmin()]
+
 
 class AnnouncementViewSet(viewsets.ModelViewSet):
     """
@@ -484,38 +583,35 @@ class AnnouncementViewSet(viewsets.ModelViewSet):
         - target_audience: Filter by target audience
         - faculty_id: Filter by faculty
         - program_id: Filter by program
-        """
-        now = timezone.now()
-        
-        queryset = Announcement.objects.filter(
-            is_published=True,
-            publish_date__lte=now
-        ).filter(
-            Q(expiry_date__isnull=True) | Q(expiry_date__gte=now)
-        ).select_related('faculty', 'program', 'created_by')
-        
-        # Apply optional filters
-        target_audience = request.query_params.get('target_audience')
-        if target_audience:
-            queryset = queryset.filter(target_audience=target_audience)
-        
-        faculty_id = request.query_params.get('faculty_id')
-        if faculty_id:
-            queryset = queryset.filter(
-                Q(faculty_id=faculty_id) | Q(faculty__isnull=True)
-            )
         
-        program_id = request.query_params.get('program_id')
-        if program_id:
-            queryset = queryset.filter(
-                Q(program_id=program_id) | Q(program__isnull=True)
+        The feed is cached per audience, faculty and program until an
+        announcement is written or the next one expires or goes live, and
+        served with an ETag; a matching If-None-Match gets 304 Not Modified.
+        """
+        params = request.query_params
+        target_audience = params.get('target_audience') or None
+        if target_audience and target_audience not in Announcement.TargetAudience.values:
+            return Response(
+                {'error': 'Public cible invalide'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Order by pinned first, then by date
-        queryset = queryset.order_by('-is_pinned', '-publish_date')
-        
-        serializer = AnnouncementSerializer(queryset, many=True)
-        return Response({
-            'count': queryset.count(),
-            'results': serializer.data
-        })
+        ids = {}
+        for param in ('faculty_id', 'program_id'):
+            value = params.get(param) or None
+            if value and not value.isdigit():
+                return Response(
+                    {'error': f'{param} doit être un entier'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            ids[param] = int(value) if value else None
+        
+        feed = announcements_feed(target_audience, ids['faculty_id'], ids['program_id'])
+        response = get_conditional_response(request, etag=feed['etag'])
+        if response is None:
+            response = Response({
+                'count': feed['count'],
+                'results': feed['results']
+            })
+        response['ETag'] = feed['etag']
+        response['Cache-Control'] = 'max-age=0, must-revalidate'
+        return response
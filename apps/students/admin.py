@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Student, Enrollment, Attendance
+from .models import Student, Enrollment, Attendance, AttendanceSummary
 
 
 @admin.register(Student)
@@ -22,3 +22,10 @@ class AttendanceAdmin(admin.ModelAdmin):
     list_display = ['student', 'course_session', 'status', 'recorded_at', 'recorded_by']
     list_filter = ['status', 'recorded_at']
     raw_id_fields = ['student', 'course_session']
+
+
+@admin.register(AttendanceSummary)
+class AttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ['student', 'course', 'semester', 'present', 'absent', 'late', 'excused', 'updated_at']
+    list_filter = ['semester']
+    raw_id_fields = ['student', 'course']
@@ -5,3 +5,6 @@ class StudentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.students"
     verbose_name = "Gestion des étudiants"
+
+    def ready(self):
+        import apps.students.signals
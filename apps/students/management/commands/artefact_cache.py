@@ -0,0 +1,29 @@
+"""Inspect and maintain the on-disk cache of generated files."""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.core.services.artefacts import artefacts
+
+
+class Command(BaseCommand):
+    help = 'Show stats of, prune or clear the shared artefact cache (ID cards, exports)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['stats', 'prune', 'clear'])
+        parser.add_argument(
+            '--namespace',
+            help='Only clear this namespace, e.g. id-cards',
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+        if action == 'prune':
+            evicted = artefacts.prune()
+            self.stdout.write(self.style.SUCCESS(f"{evicted} files evicted"))
+        elif action == 'clear':
+            artefacts.clear(options['namespace'])
+            self.stdout.write(self.style.SUCCESS("Artefact cache cleared"))
+        else:
+            self.stdout.write(json.dumps(artefacts.stats(), indent=2))
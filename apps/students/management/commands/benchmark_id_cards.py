@@ -0,0 +1,69 @@
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.students.models import Student
+from apps.students.services.id_card import (
+    ID_CARD_WORKERS, IDCardGenerator, card_render_pool, render_cards,
+)
+from apps.university.models import Level, Program
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compares ID card throughput of the sequential loop and the bulk render pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=200, help='Cards rendered per run')
+        parser.add_argument(
+            '--workers', type=int, default=ID_CARD_WORKERS,
+            help='Processes of the render pool (default: ID_CARD_WORKERS)',
+        )
+
+    def _generators(self, count):
+        # Unsaved students: the benchmark never touches the database or cache.
+        program = Program(name='Licence en Informatique de Gestion')
+        level = Level(name='L2')
+        return [
+            IDCardGenerator(
+                Student(
+                    user=User(first_name='Aminata', last_name=f'Diallo {index}'),
+                    student_id=f'FST2526FA{index:06d}',
+                    program=program,
+                    current_level=level,
+                    enrollment_date=date(2025, 10, 6),
+                ),
+                academic_period=('2025 - 2026', '10/09/2026'),
+            )
+            for index in range(count)
+        ]
+
+    def _run(self, label, render, count):
+        generators = self._generators(count)
+        started = time.perf_counter()
+        images = render(generators)
+        elapsed = time.perf_counter() - started
+        failed = sum(image is None for image in images)
+        rate = count / elapsed
+        self.stdout.write(f"{label}: {count} cards in {elapsed:.2f}s ({rate:.1f} cards/s, {failed} failed)")
+        return rate
+
+    def handle(self, *args, **options):
+        count = options['cards']
+        workers = options['workers']
+        # Warm the fonts, logo and static template like a long-lived worker.
+        self._generators(1)[0].generate()
+
+        sequential = self._run(
+            'Sequential loop', lambda generators: [g.generate().getvalue() for g in generators], count,
+        )
+        with card_render_pool(workers) as pool:
+            # Start the workers before timing, as in a reused pool.
+            render_cards(self._generators(max(workers, 1)), pool)
+            pooled = self._run(
+                f'Render pool ({workers} workers)', lambda generators: render_cards(generators, pool), count,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Speed-up: {pooled / sequential:.2f}x"))
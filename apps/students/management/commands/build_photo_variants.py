@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.students.models import Student
+from apps.students.services.photos import build_photo_variants, current_variants
+
+
+class Command(BaseCommand):
+    help = 'Builds the resized, EXIF-free derivatives of student photos uploaded before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild the derivatives of every photo, not only the missing ones',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Building student photo derivatives...")
+        built = skipped = failed = 0
+        students = Student.objects.exclude(photo='').exclude(photo__isnull=True).only(
+            'pk', 'student_id', 'photo', 'photo_variants',
+        )
+        for student in students.iterator(chunk_size=200):
+            if current_variants(student) and not options['force']:
+                skipped += 1
+                continue
+            if build_photo_variants(student, force=options['force']):
+                built += 1
+            else:
+                failed += 1
+        self.stdout.write(f"{built} built, {skipped} already up to date, {failed} unreadable")
+        self.stdout.write(self.style.SUCCESS("Student photo derivatives are up to date"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.students.services.attendance import rebuild_attendance_summaries
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-course attendance summaries from the attendance records'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding attendance summaries...")
+        count = rebuild_attendance_summaries()
+        self.stdout.write(self.style.SUCCESS(f"{count} attendance summaries rebuilt"))
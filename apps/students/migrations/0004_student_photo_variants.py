@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0003_student_photo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='photo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Déclinaisons de la photo'),
+        ),
+    ]
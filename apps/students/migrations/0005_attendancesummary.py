@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0005_coursegrade_publication_state'),
+        ('students', '0004_student_photo_variants'),
+        ('university', '0004_identifiersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('present', models.IntegerField(default=0, verbose_name='Présent')),
+                ('absent', models.IntegerField(default=0, verbose_name='Absent')),
+                ('late', models.IntegerField(default=0, verbose_name='En retard')),
+                ('excused', models.IntegerField(default=0, verbose_name='Excusé')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='academics.course', verbose_name='Cours')),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='university.semester', verbose_name='Semestre')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='students.student', verbose_name='Étudiant')),
+            ],
+            options={
+                'verbose_name': 'Bilan de présence',
+                'verbose_name_plural': 'Bilans de présence',
+                'indexes': [models.Index(fields=['course', 'semester'], name='attendance_summary_course'), models.Index(fields=['semester', 'absent'], name='attendance_summary_absent')],
+                'unique_together': {('student', 'course', 'semester')},
+            },
+        ),
+    ]
@@ -1,6 +1,11 @@
+import re
+from collections import defaultdict
+
 from django.db import models
 from django.conf import settings
 
+from apps.university.models import IdentifierSequence
+
 
 class Student(models.Model):
     """Profil étudiant lié à un utilisateur."""
@@ -11,6 +16,11 @@ class Student(models.Model):
         SUSPENDED = 'SUSPENDED', 'Suspendu'
         DROPPED = 'DROPPED', 'Abandonné'
 
+    # IdentifierSequence counters of the student matricules, and the shape
+    # of a generated one: [FACULTY][YY][YY+1][GENDER][INITIAL][SEQ].
+    ID_SEQUENCE_SCOPE = 'student'
+    ID_PATTERN = re.compile(r'(?P<prefix>.+\d{4}[MF].)(?P<sequence>\d{6,})')
+
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -63,6 +73,13 @@ class Student(models.Model):
         null=True,
         verbose_name="Photo de profil"
     )
+    # {'source': photo name, variant: derivative name}; see services/photos.py.
+    photo_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Déclinaisons de la photo"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -71,16 +88,73 @@ class Student(models.Model):
         verbose_name_plural = "Étudiants"
         ordering = ['student_id']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_student_id = instance.__dict__.get('student_id')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.student_id:
             self.generate_student_id()
+        elif self.student_id != getattr(self, '_saved_student_id', None):
+            # An explicit matricule: later generated ones must not reuse it.
+            IdentifierSequence.seed_from(self.ID_SEQUENCE_SCOPE, [self.student_id], self.ID_PATTERN)
         super().save(*args, **kwargs)
+        self._saved_student_id = self.student_id
 
     def generate_student_id(self):
         """
         Génère un matricule au format: [FACULTY][YY][YY+1][GENDER][INITIAL][SEQ]
         Exemple: FST1920MA007817
         """
+        prefix = self.student_id_prefix()
+
+        # 5. Sequence (6 digits), from the per-prefix counter
+        sequence = IdentifierSequence.reserve(
+            self.ID_SEQUENCE_SCOPE, prefix, seed=lambda: Student._last_sequence(prefix),
+        )
+        self.student_id = f"{prefix}{sequence:06d}"
+
+    @classmethod
+    def allocate_student_ids(cls, students):
+        """
+        Attribue les matricules d'un lot d'étudiants non enregistrés en
+        réservant un bloc de séquences par préfixe. Les matricules déjà
+        fournis sont gardés et avancent les compteurs de leur préfixe.
+        """
+        IdentifierSequence.seed_from(
+            cls.ID_SEQUENCE_SCOPE,
+            [student.student_id for student in students if student.student_id],
+            cls.ID_PATTERN,
+        )
+        by_prefix = defaultdict(list)
+        for student in students:
+            if not student.student_id:
+                by_prefix[student.student_id_prefix()].append(student)
+        for prefix, group in by_prefix.items():
+            first = IdentifierSequence.reserve(
+                cls.ID_SEQUENCE_SCOPE, prefix, count=len(group),
+                seed=lambda: cls._last_sequence(prefix),
+            )
+            for sequence, student in enumerate(group, start=first):
+                student.student_id = f"{prefix}{sequence:06d}"
+
+    @classmethod
+    def _last_sequence(cls, prefix):
+        # Find last student with this prefix
+        last_student = cls.objects.filter(student_id__startswith=prefix).order_by('-student_id').first()
+
+        if last_student:
+            # Extract last 6 digits
+            try:
+                return int(last_student.student_id[-6:])
+            except ValueError:
+                return 0
+        return 0
+
+    def student_id_prefix(self):
+        """Préfixe du matricule: [FACULTY][YY][YY+1][GENDER][INITIAL]."""
         # 1. Faculty Code
         faculty_code = self.program.department.faculty.code.upper()
         
@@ -106,23 +180,7 @@ class Student(models.Model):
         # Usually name = First Name.
         initial = self.user.first_name[0].upper() if self.user.first_name else 'X'
         
-        prefix = f"{faculty_code}{year_str}{gender}{initial}"
-        
-        # 5. Sequence (6 digits)
-        # Find last student with this prefix
-        last_student = Student.objects.filter(student_id__startswith=prefix).order_by('-student_id').first()
-        
-        if last_student:
-            # Extract last 6 digits
-            try:
-                last_seq = int(last_student.student_id[-6:])
-                new_seq = last_seq + 1
-            except ValueError:
-                new_seq = 1
-        else:
-            new_seq = 1
-            
-        self.student_id = f"{prefix}{new_seq:06d}"
+        return f"{faculty_code}{year_str}{gender}{initial}"
 
     def __str__(self):
         return f"{self.student_id} - {self.user.get_full_name()}"
@@ -226,6 +284,58 @@ class Attendance(models.Model):
         return f"{self.student} - {self.course_session} ({self.get_status_display()})"
 
 
+class AttendanceSummary(models.Model):
+    """Compteurs de présence d'un étudiant pour un cours et un semestre."""
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name='attendance_summaries',
+        verbose_name="Étudiant"
+    )
+    course = models.ForeignKey(
+        'academics.Course',
+        on_delete=models.CASCADE,
+        related_name='attendance_summaries',
+        verbose_name="Cours"
+    )
+    semester = models.ForeignKey(
+        'university.Semester',
+        on_delete=models.CASCADE,
+        related_name='attendance_summaries',
+        verbose_name="Semestre"
+    )
+    present = models.IntegerField(default=0, verbose_name="Présent")
+    absent = models.IntegerField(default=0, verbose_name="Absent")
+    late = models.IntegerField(default=0, verbose_name="En retard")
+    excused = models.IntegerField(default=0, verbose_name="Excusé")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Attendance status -> counter field.
+    STATUS_FIELDS = {
+        Attendance.AttendanceStatus.PRESENT: 'present',
+        Attendance.AttendanceStatus.ABSENT: 'absent',
+        Attendance.AttendanceStatus.LATE: 'late',
+        Attendance.AttendanceStatus.EXCUSED: 'excused',
+    }
+
+    class Meta:
+        verbose_name = "Bilan de présence"
+        verbose_name_plural = "Bilans de présence"
+        unique_together = ['student', 'course', 'semester']
+        indexes = [
+            models.Index(fields=['course', 'semester'], name='attendance_summary_course'),
+            models.Index(fields=['semester', 'absent'], name='attendance_summary_absent'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.course} ({self.semester})"
+
+    @property
+    def total_sessions(self):
+        return self.present + self.absent + self.late + self.excused
+
+
 class StudentPromotion(models.Model):
     """Historique des promotions/délibérations annuelles."""
 
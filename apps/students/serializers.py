@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Student, Enrollment, Attendance
+from .services.photos import current_variants
 
 
 # Student Serializers
@@ -14,7 +15,27 @@ class StudentPhotoValidationMixin:
         return value
 
 
-class StudentListSerializer(serializers.ModelSerializer):
+class StudentPhotoVariantsMixin(serializers.Serializer):
+    """URLs of the resized photo derivatives, null until they are built."""
+    photo_thumbnail = serializers.SerializerMethodField()
+    photo_display = serializers.SerializerMethodField()
+
+    def _variant_url(self, obj, variant):
+        name = current_variants(obj).get(variant)
+        if not name:
+            return None
+        url = obj.photo.storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_photo_thumbnail(self, obj):
+        return self._variant_url(obj, 'thumb')
+
+    def get_photo_display(self, obj):
+        return self._variant_url(obj, 'display')
+
+
+class StudentListSerializer(StudentPhotoVariantsMixin, serializers.ModelSerializer):
     """List serializer for Student with basic fields."""
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
     first_name = serializers.CharField(source='user.first_name', read_only=True)
@@ -30,11 +51,13 @@ class StudentListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'student_id', 'user_name', 'first_name', 'last_name', 'program_name',
             'current_level', 'level_display', 'status', 'status_display', 'enrollment_date',
-            'photo'
+            'photo', 'photo_thumbnail', 'photo_display'
         ]
 
 
-class StudentDetailSerializer(StudentPhotoValidationMixin, serializers.ModelSerializer):
+class StudentDetailSerializer(
+    StudentPhotoValidationMixin, StudentPhotoVariantsMixin, serializers.ModelSerializer,
+):
     """Detail serializer for Student with all fields and computed properties."""
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
     first_name = serializers.CharField(source='user.first_name', read_only=True)
@@ -59,7 +82,7 @@ class StudentDetailSerializer(StudentPhotoValidationMixin, serializers.ModelSeri
     
     class Meta:
         model = Student
-        fields = '__all__'
+        exclude = ['photo_variants']
     
     def get_enrollments_count(self, obj):
         return obj.enrollments.count()
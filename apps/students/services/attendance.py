@@ -0,0 +1,233 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from apps.audit.signals import audit_bulk_create, audit_bulk_update
+from apps.scheduling.models import CourseSession
+
+from ..models import Attendance, AttendanceSummary, Enrollment, Student
+
+# Share of unexcused absences (in percent) from which a student is at risk.
+ATTENDANCE_ALERT_THRESHOLD = getattr(settings, 'ATTENDANCE_ALERT_THRESHOLD', 25)
+
+COUNTER_FIELDS = tuple(AttendanceSummary.STATUS_FIELDS.values())
+
+
+def _as_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@transaction.atomic
+def record_session_attendance(course_session, rows, recorded_by):
+    """
+    Record the roll call of one course session in a constant number of queries.
+
+    rows are {'student', 'status', 'remarks'} dicts. The students, their
+    active enrollment in the session's program and the attendance already
+    recorded are read once; valid rows are then upserted with a single
+    bulk_create(update_conflicts=True). A student listed twice keeps the last
+    entry. Returns (created, updated, errors) like the former per-row loop.
+    """
+    students = Student.objects.select_related('user').in_bulk(
+        {_as_pk(row.get('student')) for row in rows} - {None}
+    )
+    enrolled = set(Enrollment.objects.filter(
+        student_id__in=students,
+        program_id=course_session.schedule.course.program_id,
+        is_active=True,
+    ).values_list('student_id', flat=True))
+    already_recorded = {
+        attendance.student_id: attendance
+        for attendance in Attendance.objects.filter(
+            course_session=course_session, student_id__in=enrolled,
+        ).only('pk', 'student_id', 'course_session_id', 'status')
+    }
+
+    attendances = {}
+    created_count = 0
+    updated_count = 0
+    errors = []
+    for row in rows:
+        student_id = _as_pk(row.get('student'))
+        if student_id not in students:
+            errors.append({"student_id": row.get('student'), "error": "Étudiant non trouvé"})
+            continue
+        if student_id not in enrolled:
+            errors.append({"student_id": row.get('student'), "error": "Étudiant non inscrit à ce cours"})
+            continue
+
+        if student_id in already_recorded or student_id in attendances:
+            updated_count += 1
+        else:
+            created_count += 1
+        attendances[student_id] = Attendance(
+            student=students[student_id],
+            course_session=course_session,
+            status=row.get('status', Attendance.AttendanceStatus.PRESENT),
+            remarks=row.get('remarks', ''),
+            recorded_by=recorded_by,
+        )
+
+    if attendances:
+        Attendance.objects.bulk_create(
+            attendances.values(),
+            update_conflicts=True,
+            unique_fields=['student', 'course_session'],
+            update_fields=['status', 'remarks', 'recorded_by'],
+        )
+        # bulk_create sends no signals: move the counters and audit explicitly.
+        record_attendance_counts(
+            added=list(attendances.values()),
+            removed=[already_recorded[student_id] for student_id in attendances
+                     if student_id in already_recorded],
+        )
+        audit_bulk_create(Attendance, [
+            attendance for student_id, attendance in attendances.items()
+            if student_id not in already_recorded
+        ])
+        audit_bulk_update(Attendance, [
+            attendance for student_id, attendance in attendances.items()
+            if student_id in already_recorded
+        ])
+    return created_count, updated_count, errors
+
+
+def _session_scopes(attendances):
+    """Return {course_session_id: (course_id, semester_id)} for attendances."""
+    scopes = {}
+    for attendance in attendances:
+        if not Attendance.course_session.is_cached(attendance):
+            continue
+        session = attendance.course_session
+        if CourseSession.schedule.is_cached(session):
+            scopes[session.pk] = (session.schedule.course_id, session.schedule.semester_id)
+    missing = {attendance.course_session_id for attendance in attendances} - scopes.keys()
+    if missing:
+        scopes.update(
+            (pk, (course_id, semester_id))
+            for pk, course_id, semester_id in CourseSession.objects.filter(
+                pk__in=missing,
+            ).values_list('pk', 'schedule__course_id', 'schedule__semester_id')
+        )
+    return scopes
+
+
+@transaction.atomic
+def record_attendance_counts(added=(), removed=()):
+    """
+    Count added attendance rows in their summary and withdraw removed ones.
+
+    Deltas are grouped per (student, course, semester) first. Missing summary
+    rows are inserted with ignore_conflicts, then every counter moves in a
+    single UPDATE, so a whole roll call costs three queries whatever its
+    size. Bulk writes that bypass model signals must call this.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    scopes = _session_scopes([*added, *removed])
+    for sign, attendances in ((1, added), (-1, removed)):
+        for attendance in attendances:
+            scope = scopes.get(attendance.course_session_id)
+            field = AttendanceSummary.STATUS_FIELDS.get(attendance.status)
+            if scope is None or field is None:
+                continue
+            deltas[(attendance.student_id, *scope)][field] += sign
+    deltas = {key: delta for key, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+
+    AttendanceSummary.objects.bulk_create([
+        AttendanceSummary(student_id=student_id, course_id=course_id, semester_id=semester_id)
+        for student_id, course_id, semester_id in deltas
+    ], batch_size=500, ignore_conflicts=True)
+
+    rows = AttendanceSummary.objects.select_for_update().filter(
+        student_id__in={key[0] for key in deltas},
+        course_id__in={key[1] for key in deltas},
+        semester_id__in={key[2] for key in deltas},
+    ).values_list('pk', 'student_id', 'course_id', 'semester_id')
+    by_pk = {}
+    for pk, student_id, course_id, semester_id in rows:
+        key = (student_id, course_id, semester_id)
+        if key in deltas:
+            by_pk[pk] = deltas[key]
+
+    updates = {}
+    for field in COUNTER_FIELDS:
+        whens = [When(pk=pk, then=Value(delta[field])) for pk, delta in by_pk.items() if delta[field]]
+        if whens:
+            updates[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+    AttendanceSummary.objects.filter(pk__in=by_pk).update(**updates, updated_at=timezone.now())
+
+
+@transaction.atomic
+def rebuild_attendance_summaries():
+    """
+    Re-aggregate every attendance summary from the attendance records.
+
+    Needed after writes that neither send signals nor call
+    record_attendance_counts, or after a schedule changes course or
+    semester. Returns the number of summary rows written.
+    """
+    AttendanceSummary.objects.all().delete()
+    rows = Attendance.objects.order_by().values(
+        'student_id',
+        course_id=F('course_session__schedule__course_id'),
+        semester_id=F('course_session__schedule__semester_id'),
+    ).annotate(**{
+        field: Count('id', filter=Q(status=status))
+        for status, field in AttendanceSummary.STATUS_FIELDS.items()
+    })
+    summaries = AttendanceSummary.objects.bulk_create(
+        [AttendanceSummary(**row) for row in rows], batch_size=500,
+    )
+    return len(summaries)
+
+
+def attendance_summaries(semester_id, course_ids=None):
+    """
+    Summaries of one semester annotated with total, attendance and absence rates.
+
+    Rates are percentages; attendance counts PRESENT and LATE, absence only
+    unexcused ABSENT sessions.
+    """
+    queryset = AttendanceSummary.objects.filter(semester_id=semester_id)
+    if course_ids is not None:
+        queryset = queryset.filter(course_id__in=course_ids)
+    return queryset.select_related('student__user', 'course').annotate(
+        total=F('present') + F('absent') + F('late') + F('excused'),
+    ).filter(total__gt=0)
+
+
+def at_risk_summaries(semester_id, threshold=None, course_ids=None):
+    """Summaries whose unexcused absences reach threshold percent, worst first."""
+    threshold = ATTENDANCE_ALERT_THRESHOLD if threshold is None else threshold
+    # Compare absent * 100 with total * threshold so no division is needed.
+    return attendance_summaries(semester_id, course_ids).annotate(
+        absent_share=F('absent') * 100,
+    ).filter(
+        absent__gt=0, absent_share__gte=F('total') * threshold,
+    ).order_by('-absent', 'student__student_id')
+
+
+def summary_payload(summary):
+    total = summary.total_sessions
+    return {
+        'student': summary.student_id,
+        'student_id': summary.student.student_id,
+        'student_name': summary.student.user.get_full_name(),
+        'course': summary.course_id,
+        'course_code': summary.course.code,
+        'total_sessions': total,
+        'present': summary.present,
+        'absent': summary.absent,
+        'late': summary.late,
+        'excused': summary.excused,
+        'attendance_rate': round((summary.present + summary.late) / total * 100, 2) if total else 0.0,
+        'absence_rate': round(summary.absent / total * 100, 2) if total else 0.0,
+    }
@@ -1,11 +1,19 @@
 import io
+import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from ..models import Student, Enrollment
+from apps.audit.signals import audit_bulk_create
+from apps.core.services.export import EXPORT_CHUNK_SIZE, write_xlsx
+from apps.core.services.imports import ImportFileError, SpreadsheetReader
 from apps.university.models import Program, Level, AcademicYear
 
 User = get_user_model()
@@ -19,19 +27,31 @@ class StudentExcelService:
         'Statut', 'Nom Tuteur', 'Téléphone Tuteur', 'Contact Urgence'
     ]
 
-    @staticmethod
-    def export_students(queryset):
-        """Export students to an Excel workbook."""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Étudiants"
+    # Import field -> accepted header names, matched case-insensitively.
+    IMPORT_COLUMNS = {
+        'matricule': ['Matricule'],
+        'first_name': ['Prénom', 'Prenom', 'First Name'],
+        'last_name': ['Nom', 'Last Name'],
+        'email': ['Email', 'E-mail'],
+        'gender': ['Sexe', 'Genre', 'Gender'],
+        'birth_date': ['Date Naissance', 'Date de naissance', 'Naissance'],
+        'phone': ['Téléphone', 'Telephone', 'Phone'],
+        'program': ['Code Programme', 'Programme', 'Program'],
+        'level': ['Niveau Actuel', 'Niveau', 'Level'],
+        'enrollment_date': ['Date Inscription', 'Date d\'inscription'],
+        'status': ['Statut', 'Status'],
+        'guardian_name': ['Nom Tuteur', 'Tuteur'],
+        'guardian_phone': ['Téléphone Tuteur'],
+        'emergency_contact': ['Contact Urgence', 'Urgence'],
+    }
 
-        # Add headers
-        ws.append(StudentExcelService.HEADERS)
-
-        # Add student data
-        for student in queryset:
-            ws.append([
+    @staticmethod
+    def export_rows(queryset):
+        """Yield one export row per student, fetched in chunks."""
+        for student in queryset.select_related('user', 'program', 'current_level').iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        ):
+            yield [
                 student.student_id,
                 student.user.first_name,
                 student.user.last_name,
@@ -46,13 +66,14 @@ class StudentExcelService:
                 student.guardian_name,
                 student.guardian_phone,
                 student.emergency_contact
-            ])
+            ]
 
-        # Write to memory
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output
+    @staticmethod
+    def export_students(queryset):
+        """Export students to an Excel workbook."""
+        return write_xlsx(
+            StudentExcelService.HEADERS, StudentExcelService.export_rows(queryset), "Étudiants"
+        )
 
     @staticmethod
     def download_template():
@@ -80,202 +101,365 @@ class StudentExcelService:
     @staticmethod
     def import_students(file_obj):
         """
-        Import students from an Excel file.
+        Import students from an Excel or CSV file, one chunk of rows at a time.
+
+        Programs and levels are loaded once, existing emails are fetched with
+        one query per chunk and de-duplicated in memory, passwords are hashed
+        in a thread pool, and users, students, enrollments and balances are
+        written with bulk_create under pre-allocated matricules.
         Returns (success_count, error_list)
         """
         try:
-            wb = load_workbook(file_obj, data_only=True)
-        except Exception as e:
-            return 0, [f"Format de fichier invalide: {str(e)}"]
+            reader = SpreadsheetReader(file_obj, columns=StudentExcelService.IMPORT_COLUMNS)
+        except ImportFileError as e:
+            return 0, [str(e)]
 
-        ws = wb.active
+        programs = list(
+            Program.objects.select_related('department__faculty').prefetch_related('levels')
+        )
+        levels = list(Level.objects.all())
+        current_year = AcademicYear.objects.filter(is_current=True).first()
 
-        # --- Detect header row and build column index map ---
-        header_row = [str(cell.value).strip() if cell.value else "" for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-
-        def col(names):
-            """Return first matching column index (0-based) from list of possible header names."""
-            for name in names:
-                for i, h in enumerate(header_row):
-                    if h.lower() == name.lower():
-                        return i
-            return None
-
-        idx_matricule   = col(['Matricule'])
-        idx_first_name  = col(['Prénom', 'Prenom', 'First Name'])
-        idx_last_name   = col(['Nom', 'Last Name'])
-        idx_email       = col(['Email', 'E-mail'])
-        idx_gender      = col(['Sexe', 'Genre', 'Gender'])
-        idx_birth       = col(['Date Naissance', 'Date de naissance', 'Naissance'])
-        idx_phone       = col(['Téléphone', 'Telephone', 'Phone'])
-        idx_program     = col(['Code Programme', 'Programme', 'Program'])
-        idx_level       = col(['Niveau Actuel', 'Niveau', 'Level'])
-        idx_enroll_date = col(['Date Inscription', 'Date d\'inscription'])
-        idx_status      = col(['Statut', 'Status'])
-        idx_guardian    = col(['Nom Tuteur', 'Tuteur'])
-        idx_guardian_ph = col(['Téléphone Tuteur'])
-        idx_emergency   = col(['Contact Urgence', 'Urgence'])
-
-        def get(row, idx, default=None):
-            if idx is None or idx >= len(row):
-                return default
-            val = row[idx]
-            return str(val).strip() if val is not None else default
-
-        rows = list(ws.iter_rows(min_row=2, values_only=True))
         success_count = 0
         errors = []
+        # Emails and matricules taken by earlier chunks of this file.
+        seen_emails = set()
+        seen_student_ids = set()
 
-        for row_idx, row in enumerate(rows, start=2):
-            if not any(row):  # Skip empty rows
-                continue
-
-            try:
-                with transaction.atomic():
-
-                    def parse_date(val):
-                        if not val:
-                            return None
-                        if isinstance(val, (date, datetime)):
-                            return val.date() if isinstance(val, datetime) else val
-                        if isinstance(val, str):
-                            for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y"):
-                                try:
-                                    return datetime.strptime(val, fmt).date()
-                                except ValueError:
-                                    continue
-                        return None
-
-                    student_id_val   = get(row, idx_matricule)
-                    first_name       = get(row, idx_first_name)
-                    last_name        = get(row, idx_last_name)
-                    email            = get(row, idx_email)
-                    gender           = get(row, idx_gender) or 'M'
-                    birth_date       = parse_date(row[idx_birth] if idx_birth is not None else None)
-                    phone            = get(row, idx_phone) or ''
-                    program_val      = get(row, idx_program)
-                    level_name       = get(row, idx_level)
-                    enroll_date_raw  = row[idx_enroll_date] if idx_enroll_date is not None else None
-                    enroll_date      = parse_date(enroll_date_raw) or timezone.now().date()
-                    status           = get(row, idx_status) or 'ACTIVE'
-                    guardian_name    = get(row, idx_guardian) or ''
-                    guardian_phone   = get(row, idx_guardian_ph) or ''
-                    emergency_contact= get(row, idx_emergency) or ''
-
-                    if not (first_name and last_name and program_val):
-                        raise ValidationError("Les champs Prénom, Nom et Programme sont obligatoires.")
-
-                    # Auto-generate email if missing
-                    import re, unicodedata
-                    def slugify(text):
-                        text = unicodedata.normalize('NFKD', text)
-                        text = text.encode('ascii', 'ignore').decode('ascii')
-                        text = re.sub(r'[^\w\s-]', '', text).strip().lower()
-                        return re.sub(r'[\s]+', '.', text)
-
-                    if not email:
-                        base = f"{slugify(first_name)}.{slugify(last_name)}"
-                        if not base or base == '.':
-                            # Fallback for non-latin names: use row index
-                            base = f"etudiant{row_idx}"
-                        
-                        email = f"{base}@attawoune.edu"
-                        # Make email unique
-                        counter = 1
-                        while User.objects.filter(email=email).exists():
-                            email = f"{base}{counter}@attawoune.edu"
-                            counter += 1
-                    else:
-                        # If email provided in excel but exists, error out
-                        if User.objects.filter(email=email).exists():
-                            raise ValidationError(f"Un utilisateur avec l'email {email} existe déjà.")
-
-                    # Normalize gender
-                    gender_upper = gender.upper() if gender else 'M'
-                    if gender_upper in ('F', 'FEMME', 'FEMALE'):
-                        gender_norm = 'F'
-                    else:
-                        gender_norm = 'M'
-
-                    # Generate a predictable password like "FirstLast@YYYY"
-                    birth_year = birth_date.year if getattr(birth_date, 'year', None) else date.today().year
-                    generated_password = f"{first_name}{last_name}@{birth_year}".replace(" ", "")
-
-                    # 1. Handle User
-                    user = User.objects.create_user(
-                        email=email,
-                        username=email,
-                        password=generated_password,
-                        first_name=first_name,
-                        last_name=last_name,
-                        role='STUDENT',
-                        gender=gender_norm,
-                        date_of_birth=birth_date,
-                        phone=phone,
-                    )
-
-                    # 2. Find Program — try code first, then full name
-                    program_code_part = None
-                    if " - " in program_val:
-                        program_code_part = program_val.split(" - ")[0].strip()
-
-                    program = None
-                    if program_code_part:
-                        program = Program.objects.filter(code__iexact=program_code_part).first()
-                    if not program:
-                        program = Program.objects.filter(code__iexact=program_val).first()
-                    if not program:
-                        program = Program.objects.filter(name__iexact=program_val).first()
-                    if not program:
-                        program = Program.objects.filter(name__icontains=program_val).first()
-
-                    if not program:
-                        raise ValidationError(f"Programme '{program_val}' introuvable. Vérifiez le nom ou le code du programme.")
-
-                    # 3. Find Level
-                    level = None
-                    if level_name:
-                        level = Level.objects.filter(
-                            models.Q(name__iexact=level_name) | models.Q(name__icontains=level_name)
-                        ).first()
-                    if not level:
-                        level = program.levels.first()
-
-                    # 4. Handle Student Profile
-                    student = Student.objects.create(
-                        user=user,
-                        program=program,
-                        current_level=level,
-                        enrollment_date=enroll_date,
-                        status=status,
-                        guardian_name=guardian_name,
-                        guardian_phone=guardian_phone,
-                        emergency_contact=emergency_contact,
-                    )
-
-                    if student_id_val:
-                        student.student_id = student_id_val
-                        student.save()
-
-                    # 5. Handle Enrollment for current year
+        try:
+            for chunk in reader.chunks():
+                rows = []
+                for row_idx, record in chunk:
                     try:
-                        current_year = AcademicYear.objects.get(is_current=True)
-                        Enrollment.objects.get_or_create(
-                            student=student,
-                            academic_year=current_year,
-                            defaults={
-                                'program': program,
-                                'level': level,
-                                'status': 'ENROLLED'
-                            }
-                        )
-                    except AcademicYear.DoesNotExist:
-                        pass
-
-                    success_count += 1
-
-            except Exception as e:
-                errors.append(f"Ligne {row_idx}: {str(e)}")
+                        rows.append(_parse_student_row(row_idx, record, programs, levels))
+                    except ValidationError as e:
+                        errors.append(f"Ligne {row_idx}: {_message(e)}")
+                    except Exception as e:
+                        errors.append(f"Ligne {row_idx}: {str(e)}")
+
+                rows = _assign_emails(rows, seen_emails, errors)
+                rows = _check_student_ids(rows, seen_student_ids, errors)
+                if not rows:
+                    continue
+
+                # Hash outside the transactions: it is the slow part of the import.
+                hashes = _hash_passwords([row['password'] for row in rows])
+                for row, password_hash in zip(rows, hashes):
+                    row['password_hash'] = password_hash
+                try:
+                    success_count += _create_students(rows, current_year)
+                except Exception:
+                    # The chunk was rolled back: insert its rows one by one so
+                    # only the rows the database refuses are reported.
+                    for row in rows:
+                        try:
+                            success_count += _create_students([row], current_year)
+                        except Exception as e:
+                            errors.append(f"Ligne {row['row']}: {str(e)}")
+        except ImportFileError as e:
+            errors.append(str(e))
+        finally:
+            reader.close()
 
         return success_count, errors
 
+
+EMAIL_DOMAIN = 'attawoune.edu'
+
+# PBKDF2 runs in C and releases the GIL, so hashing threads run in parallel.
+PASSWORD_HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def _message(error):
+    return '; '.join(error.messages)
+
+
+def _slugify(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = text.encode('ascii', 'ignore').decode('ascii')
+    text = re.sub(r'[^\w\s-]', '', text).strip().lower()
+    return re.sub(r'[\s]+', '.', text)
+
+
+def _parse_date(val):
+    if not val:
+        return None
+    if isinstance(val, (date, datetime)):
+        return val.date() if isinstance(val, datetime) else val
+    if isinstance(val, str):
+        for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y"):
+            try:
+                return datetime.strptime(val, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def _match_program(programs, value):
+    """Find a program by code, then full name, as the per-row lookups used to."""
+    value_lower = value.lower()
+    candidates = []
+    if " - " in value:
+        candidates.append(lambda p, code=value.split(" - ")[0].strip().lower(): p.code.lower() == code)
+    candidates += [
+        lambda p: p.code.lower() == value_lower,
+        lambda p: p.name.lower() == value_lower,
+        lambda p: value_lower in p.name.lower(),
+    ]
+    for matches in candidates:
+        program = next((p for p in programs if matches(p)), None)
+        if program:
+            return program
+    return None
+
+
+def _match_level(levels, program, name):
+    level = None
+    if name:
+        name_lower = name.lower()
+        level = next((lv for lv in levels if name_lower in lv.name.lower()), None)
+    if not level:
+        # Prefetched in Level ordering, like program.levels.first().
+        level = next(iter(program.levels.all()), None)
+    return level
+
+
+def _parse_student_row(row_idx, record, programs, levels):
+    def get(key, default=None):
+        val = record[key]
+        return str(val).strip() if val is not None else default
+
+    first_name = get('first_name')
+    last_name = get('last_name')
+    program_val = get('program')
+    if not (first_name and last_name and program_val):
+        raise ValidationError("Les champs Prénom, Nom et Programme sont obligatoires.")
+
+    program = _match_program(programs, program_val)
+    if not program:
+        raise ValidationError(f"Programme '{program_val}' introuvable. Vérifiez le nom ou le code du programme.")
+
+    birth_date = _parse_date(record['birth_date'])
+    gender = (get('gender') or 'M').upper()
+    # Generate a predictable password like "FirstLast@YYYY"
+    birth_year = birth_date.year if getattr(birth_date, 'year', None) else date.today().year
+
+    email = get('email')
+    email_base = None
+    if not email:
+        email_base = f"{_slugify(first_name)}.{_slugify(last_name)}"
+        if not email_base or email_base == '.':
+            # Fallback for non-latin names: use row index
+            email_base = f"etudiant{row_idx}"
+
+    row = {
+        'row': row_idx,
+        'student_id': get('matricule'),
+        'first_name': first_name,
+        'last_name': last_name,
+        'email': User.objects.normalize_email(email) if email else None,
+        'email_base': email_base,
+        'gender': 'F' if gender in ('F', 'FEMME', 'FEMALE') else 'M',
+        'birth_date': birth_date,
+        'phone': get('phone') or '',
+        'program': program,
+        'level': _match_level(levels, program, get('level')),
+        'enrollment_date': _parse_date(record['enrollment_date']) or timezone.now().date(),
+        'status': get('status') or 'ACTIVE',
+        'guardian_name': get('guardian_name') or '',
+        'guardian_phone': get('guardian_phone') or '',
+        'emergency_contact': get('emergency_contact') or '',
+        'password': f"{first_name}{last_name}@{birth_year}".replace(" ", ""),
+    }
+    _check_constraints(row)
+    return row
+
+
+# Row key -> (model, field) written by _create_students.
+CONSTRAINED_FIELDS = {
+    'first_name': (User, 'first_name'),
+    'last_name': (User, 'last_name'),
+    'email': (User, 'email'),
+    'phone': (User, 'phone'),
+    'student_id': (Student, 'student_id'),
+    'status': (Student, 'status'),
+    'guardian_name': (Student, 'guardian_name'),
+    'guardian_phone': (Student, 'guardian_phone'),
+    'emergency_contact': (Student, 'emergency_contact'),
+}
+
+
+def _check_constraints(row):
+    """
+    Reject the values the database would refuse, before the bulk insert.
+
+    A chunk is inserted in one transaction, so a single overlong value
+    would otherwise cancel all of its rows. Choices also accept their label
+    ("Actif" for ACTIVE), as written by the export.
+    """
+    problems = []
+    for key, (model, name) in CONSTRAINED_FIELDS.items():
+        value = row[key]
+        if not value:
+            continue
+        field = model._meta.get_field(name)
+        if field.choices:
+            choices = {str(label).lower(): choice for choice, label in field.flatchoices}
+            choices.update({choice.lower(): choice for choice, _ in field.flatchoices})
+            if value.lower() not in choices:
+                problems.append(f"{field.verbose_name}: valeur '{value}' invalide.")
+                continue
+            row[key] = value = choices[value.lower()]
+        if field.max_length and len(value) > field.max_length:
+            problems.append(
+                f"{field.verbose_name}: {len(value)} caractères, {field.max_length} au maximum."
+            )
+    # The email is also the username, which is shorter.
+    username_length = User._meta.get_field('username').max_length
+    if row['email'] and len(row['email']) > username_length:
+        problems.append(f"Email: {len(row['email'])} caractères, {username_length} au maximum.")
+    if problems:
+        raise ValidationError(problems)
+
+
+def _assign_emails(rows, seen, errors):
+    """
+    Reject supplied emails already in use and give every other row a free
+    generated one (base@, base1@, ...), with one or two queries per chunk.
+    Emails double as usernames, so both columns count as taken.
+    """
+    supplied = {row['email'] for row in rows if row['email']}
+    generated = {f"{row['email_base']}@{EMAIL_DOMAIN}" for row in rows if row['email_base']}
+    lookup = supplied | generated
+    taken = set(seen)
+    for email, username in User.objects.filter(
+        models.Q(email__in=lookup) | models.Q(username__in=lookup)
+    ).values_list('email', 'username'):
+        taken.update((email, username))
+
+    # Namesakes: fetch every base{n}@ variant in one query.
+    clashing = {row['email_base'] for row in rows
+                if row['email_base'] and f"{row['email_base']}@{EMAIL_DOMAIN}" in taken}
+    if clashing:
+        query = models.Q()
+        for base in clashing:
+            query |= models.Q(email__startswith=base) | models.Q(username__startswith=base)
+        for email, username in User.objects.filter(query).values_list('email', 'username'):
+            taken.update((email, username))
+
+    kept = []
+    for row in rows:
+        if row['email']:
+            if row['email'] in taken:
+                # If email provided in excel but exists, error out
+                errors.append(f"Ligne {row['row']}: Un utilisateur avec l'email {row['email']} existe déjà.")
+                continue
+        else:
+            base = row['email_base']
+            email = f"{base}@{EMAIL_DOMAIN}"
+            counter = 1
+            while email in taken:
+                email = f"{base}{counter}@{EMAIL_DOMAIN}"
+                counter += 1
+            row['email'] = email
+        taken.add(row['email'])
+        seen.add(row['email'])
+        kept.append(row)
+    return kept
+
+
+def _check_student_ids(rows, seen, errors):
+    """Reject matricules supplied in the file that are already in use."""
+    supplied = {row['student_id'] for row in rows if row['student_id']}
+    taken = set(seen)
+    taken.update(Student.objects.filter(student_id__in=supplied).values_list('student_id', flat=True))
+    kept = []
+    for row in rows:
+        if row['student_id']:
+            if row['student_id'] in taken:
+                errors.append(f"Ligne {row['row']}: Le matricule {row['student_id']} existe déjà.")
+                continue
+            taken.add(row['student_id'])
+            seen.add(row['student_id'])
+        kept.append(row)
+    return kept
+
+
+def _hash_passwords(passwords):
+    if len(passwords) < 2 or PASSWORD_HASH_WORKERS < 2:
+        return [make_password(password) for password in passwords]
+    with ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS) as pool:
+        return list(pool.map(make_password, passwords))
+
+
+def _create_students(rows, current_year):
+    """Insert the users, students, enrollments and balances of one chunk, all or nothing."""
+    # Local import: finance depends on the students app, not the reverse.
+    from apps.finance.models import StudentBalance
+    from apps.finance.services.aging import bump_balances_version
+    from apps.finance.services.fees import FeeResolver
+    from apps.finance.services.rollups import record_rollups
+
+    users = [
+        User(
+            email=row['email'],
+            username=User.normalize_username(row['email']),
+            password=row['password_hash'],
+            first_name=row['first_name'],
+            last_name=row['last_name'],
+            role='STUDENT',
+            gender=row['gender'],
+            date_of_birth=row['birth_date'],
+            phone=row['phone'],
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        students = [
+            Student(
+                user=user,
+                student_id=row['student_id'] or '',
+                program=row['program'],
+                current_level=row['level'],
+                enrollment_date=row['enrollment_date'],
+                status=row['status'],
+                guardian_name=row['guardian_name'],
+                guardian_phone=row['guardian_phone'],
+                emergency_contact=row['emergency_contact'],
+            )
+            for row, user in zip(rows, users)
+        ]
+        Student.allocate_student_ids(students)
+        Student.objects.bulk_create(students)
+
+        enrollments = []
+        balances = []
+        if current_year:
+            fees = FeeResolver(current_year)
+            for student in students:
+                enrollments.append(Enrollment(
+                    student=student,
+                    academic_year=current_year,
+                    program=student.program,
+                    level=student.current_level,
+                    status='ENROLLED',
+                ))
+                # bulk_create skips the post_save signal that opens the balance.
+                balances.append(StudentBalance(
+                    student=student,
+                    academic_year=current_year,
+                    total_due=fees.total_due(student.program_id, student.current_level_id),
+                    total_paid=0,
+                ))
+            Enrollment.objects.bulk_create(enrollments)
+            StudentBalance.objects.bulk_create(balances)
+            bump_balances_version()
+            record_rollups(added=balances)
+
+        audit_bulk_create(User, users)
+        audit_bulk_create(Student, students)
+        audit_bulk_create(Enrollment, enrollments)
+        audit_bulk_create(StudentBalance, balances)
+    return len(students)
@@ -1,14 +1,25 @@
 import hashlib
+import logging
+import os
 import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
 
-from django.core.cache import cache
+from django.conf import settings
 from django.utils import timezone
 from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps, features
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas as pdf_canvas
 
+from apps.core.services.artefacts import artefact_key, artefacts
 from apps.core.services.rtl import contains_arabic, shape_arabic
+from apps.students.services.photos import PHOTO_CENTERING, current_variants, normalized_photo
 
 
 ASSET_DIR = Path(__file__).resolve().parents[1] / "assets" / "id_card"
@@ -22,6 +33,21 @@ LOGO_PATH = ASSET_DIR / "logo.jpg"
 MIXED_ID_RUN_PATTERN = re.compile(r"[\u0600-\u06FF]+|[^\u0600-\u06FF]+")
 RAQM_AVAILABLE = features.check("raqm")
 
+ID_CARD_NAMESPACE = "id-cards"
+# Processes rendering bulk card runs; 1 renders in the request process.
+ID_CARD_WORKERS = getattr(settings, "ID_CARD_WORKERS", os.cpu_count() or 1)
+# Cards looked up in the cache, then rendered, per round of a bulk run.
+ID_CARD_BATCH_SIZE = 64
+
+# A4 print sheet: 2 x 5 CR80 cards (85.60 x 53.98 mm) separated by cut gaps.
+CR80_SIZE = (85.6 * mm, 53.98 * mm)
+PRINT_SHEET_COLUMNS = 2
+PRINT_SHEET_ROWS = 5
+PRINT_SHEET_GAP = 3 * mm
+PRINT_SHEET_SPOOL_SIZE = 16 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
 
 @lru_cache(maxsize=128)
 def _load_font(path, size):
@@ -37,11 +63,20 @@ def _prepared_logo(size):
     return logo, mask
 
 
+@lru_cache(maxsize=4)
+def _card_template(generator_class, raqm_available):
+    # Keyed by RAQM_AVAILABLE too: the Arabic header text is shaped differently.
+    return generator_class(None)._render_template()
+
+
 class IDCardGenerator:
     """Generate a print-ready CR80 student identity card at 300 DPI."""
 
     width = 1011
     height = 638
+    photo_box = (44, 214, 238, 286)
+    program_box = (325, 378, 716, 483)
+    level_box = (735, 378, 968, 483)
 
     navy = (9, 35, 67)
     blue = (26, 76, 145)
@@ -53,14 +88,17 @@ class IDCardGenerator:
     text = (15, 23, 42)
     paper = (248, 250, 252)
 
-    def __init__(self, student):
+    def __init__(self, student, academic_period=None):
         self.student = student
+        # (label, valid until) resolved by the caller, e.g. for a bulk run;
+        # looked up from the student's enrollments otherwise.
+        self.academic_period = academic_period
 
     def generate(self) -> BytesIO:
-        card = Image.new("RGB", (self.width, self.height), self.paper)
+        # Only the student's own fields are drawn per card, on a copy of the
+        # static layers rendered once per process.
+        card = _card_template(type(self), RAQM_AVAILABLE).copy()
         draw = ImageDraw.Draw(card)
-        self._draw_background(card, draw)
-        self._draw_header(card, draw)
         self._draw_photo(card, draw)
         self._draw_identity(draw)
         self._draw_footer(draw)
@@ -72,18 +110,24 @@ class IDCardGenerator:
 
     def generate_cached(self):
         cache_key = self.cache_key()
-        image_bytes = cache.get(cache_key)
-        if image_bytes is None:
-            image_bytes = self.generate().getvalue()
-            cache.set(cache_key, image_bytes, timeout=60 * 60 * 24)
+        image_bytes = artefacts.get_or_set(cache_key, lambda: self.generate().getvalue())
         return image_bytes, cache_key
 
+    def _render_template(self):
+        card = Image.new("RGB", (self.width, self.height), self.paper)
+        draw = ImageDraw.Draw(card)
+        self._draw_background(card, draw)
+        self._draw_header(card, draw)
+        self._draw_static_body(card, draw)
+        return card
+
     def cache_key(self):
         academic_year, valid_until = self._academic_period()
         user = self.student.user
         photo = getattr(self.student, "photo", None)
         photo_name = getattr(photo, "name", "") if photo else ""
-        source = "|".join([
+        return artefact_key(
+            ID_CARD_NAMESPACE,
             "student-card-v4",
             str(getattr(self.student, "pk", getattr(self.student, "id", ""))),
             str(getattr(self.student, "updated_at", "")),
@@ -94,11 +138,10 @@ class IDCardGenerator:
             self._level_label(),
             str(getattr(self.student, "status", "")),
             photo_name,
+            current_variants(self.student).get("card", ""),
             academic_year,
             valid_until,
-        ])
-        digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
-        return f"student-id-card:{digest}"
+        )
 
     def _font(self, size, *, bold=False, arabic=False):
         if arabic:
@@ -215,10 +258,56 @@ class IDCardGenerator:
         card.paste(ring, (x - 5, y - 5), ring)
         card.paste(logo, (x, y), mask)
 
-    def _draw_photo(self, card, draw):
-        x, y, width, height = 44, 214, 238, 286
+    def _draw_static_body(self, card, draw):
+        """Photo shadow, panel frames, labels and footer bands shared by every card."""
+        x, y, width, height = self.photo_box
         self._draw_shadow(card, (x - 4, y - 4, x + width + 4, y + height + 4), 18)
 
+        draw.text(
+            (325, 216),
+            "IDENTITÉ DE L'ÉTUDIANT",
+            font=self._font(14, bold=True),
+            fill=self.green,
+        )
+        draw.rounded_rectangle((325, 307, 716, 354), radius=12, fill=(232, 240, 254))
+        draw.text(
+            (343, 330),
+            "MATRICULE",
+            font=self._font(12, bold=True),
+            fill=self.slate,
+            anchor="lm",
+        )
+        self._draw_info_frame(draw, self.program_box, "FILIÈRE / PROGRAMME", self.blue)
+        self._draw_info_frame(draw, self.level_box, "NIVEAU", self.green)
+        draw.text(
+            (325, 512),
+            "RÉF. CARTE",
+            font=self._font(11, bold=True),
+            fill=(100, 116, 139),
+        )
+
+        draw.rectangle((0, 562, self.width, self.height), fill=self.navy)
+        draw.rectangle((0, 562, self.width, 568), fill=self.orange)
+        draw.rectangle((0, 568, self.width, 572), fill=self.green)
+        draw.text((44, 592), "ANNÉE ACADÉMIQUE", font=self._font(11, bold=True), fill=(148, 163, 184))
+        draw.text(
+            (968, 604),
+            "universiter-attawoune.ml",
+            font=self._font(16, bold=True),
+            fill="white",
+            anchor="rm",
+        )
+        draw.text(
+            (968, 627),
+            "Document universitaire nominatif",
+            font=self._font(10),
+            fill=(148, 163, 184),
+            anchor="rm",
+        )
+
+    def _draw_photo(self, card, draw):
+        x, y, width, height = self.photo_box
+
         photo = self._load_photo((width, height))
         mask = Image.new("L", (width, height), 0)
         ImageDraw.Draw(mask).rounded_rectangle((0, 0, width - 1, height - 1), radius=20, fill=255)
@@ -245,15 +334,24 @@ class IDCardGenerator:
 
     def _load_photo(self, size):
         photo_field = getattr(self.student, "photo", None)
+        card_variant = current_variants(self.student).get("card")
+        if card_variant:
+            # Upright, EXIF-free and already at the slot size: no resampling.
+            try:
+                with photo_field.storage.open(card_variant, "rb") as variant_file:
+                    photo = Image.open(variant_file).convert("RGB")
+                if photo.size == size:
+                    return photo
+            except Exception:
+                pass
         if photo_field:
             try:
                 photo_field.open("rb")
                 try:
-                    photo = Image.open(photo_field).convert("RGB")
-                    photo.load()
+                    photo = normalized_photo(photo_field)
                 finally:
                     photo_field.close()
-                return ImageOps.fit(photo, size, method=Image.Resampling.LANCZOS, centering=(0.5, 0.38))
+                return ImageOps.fit(photo, size, method=Image.Resampling.LANCZOS, centering=PHOTO_CENTERING)
             except Exception:
                 pass
         return self._photo_placeholder(size)
@@ -293,13 +391,6 @@ class IDCardGenerator:
         program = str(getattr(self.student.program, "name", "") or "Non renseignée")
         level = self._level_label()
 
-        draw.text(
-            (325, 216),
-            "IDENTITÉ DE L'ÉTUDIANT",
-            font=self._font(14, bold=True),
-            fill=self.green,
-        )
-
         name_text, name_font = self._fit_font(draw, full_name, 625, 40, 25, bold=True)
         if contains_arabic(full_name):
             draw.text(
@@ -312,46 +403,23 @@ class IDCardGenerator:
             )
         else:
             draw.text((325, 248), name_text, font=name_font, fill=self.text)
-        draw.rounded_rectangle((325, 307, 716, 354), radius=12, fill=(232, 240, 254))
-        draw.text(
-            (343, 330),
-            "MATRICULE",
-            font=self._font(12, bold=True),
-            fill=self.slate,
-            anchor="lm",
-        )
         self._draw_mixed_matricule(draw, self.student.student_id, 435, 330, 263)
 
-        self._draw_info_panel(
-            draw,
-            (325, 378, 716, 483),
-            "FILIÈRE / PROGRAMME",
-            program,
-            self.blue,
-        )
-        self._draw_info_panel(
-            draw,
-            (735, 378, 968, 483),
-            "NIVEAU",
-            level,
-            self.green,
-        )
+        self._draw_info_value(draw, self.program_box, program)
+        self._draw_info_value(draw, self.level_box, level)
 
-        draw.text(
-            (325, 512),
-            "RÉF. CARTE",
-            font=self._font(11, bold=True),
-            fill=(100, 116, 139),
-        )
         reference = self._card_reference()
         draw.text((325, 535), reference, font=self._font(18, bold=True), fill=self.earth)
         self._draw_security_bars(draw, 510, 508, 185, 31, reference)
 
-    def _draw_info_panel(self, draw, box, label, value, accent):
+    def _draw_info_frame(self, draw, box, label, accent):
         draw.rounded_rectangle(box, radius=17, fill="white", outline=(226, 232, 240), width=2)
-        x1, y1, x2, _ = box
+        x1, y1, _, _ = box
         draw.rectangle((x1, y1, x1 + 7, box[3]), fill=accent)
         draw.text((x1 + 24, y1 + 20), label, font=self._font(12, bold=True), fill=self.slate)
+
+    def _draw_info_value(self, draw, box, value):
+        x1, y1, x2, _ = box
         value_text, value_font = self._fit_font(
             draw,
             value,
@@ -373,33 +441,13 @@ class IDCardGenerator:
             draw.text((x1 + 24, y1 + 58), value_text, font=value_font, fill=self.text)
 
     def _draw_footer(self, draw):
-        draw.rectangle((0, 562, self.width, self.height), fill=self.navy)
-        draw.rectangle((0, 562, self.width, 568), fill=self.orange)
-        draw.rectangle((0, 568, self.width, 572), fill=self.green)
-
         academic_year, valid_until = self._academic_period()
-        draw.text((44, 592), "ANNÉE ACADÉMIQUE", font=self._font(11, bold=True), fill=(148, 163, 184))
         draw.text((44, 620), academic_year, font=self._font(20, bold=True), fill="white", anchor="lm")
 
         if valid_until:
             draw.text((390, 592), "VALABLE JUSQU'AU", font=self._font(11, bold=True), fill=(148, 163, 184))
             draw.text((390, 620), valid_until, font=self._font(18, bold=True), fill=(220, 252, 231), anchor="lm")
 
-        draw.text(
-            (968, 604),
-            "universiter-attawoune.ml",
-            font=self._font(16, bold=True),
-            fill="white",
-            anchor="rm",
-        )
-        draw.text(
-            (968, 627),
-            "Document universitaire nominatif",
-            font=self._font(10),
-            fill=(148, 163, 184),
-            anchor="rm",
-        )
-
     def _draw_shadow(self, card, box, radius):
         shadow = Image.new("RGBA", card.size, (0, 0, 0, 0))
         shadow_draw = ImageDraw.Draw(shadow)
@@ -487,6 +535,8 @@ class IDCardGenerator:
         return labels.get(getattr(self.student, "status", "ACTIVE"), "Actif")
 
     def _academic_period(self):
+        if self.academic_period is not None:
+            return self.academic_period
         try:
             enrollment = self.student.enrollments.select_related("academic_year").filter(
                 is_active=True,
@@ -494,17 +544,139 @@ class IDCardGenerator:
         except (AttributeError, TypeError):
             enrollment = None
 
-        academic_year = getattr(enrollment, "academic_year", None)
-        if academic_year:
-            label = academic_year.name
-            end_date = academic_year.end_date.strftime("%d/%m/%Y") if academic_year.end_date else ""
-            return label, end_date
-
-        today = timezone.localdate()
-        start_year = today.year if today.month >= 9 else today.year - 1
-        return f"{start_year} - {start_year + 1}", ""
+        return _period_label(getattr(enrollment, "academic_year", None))
 
     def _card_reference(self):
         source = f"{self.student.student_id}:{getattr(self.student, 'enrollment_date', '')}"
         digest = hashlib.sha256(source.encode("utf-8")).hexdigest()[:10].upper()
         return f"UPA-{digest}"
+
+
+def _period_label(academic_year):
+    if academic_year:
+        label = academic_year.name
+        end_date = academic_year.end_date.strftime("%d/%m/%Y") if academic_year.end_date else ""
+        return label, end_date
+
+    today = timezone.localdate()
+    start_year = today.year if today.month >= 9 else today.year - 1
+    return f"{start_year} - {start_year + 1}", ""
+
+
+def academic_periods(students):
+    """Return {student pk: (label, valid until)} from one enrollment query."""
+    from apps.students.models import Enrollment
+
+    years = {}
+    enrollments = Enrollment.objects.filter(
+        student_id__in=[student.pk for student in students],
+        is_active=True,
+    ).select_related("academic_year").order_by("student_id", "-academic_year__start_date")
+    for enrollment in enrollments:
+        years.setdefault(enrollment.student_id, enrollment.academic_year)
+    return {student.pk: _period_label(years.get(student.pk)) for student in students}
+
+
+def _init_render_worker():
+    # Spawned workers start without Django; in forked ones this is a no-op.
+    import django
+
+    django.setup()
+
+
+def _render_png(generator):
+    try:
+        return generator.generate().getvalue()
+    except Exception:
+        logger.exception("ID card rendering failed for student %s", generator.student.student_id)
+        return None
+
+
+@contextmanager
+def card_render_pool(workers=None):
+    """
+    Process pool for bulk card rendering, or None with fewer than two workers.
+
+    Pillow's drawing holds the GIL, so only processes render cards in
+    parallel. Workers never query the database: generators sent to them must
+    carry their academic period.
+    """
+    workers = ID_CARD_WORKERS if workers is None else workers
+    if workers < 2:
+        yield None
+        return
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker)
+    try:
+        yield pool
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def render_cards(generators, pool=None):
+    """Render the PNG bytes of each generator, None for a failed card."""
+    if pool is None:
+        return [_render_png(generator) for generator in generators]
+    return list(pool.map(_render_png, generators, chunksize=4))
+
+
+def iter_card_images(students, workers=None):
+    """
+    Yield (student, png_bytes) for every student, in order, batch by batch.
+
+    Each batch resolves its academic periods with one query, takes the cards
+    already in the artefact cache, renders the rest in the process pool and
+    stores them, so the first cards are out before the last
+    ones are rendered. Cards that fail to render are logged and skipped.
+    """
+    students = list(students)
+    with card_render_pool(workers if len(students) > 1 else 1) as pool:
+        for start in range(0, len(students), ID_CARD_BATCH_SIZE):
+            batch = students[start:start + ID_CARD_BATCH_SIZE]
+            periods = academic_periods(batch)
+            generators = [IDCardGenerator(student, periods[student.pk]) for student in batch]
+            keys = [generator.cache_key() for generator in generators]
+
+            images = artefacts.get_many(keys)
+            missing = [(generator, key) for generator, key in zip(generators, keys) if key not in images]
+            rendered = dict(zip(
+                [key for _, key in missing],
+                render_cards([generator for generator, _ in missing], pool),
+            ))
+            artefacts.set_many({key: image for key, image in rendered.items() if image is not None})
+            images.update(rendered)
+
+            for generator, key in zip(generators, keys):
+                if images[key] is not None:
+                    yield generator.student, images[key]
+
+
+def write_print_sheet(images):
+    """
+    Impose PNG card images on A4 pages, 10 CR80 cards per page with cut
+    guides, and return the PDF as a rewound temporary file.
+    """
+    page_width, page_height = A4
+    card_width, card_height = CR80_SIZE
+    left = (page_width - PRINT_SHEET_COLUMNS * card_width - (PRINT_SHEET_COLUMNS - 1) * PRINT_SHEET_GAP) / 2
+    top = page_height - (page_height - PRINT_SHEET_ROWS * card_height - (PRINT_SHEET_ROWS - 1) * PRINT_SHEET_GAP) / 2
+    per_page = PRINT_SHEET_COLUMNS * PRINT_SHEET_ROWS
+
+    output = tempfile.SpooledTemporaryFile(max_size=PRINT_SHEET_SPOOL_SIZE)
+    pdf = pdf_canvas.Canvas(output, pagesize=A4)
+    pdf.setTitle("Cartes d'étudiant")
+    pdf.setStrokeColorRGB(0.75, 0.75, 0.75)
+    pdf.setLineWidth(0.25)
+    for index, image in enumerate(images):
+        slot = index % per_page
+        if index and not slot:
+            pdf.showPage()
+            pdf.setStrokeColorRGB(0.75, 0.75, 0.75)
+            pdf.setLineWidth(0.25)
+        column, row = slot % PRINT_SHEET_COLUMNS, slot // PRINT_SHEET_COLUMNS
+        x = left + column * (card_width + PRINT_SHEET_GAP)
+        y = top - (row + 1) * card_height - row * PRINT_SHEET_GAP
+        pdf.drawImage(ImageReader(BytesIO(image)), x, y, card_width, card_height)
+        pdf.rect(x, y, card_width, card_height)
+    pdf.save()
+    output.seek(0)
+    return output
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import re
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# variant -> (size, format, quality, crop). Cropped variants are fitted to the
+# exact size (centred a little above the middle, where faces are); the others
+# are only shrunk to fit inside it.
+PHOTO_VARIANTS = {
+    # The ID card photo slot: pasted as is, with no resampling per render.
+    'card': ((238, 286), 'JPEG', 90, True),
+    # Avatars of the student lists.
+    'thumb': ((128, 128), 'JPEG', 82, True),
+    # Profile pages.
+    'display': ((600, 720), 'WEBP', 80, False),
+}
+PHOTO_CENTERING = (0.5, 0.38)
+VARIANT_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+# Derivative file names, which never change content (see variant_path).
+HASHED_VARIANT_PATTERN = re.compile(
+    r'\.(%s)-[0-9a-f]{12}\.(jpg|webp)$' % '|'.join(PHOTO_VARIANTS)
+)
+
+
+def variant_path(photo_name, variant, digest):
+    """students/photos/<stem>.<variant>-<digest>.<ext>, beside the original."""
+    path = PurePosixPath(photo_name)
+    extension = VARIANT_EXTENSIONS[PHOTO_VARIANTS[variant][1]]
+    return str(path.with_name(f"{path.stem}.{variant}-{digest}.{extension}"))
+
+
+def normalized_photo(file_obj):
+    """Decode an upload upright, as RGB on white, without its EXIF metadata."""
+    image = Image.open(file_obj)
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variant(image, variant):
+    size, image_format, quality, crop = PHOTO_VARIANTS[variant]
+    if crop:
+        image = ImageOps.fit(image, size, method=Image.Resampling.LANCZOS, centering=PHOTO_CENTERING)
+    else:
+        image = image.copy()
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+    output = BytesIO()
+    # Saved without exif=, so no metadata (location, device) is carried over.
+    image.save(output, format=image_format, quality=quality, optimize=image_format == 'JPEG')
+    return output.getvalue()
+
+
+def current_variants(student):
+    """The derivative names of the student's current photo, {} if stale or missing."""
+    variants = getattr(student, 'photo_variants', None) or {}
+    photo = getattr(student, 'photo', None)
+    if not photo or variants.get('source') != photo.name:
+        return {}
+    return variants
+
+
+def build_photo_variants(student, force=False):
+    """
+    Store the derivatives of the student's photo beside it and record their
+    names in photo_variants. Derivatives of a previous photo are deleted.
+    Names carry a digest of the original, so a file is only rewritten with
+    force (after a change of PHOTO_VARIANTS).
+    """
+    from apps.students.models import Student
+
+    previous = student.photo_variants or {}
+    variants = {}
+    photo = student.photo
+    storage = photo.storage
+    if photo:
+        try:
+            photo.open('rb')
+            try:
+                data = photo.read()
+            finally:
+                photo.close()
+            image = normalized_photo(BytesIO(data))
+        except Exception:
+            logger.exception("Unreadable photo for student %s", student.student_id)
+        else:
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            variants['source'] = photo.name
+            for variant in PHOTO_VARIANTS:
+                name = variant_path(photo.name, variant, digest)
+                if force:
+                    storage.delete(name)
+                if not storage.exists(name):
+                    name = storage.save(name, ContentFile(render_variant(image, variant)))
+                variants[variant] = name
+
+    for variant, name in previous.items():
+        if variant != 'source' and name not in variants.values():
+            storage.delete(name)
+
+    student.photo_variants = variants
+    # update() rather than save(): no signal loop and updated_at stays the upload time.
+    Student.objects.filter(pk=student.pk).update(photo_variants=variants)
+    return variants
@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Attendance, Student
+from .services.attendance import record_attendance_counts
+from .services.photos import build_photo_variants, current_variants
+
+
+@receiver(post_save, sender=Student)
+def process_student_photo(sender, instance, raw=False, **kwargs):
+    """Build the photo derivatives after an upload, drop them after a removal."""
+    if raw:
+        return
+    if instance.photo and current_variants(instance):
+        return
+    if instance.photo or instance.photo_variants:
+        build_photo_variants(instance)
+
+
+@receiver(pre_save, sender=Attendance)
+def capture_previous_attendance(sender, instance, raw=False, **kwargs):
+    instance._previous_attendance = (
+        sender.objects.filter(pk=instance.pk).only(
+            'pk', 'student_id', 'course_session_id', 'status',
+        ).first()
+        if instance.pk and not raw else None
+    )
+
+
+@receiver(post_save, sender=Attendance)
+def update_attendance_summary_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_attendance', None)
+    record_attendance_counts(added=[instance], removed=[previous] if previous else [])
+
+
+@receiver(post_delete, sender=Attendance)
+def update_attendance_summary_on_delete(sender, instance, **kwargs):
+    record_attendance_counts(removed=[instance])
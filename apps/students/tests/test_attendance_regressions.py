@@ -0,0 +1,205 @@
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.academics.models import Course
+from apps.accounts.models import User
+from apps.scheduling.models import CourseSession, Schedule, TimeSlot
+from apps.students.models import Attendance, AttendanceSummary, Enrollment, Student
+from apps.students.services.attendance import rebuild_attendance_summaries
+from apps.teachers.models import Teacher, TeacherCourse
+from apps.university.models import AcademicYear, Department, Faculty, Level, Program, Semester
+
+
+def create_user(username, role):
+    return User.objects.create_user(username=username, password='ComplexPass123!', role=role)
+
+
+class AttendanceTestCase(TestCase):
+    """A course given today by one teacher to one enrolled student."""
+
+    def setUp(self):
+        self.year = AcademicYear.objects.create(
+            name='2096-2097', start_date=date(2096, 9, 1),
+            end_date=date(2097, 7, 1), is_current=True,
+        )
+        semester = Semester.objects.create(
+            academic_year=self.year, semester_type='S1',
+            start_date=date(2096, 9, 1), end_date=date(2097, 1, 31),
+            is_current=True,
+        )
+        faculty = Faculty.objects.create(name='Runtime Faculty', code='RTF')
+        department = Department.objects.create(
+            name='Runtime Department', code='RTD', faculty=faculty,
+        )
+        self.level = Level.objects.get_or_create(name='L1', defaults={'order': 1})[0]
+        self.program = Program.objects.create(
+            name='Runtime Program', code='RTP', department=department,
+            duration_years=1,
+        )
+        self.program.levels.add(self.level)
+        self.student = self.enrolled_student('attendance_student', 'RTS0001')
+        self.teacher_user = create_user('attendance_teacher', 'TEACHER')
+        self.other_teacher_user = create_user('attendance_other_teacher', 'TEACHER')
+        teacher = Teacher.objects.create(
+            user=self.teacher_user, employee_id='RTT0001',
+            department=department, hire_date=date(2090, 1, 1),
+        )
+        Teacher.objects.create(
+            user=self.other_teacher_user, employee_id='RTT0002',
+            department=department, hire_date=date(2090, 1, 1),
+        )
+        course = Course.objects.create(
+            name='Runtime Course', code='RTC101', program=self.program,
+            level=self.level, semester_type='S1', credits=3,
+        )
+        TeacherCourse.objects.create(teacher=teacher, course=course, semester=semester)
+        schedule = Schedule.objects.create(
+            course=course, teacher=teacher, semester=semester,
+            time_slot=TimeSlot.objects.create(
+                day=timezone.localdate().weekday(), start_time='08:00', end_time='10:00'
+            ),
+            is_active=True,
+        )
+        self.session = CourseSession.objects.create(schedule=schedule, date=timezone.localdate())
+        self.client = APIClient()
+
+    def enrolled_student(self, username, student_id, enroll=True):
+        student = Student.objects.create(
+            user=create_user(username, 'STUDENT'), student_id=student_id, program=self.program,
+            current_level=self.level, enrollment_date=date(2096, 9, 1),
+        )
+        if enroll:
+            Enrollment.objects.create(
+                student=student, academic_year=self.year, program=self.program,
+                level=self.level, is_active=True,
+            )
+        return student
+
+
+class BulkAttendanceTests(AttendanceTestCase):
+    def test_bulk_attendance_upserts_a_roll_call_in_constant_queries(self):
+        outsider = self.enrolled_student('roll_call_outsider', 'RTS1999', enroll=False)
+        students = [self.student] + [
+            self.enrolled_student(f'roll_call_{index}', f'RTS1{index:03d}') for index in range(5)
+        ]
+        self.client.force_authenticate(self.teacher_user)
+        url = '/api/v1/students/attendances/record_bulk/'
+
+        def roll_call(rows):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    url, {'course_session': self.session.id, 'attendances': rows}, format='json',
+                )
+            self.assertEqual(response.status_code, 200, response.data)
+            return response.data, len(queries)
+
+        first, small_queries = roll_call([
+            {'student': self.student.id, 'status': 'PRESENT'},
+            {'student': outsider.id, 'status': 'PRESENT'},
+            {'student': 999999, 'status': 'ABSENT'},
+        ])
+        self.assertEqual((first['created'], first['updated']), (1, 0))
+        self.assertEqual(first['errors'], [
+            {'student_id': outsider.id, 'error': 'Étudiant non inscrit à ce cours'},
+            {'student_id': 999999, 'error': 'Étudiant non trouvé'},
+        ])
+
+        second, large_queries = roll_call(
+            [{'student': student.id, 'status': 'ABSENT', 'remarks': 'Malade'} for student in students]
+            + [{'student': str(students[1].id), 'status': 'LATE'}]
+        )
+        self.assertEqual((second['created'], second['updated'], second['errors']), (5, 2, []))
+        self.assertEqual(large_queries, small_queries)
+
+        recorded = dict(Attendance.objects.filter(
+            course_session=self.session,
+        ).values_list('student_id', 'status'))
+        self.assertEqual(len(recorded), 6)
+        self.assertEqual(recorded[self.student.id], 'ABSENT')
+        self.assertEqual(recorded[students[1].id], 'LATE')
+
+
+class AttendanceSummaryTests(AttendanceTestCase):
+    def test_attendance_summaries_track_writes_and_drive_class_reports(self):
+        peer = self.enrolled_student('summary_peer', 'RTS0002')
+        sessions = [self.session] + [
+            CourseSession.objects.create(
+                schedule=self.session.schedule, date=self.session.date - timedelta(days=7 * week),
+            )
+            for week in range(1, 4)
+        ]
+
+        self.client.force_authenticate(self.teacher_user)
+        for session, (student_status, peer_status) in zip(sessions, [
+            ('PRESENT', 'ABSENT'), ('PRESENT', 'ABSENT'), ('LATE', 'PRESENT'), ('ABSENT', 'EXCUSED'),
+        ]):
+            response = self.client.post('/api/v1/students/attendances/record_bulk/', {
+                'course_session': session.id,
+                'attendances': [
+                    {'student': self.student.id, 'status': student_status},
+                    {'student': peer.id, 'status': peer_status},
+                ],
+            }, format='json')
+            self.assertEqual(response.data['created'], 2, response.data)
+
+        # Per-row writes go through the model signals.
+        attendance = Attendance.objects.get(student=self.student, course_session=sessions[3])
+        attendance.status = 'EXCUSED'
+        attendance.save()
+        Attendance.objects.get(student=peer, course_session=sessions[3]).delete()
+        Attendance.objects.create(student=peer, course_session=sessions[3], status='ABSENT')
+
+        def counters():
+            return {
+                row['student_id']: row
+                for row in AttendanceSummary.objects.values(
+                    'student_id', 'course_id', 'semester_id', 'present', 'absent', 'late', 'excused',
+                )
+            }
+
+        incremental = counters()
+        self.assertEqual(
+            {key: incremental[peer.id][key] for key in ('present', 'absent', 'late', 'excused')},
+            {'present': 1, 'absent': 3, 'late': 0, 'excused': 0},
+        )
+        self.assertEqual(
+            {key: incremental[self.student.id][key] for key in ('present', 'absent', 'late', 'excused')},
+            {'present': 2, 'absent': 0, 'late': 1, 'excused': 1},
+        )
+        self.assertEqual(rebuild_attendance_summaries(), 2)
+        self.assertEqual(counters(), incremental)
+
+        with self.assertNumQueries(3):  # semester, teacher's courses, summaries
+            at_risk = self.client.get('/api/v1/students/attendances/at_risk/')
+        self.assertEqual(at_risk.status_code, 200, at_risk.data)
+        self.assertEqual([row['student_id'] for row in at_risk.data['results']], ['RTS0002'])
+        self.assertEqual(at_risk.data['results'][0]['absence_rate'], 75.0)
+        self.assertEqual(
+            self.client.get('/api/v1/students/attendances/at_risk/', {'threshold': 80}).data['count'], 0,
+        )
+
+        report = self.client.get('/api/v1/students/attendances/absence_report/', {
+            'course_id': self.session.schedule.course_id,
+        })
+        self.assertEqual(report.status_code, 200, report.data)
+        self.assertEqual(
+            [(row['student_id'], row['attendance_rate']) for row in report.data['results']],
+            [('RTS0001', 75.0), ('RTS0002', 25.0)],
+        )
+
+        stats = self.client.get(f'/api/v1/students/{self.student.id}/attendance_stats/')
+        self.assertEqual(stats.data['statistics']['total_sessions'], 4)
+        self.assertEqual(stats.data['statistics']['attendance_rate'], 75.0)
+
+        self.client.force_authenticate(self.other_teacher_user)
+        self.assertEqual(self.client.get('/api/v1/students/attendances/at_risk/').data['count'], 0)
+        self.assertEqual(self.client.get('/api/v1/students/attendances/absence_report/', {
+            'course_id': self.session.schedule.course_id,
+        }).status_code, 403)
+        self.client.force_authenticate(self.student.user)
+        self.assertEqual(self.client.get('/api/v1/students/attendances/at_risk/').status_code, 403)
@@ -1,12 +1,13 @@
+import tempfile
 from datetime import date
 from io import BytesIO
 from types import SimpleNamespace
 from unittest.mock import patch
 
-from django.core.cache import cache
 from django.test import SimpleTestCase
 from PIL import Image
 
+from apps.students.services import id_card
 from apps.students.services.id_card import IDCardGenerator
 
 
@@ -29,7 +30,11 @@ class FakeEnrollmentManager:
 
 class StudentIDCardTests(SimpleTestCase):
     def setUp(self):
-        cache.clear()
+        artefact_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(artefact_directory.cleanup)
+        artefact_override = self.settings(ARTEFACT_CACHE_ROOT=artefact_directory.name)
+        artefact_override.enable()
+        self.addCleanup(artefact_override.disable)
 
     def test_generates_print_ready_branded_card_with_arabic_identity(self):
         academic_year = SimpleNamespace(
@@ -78,3 +83,32 @@ class StudentIDCardTests(SimpleTestCase):
         with patch("apps.students.services.id_card.RAQM_AVAILABLE", False):
             fallback = IDCardGenerator(student).generate().getvalue()
         self.assertTrue(fallback.startswith(b"\x89PNG"))
+
+    def test_cards_are_composited_on_a_template_rendered_once(self):
+        def student(student_id, full_name):
+            return SimpleNamespace(
+                student_id=student_id,
+                enrollment_date=date(2025, 10, 6),
+                status="ACTIVE",
+                get_status_display=lambda: "Actif",
+                photo=None,
+                user=SimpleNamespace(username="awa", get_full_name=lambda: full_name),
+                program=SimpleNamespace(name="Informatique"),
+                current_level=SimpleNamespace(get_name_display=lambda: "Licence 1"),
+                enrollments=FakeEnrollmentManager(None),
+            )
+
+        id_card._card_template.cache_clear()
+        with patch.object(
+            IDCardGenerator, "_render_template", autospec=True,
+            side_effect=IDCardGenerator._render_template,
+        ) as render_template:
+            first = Image.open(IDCardGenerator(student("FST2526FA000001", "Awa Diallo")).generate())
+            second = Image.open(IDCardGenerator(student("FST2526MM000002", "Moussa Keita")).generate())
+
+        self.assertEqual(render_template.call_count, 1)
+        template = id_card._card_template(IDCardGenerator, id_card.RAQM_AVAILABLE)
+        # The header is static; the name area differs and never leaks into the template.
+        self.assertEqual(first.crop((0, 0, 1011, 185)).tobytes(), second.crop((0, 0, 1011, 185)).tobytes())
+        self.assertNotEqual(first.crop((325, 248, 968, 300)).tobytes(), second.crop((325, 248, 968, 300)).tobytes())
+        self.assertGreater(template.crop((325, 248, 968, 300)).convert("L").getextrema()[0], 200)
@@ -1,15 +1,15 @@
 import tempfile
 from datetime import date
-from io import BytesIO
+from io import BytesIO, StringIO
 from urllib.parse import urlparse
 
-from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from PIL import Image
 from rest_framework.test import APIClient
 
 from apps.accounts.models import User
+from apps.core.services.artefacts import artefacts
 from apps.students.models import Student
 from apps.students.services.id_card import IDCardGenerator
 from apps.university.models import Department, Faculty, Level, Program
@@ -23,9 +23,11 @@ def uploaded_photo(name, color):
 
 class StudentPhotoUpdateRegressionTests(TestCase):
     def setUp(self):
-        cache.clear()
         self.media_directory = tempfile.TemporaryDirectory()
-        self.media_override = self.settings(MEDIA_ROOT=self.media_directory.name)
+        self.media_override = self.settings(
+            MEDIA_ROOT=self.media_directory.name,
+            ARTEFACT_CACHE_ROOT=f'{self.media_directory.name}/artefacts',
+        )
         self.media_override.enable()
         self.addCleanup(self.media_override.disable)
         self.addCleanup(self.media_directory.cleanup)
@@ -64,7 +66,7 @@ class StudentPhotoUpdateRegressionTests(TestCase):
             f'/api/v1/students/{self.student.id}/generate_id_card/'
         )
         self.assertEqual(first_card.status_code, 200)
-        self.assertIsNotNone(cache.get(old_card_key))
+        self.assertIsNotNone(artefacts.get(old_card_key))
 
         update = self.client.patch(
             f'/api/v1/students/{self.student.id}/',
@@ -73,7 +75,7 @@ class StudentPhotoUpdateRegressionTests(TestCase):
         )
         self.assertEqual(update.status_code, 200, update.data)
         self.assertIn('/media/students/photos/', update.data['photo'])
-        self.assertIsNone(cache.get(old_card_key))
+        self.assertIsNone(artefacts.get(old_card_key))
 
         self.student.refresh_from_db()
         self.assertNotEqual(self.student.photo.name, 'students/photos/profile.png')
@@ -94,3 +96,94 @@ class StudentPhotoUpdateRegressionTests(TestCase):
         )
         self.assertNotEqual(first_card['ETag'], second_card['ETag'])
         self.assertNotEqual(first_card.content, second_card.content)
+
+    def test_uploaded_photo_gets_upright_exif_free_derivatives(self):
+        from django.core.management import call_command
+        from django.core.files.storage import default_storage
+
+        output = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90° clockwise to display.
+        Image.new('RGB', (300, 200), 'green').save(output, format='JPEG', exif=exif)
+        upload = SimpleUploadedFile('rotated.jpg', output.getvalue(), content_type='image/jpeg')
+
+        update = self.client.patch(
+            f'/api/v1/students/{self.student.id}/', {'photo': upload}, format='multipart',
+        )
+        self.assertEqual(update.status_code, 200, update.data)
+        self.assertIn('.thumb-', update.data['photo_thumbnail'])
+        self.assertTrue(update.data['photo_display'].endswith('.webp'))
+
+        self.student.refresh_from_db()
+        variants = self.student.photo_variants
+        self.assertEqual(variants['source'], self.student.photo.name)
+        with default_storage.open(variants['card']) as card_file:
+            card = Image.open(card_file)
+            self.assertEqual(card.size, (238, 286))
+            self.assertFalse(card.getexif())
+        with default_storage.open(variants['display']) as display_file:
+            display = Image.open(display_file)
+            self.assertEqual((display.format, display.size), ('WEBP', (200, 300)))
+
+        self.client.force_authenticate(user=None)
+        thumb = self.client.get(f'/media/{self.student.photo.name}', {'size': 'thumb'})
+        self.assertEqual(thumb.status_code, 200)
+        self.assertEqual(thumb['Content-Type'], 'image/jpeg')
+        self.assertEqual(Image.open(BytesIO(b''.join(thumb.streaming_content))).size, (128, 128))
+
+        # Removing the photo removes its derivatives; the backfill rebuilds lost ones.
+        self.client.force_authenticate(self.admin)
+        Student.objects.filter(pk=self.student.pk).update(photo_variants={})
+        call_command('build_photo_variants', stdout=StringIO())
+        self.student.refresh_from_db()
+        self.assertEqual(set(self.student.photo_variants), {'source', 'card', 'thumb', 'display'})
+
+        self.student.photo = None
+        self.student.save()
+        self.assertEqual(self.student.photo_variants, {})
+        self.assertFalse(default_storage.exists(variants['card']))
+
+    def test_fixture_loading_leaves_photo_derivatives_alone(self):
+        Student.objects.filter(pk=self.student.pk).update(photo_variants={})
+        self.student.refresh_from_db()
+        # loaddata saves with raw=True: no image is opened or written.
+        self.student.save_base(raw=True)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.photo_variants, {})
+
+    def test_photo_serving_is_conditional_range_aware_and_offloadable(self):
+        self.client.force_authenticate(user=None)
+        photo_url = f'/media/{self.student.photo.name}'
+        full = self.client.get(photo_url)
+        body = b''.join(full.streaming_content)
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+        self.assertEqual(full['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(int(full['Content-Length']), len(body))
+
+        not_modified = self.client.get(photo_url, HTTP_IF_NONE_MATCH=full['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], full['ETag'])
+        since = self.client.get(photo_url, HTTP_IF_MODIFIED_SINCE=full['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+        partial = self.client.get(photo_url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], f'bytes 10-19/{len(body)}')
+        self.assertEqual(b''.join(partial.streaming_content), body[10:20])
+        suffix = self.client.get(photo_url, HTTP_RANGE='bytes=-5', HTTP_IF_RANGE=full['ETag'])
+        self.assertEqual(b''.join(suffix.streaming_content), body[-5:])
+        stale = self.client.get(photo_url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+        unsatisfiable = self.client.get(photo_url, HTTP_RANGE=f'bytes={len(body)}-')
+        self.assertEqual(unsatisfiable.status_code, 416)
+
+        thumb_name = self.student.photo_variants['thumb']
+        thumb = self.client.get(f'/media/{thumb_name}')
+        self.assertEqual(thumb['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        with self.settings(MEDIA_OFFLOAD='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-media/'):
+            offloaded = self.client.get(photo_url)
+        self.assertEqual(offloaded['X-Accel-Redirect'], f'/protected-media/{self.student.photo.name}')
+        self.assertEqual(offloaded.content, b'')
+        self.assertEqual(offloaded['ETag'], full['ETag'])
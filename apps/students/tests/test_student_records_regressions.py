@@ -0,0 +1,256 @@
+import io
+import tempfile
+import zipfile
+from datetime import date
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from openpyxl import load_workbook
+from PIL import Image
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.finance.models import StudentBalance
+from apps.students.models import Enrollment, Student
+from apps.students.services import excel
+from apps.students.services.id_card import write_print_sheet
+from apps.teachers.models import Teacher
+from apps.university.models import (
+    AcademicYear, Department, Faculty, IdentifierSequence, Level, Program,
+)
+
+
+def create_user(username, role, **fields):
+    return User.objects.create_user(
+        username=username, password='ComplexPass123!', role=role, **fields,
+    )
+
+
+def create_program():
+    faculty = Faculty.objects.create(name='Runtime Faculty', code='RTF')
+    department = Department.objects.create(
+        name='Runtime Department', code='RTD', faculty=faculty,
+    )
+    level = Level.objects.get_or_create(name='L1', defaults={'order': 1})[0]
+    program = Program.objects.create(
+        name='Runtime Program', code='RTP', department=department,
+        duration_years=1,
+    )
+    program.levels.add(level)
+    return program, level
+
+
+def create_student(program, level):
+    return Student.objects.create(
+        user=create_user('records_student', 'STUDENT'), student_id='RTS0001', program=program,
+        current_level=level, enrollment_date=date(2096, 9, 1),
+    )
+
+
+class StudentExportTests(TestCase):
+    def setUp(self):
+        create_student(*create_program())
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('export_admin', 'ADMIN'))
+
+    def test_student_export_streams_xlsx_and_csv(self):
+        response = self.client.get('/api/v1/students/export_excel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('etudiants.xlsx', response['Content-Disposition'])
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], 'Matricule')
+        self.assertEqual(rows[1][0], 'RTS0001')
+
+        response = self.client.get('/api/v1/students/export_excel/', {'export_format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('etudiants.csv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(';')[0], 'Matricule')
+        self.assertEqual(lines[1].split(';')[0], 'RTS0001')
+        self.assertEqual(len(lines), 2)
+
+
+class StudentImportTests(TestCase):
+    def setUp(self):
+        self.year = AcademicYear.objects.create(
+            name='2096-2097', start_date=date(2096, 9, 1),
+            end_date=date(2097, 7, 1), is_current=True,
+        )
+        create_program()
+        create_user(
+            'awa.diallo@attawoune.edu', 'STUDENT', email='awa.diallo@attawoune.edu',
+        )
+        create_user('taken', 'STUDENT', email='taken@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('import_admin', 'ADMIN'))
+
+    def test_student_import_bulk_creates_users_with_allocated_matricules(self):
+        upload = SimpleUploadedFile('etudiants.csv', (
+            'Prénom;Nom;Email;Sexe;Date Naissance;Code Programme;Niveau Actuel;Date Inscription\n'
+            'Awa;Diallo;;F;2001-05-04;RTP;L1;2096-09-01\n'
+            'Awa;Diallo;;F;2002-01-01;Runtime Program;;2096-09-01\n'
+            'Binta;Sow;taken@example.com;F;;RTP;L1;2096-09-01\n'
+            'Cheikh;Ba;;M;;NOPE;L1;2096-09-01\n'
+        ).encode('utf-8'), content_type='text/csv')
+        response = self.client.post(
+            '/api/v1/students/import_excel/', {'file': upload}, format='multipart',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['success_count'], 2)
+        self.assertEqual(response.data['errors'], [
+            "Ligne 5: Programme 'NOPE' introuvable. Vérifiez le nom ou le code du programme.",
+            "Ligne 4: Un utilisateur avec l'email taken@example.com existe déjà.",
+        ])
+
+        students = list(Student.objects.filter(
+            user__last_name='Diallo',
+        ).select_related('user').order_by('student_id'))
+        self.assertEqual(
+            [(s.student_id, s.user.email) for s in students],
+            [('RTF9697FA000001', 'awa.diallo1@attawoune.edu'),
+             ('RTF9697FA000002', 'awa.diallo2@attawoune.edu')],
+        )
+        self.assertTrue(students[0].user.check_password('AwaDiallo@2001'))
+        self.assertEqual(students[1].current_level.name, 'L1')
+        self.assertEqual(
+            Enrollment.objects.filter(student__in=students, academic_year=self.year).count(), 2,
+        )
+        self.assertEqual(
+            StudentBalance.objects.filter(student__in=students, academic_year=self.year).count(), 2,
+        )
+
+    def test_student_import_reports_refused_values_and_rejected_rows_per_row(self):
+        create_students = excel._create_students
+
+        def refuse_keita(rows, current_year):
+            if any(row['last_name'] == 'Keita' for row in rows):
+                raise IntegrityError('UNIQUE constraint failed')
+            return create_students(rows, current_year)
+
+        # Values the database would refuse are reported per row, and a chunk
+        # the database still rejects is retried row by row.
+        upload = SimpleUploadedFile('etudiants.csv', (
+            'Prénom;Nom;Code Programme;Statut;Téléphone\n'
+            'Fatou;Ndiaye;RTP;Diplômé;\n'
+            'Moussa;Sy;RTP;ACTIVE;' + '7' * 25 + '\n'
+            'Ali;Touré;RTP;Renvoyé;\n'
+            'Sira;Keita;RTP;;\n'
+            'Omar;Fall;RTP;suspended;\n'
+        ).encode('utf-8'), content_type='text/csv')
+        with mock.patch.object(excel, '_create_students', side_effect=refuse_keita):
+            response = self.client.post(
+                '/api/v1/students/import_excel/', {'file': upload}, format='multipart',
+            )
+        self.assertEqual(response.data['success_count'], 2)
+        self.assertEqual(response.data['errors'], [
+            'Ligne 3: Téléphone: 25 caractères, 20 au maximum.',
+            "Ligne 4: Statut: valeur 'Renvoyé' invalide.",
+            'Ligne 5: UNIQUE constraint failed',
+        ])
+        self.assertEqual(
+            dict(Student.objects.filter(user__last_name__in=['Ndiaye', 'Fall']).values_list(
+                'user__last_name', 'status',
+            )),
+            {'Ndiaye': 'GRADUATED', 'Fall': 'SUSPENDED'},
+        )
+
+
+class MatriculeSequenceTests(TestCase):
+    def setUp(self):
+        self.program, self.level = create_program()
+
+    def new_student(self, first_name, student_id=''):
+        user = create_user(
+            f'seq_{first_name}_{student_id}', 'STUDENT', first_name=first_name, gender='M',
+        )
+        return Student.objects.create(
+            user=user, student_id=student_id, program=self.program,
+            current_level=self.level, enrollment_date=date(2096, 9, 1),
+        )
+
+    def new_teacher(self, first_name, employee_id=''):
+        return Teacher.objects.create(
+            user=create_user(f'seq_{first_name}', 'TEACHER', first_name=first_name),
+            employee_id=employee_id, hire_date=date(2096, 9, 1),
+        )
+
+    def test_matricules_come_from_prefix_counters_seeded_by_backfill(self):
+        self.assertEqual(IdentifierSequence.reserve('student', 'BLOCK', count=3), 1)
+        self.assertEqual(IdentifierSequence.reserve('student', 'BLOCK'), 4)
+
+        # A missing counter starts after the IDs issued before it existed.
+        self.new_student('Moussa', 'RTF9697MM000041')
+        self.assertEqual(self.new_student('Malick').student_id, 'RTF9697MM000042')
+
+        # An ID of the generated shape set by hand moves its counter at once,
+        # in a save or in a batch, and the backfill never moves one back.
+        self.new_student('Modou', 'RTF9697MM000090')
+        self.assertEqual(self.new_student('Mamadou').student_id, 'RTF9697MM000091')
+        batch = [
+            Student(user=User(first_name=first_name, gender='M'), student_id=student_id,
+                    program=self.program, enrollment_date=date(2096, 9, 1))
+            for first_name, student_id in (('Mory', ''), ('Mamy', 'RTF9697MM000120'))
+        ]
+        Student.allocate_student_ids(batch)
+        self.assertEqual([s.student_id for s in batch], ['RTF9697MM000121', 'RTF9697MM000120'])
+        IdentifierSequence.objects.create(scope='teacher', prefix='ENS9697A', last_value=50)
+        call_command('backfill_id_sequences', stdout=io.StringIO())
+        self.assertEqual(self.new_student('Mariama').student_id, 'RTF9697MM000122')
+        self.assertEqual(
+            IdentifierSequence.objects.get(scope='teacher', prefix='ENS9697A').last_value, 50,
+        )
+        self.new_teacher('Amadou', 'ENS9697A060')
+        self.assertEqual(self.new_teacher('Aminata').employee_id, 'ENS9697A061')
+
+    def test_backfill_keeps_the_prefix_of_sequences_past_their_minimum_width(self):
+        teacher = self.new_teacher('Amadou', 'ENS9697A060')
+        Teacher.objects.filter(pk=teacher.pk).update(employee_id='ENS9697B1000')
+        call_command('backfill_id_sequences', stdout=io.StringIO())
+        self.assertEqual(
+            IdentifierSequence.objects.get(scope='teacher', prefix='ENS9697B').last_value, 1000,
+        )
+        self.assertFalse(IdentifierSequence.objects.filter(scope='teacher', prefix='ENS9697B1').exists())
+
+
+class BulkIDCardTests(TestCase):
+    def setUp(self):
+        artefact_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(artefact_directory.cleanup)
+        artefact_override = self.settings(ARTEFACT_CACHE_ROOT=artefact_directory.name)
+        artefact_override.enable()
+        self.addCleanup(artefact_override.disable)
+
+        self.student = create_student(*create_program())
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('cards_admin', 'ADMIN'))
+
+    def test_bulk_id_cards_stream_a_zip_or_impose_an_a4_print_sheet(self):
+        response = self.client.post(
+            '/api/v1/students/generate_bulk_id_cards/', {'student_ids': [self.student.pk]}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['carte_etudiant_RTS0001.png'])
+        card = Image.open(io.BytesIO(archive.read('carte_etudiant_RTS0001.png')))
+        self.assertEqual(card.size, (1011, 638))
+
+        response = self.client.post(
+            '/api/v1/students/generate_bulk_id_cards/',
+            {'student_ids': [self.student.pk], 'layout': 'sheet'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        # Ten CR80 cards per A4 page: eleven cards need two pages.
+        png = io.BytesIO()
+        card.save(png, format='PNG')
+        sheet = write_print_sheet([png.getvalue()] * 11).read()
+        self.assertIn(b'/Count 2', sheet)
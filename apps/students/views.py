@@ -13,15 +13,19 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from apps.core.permissions import IsSecretaryOrAdmin, IsTeacherOrAdmin
-from .models import Student, Enrollment, Attendance
+from apps.core.services.export import ZIP_CONTENT_TYPE, export_response, iter_zip
+from .models import Student, Enrollment, Attendance, AttendanceSummary
 from .serializers import (
     StudentListSerializer, StudentDetailSerializer, StudentCreateSerializer,
     EnrollmentListSerializer, EnrollmentDetailSerializer, EnrollmentCreateSerializer,
     AttendanceListSerializer, AttendanceDetailSerializer, AttendanceCreateSerializer,
     AttendanceBulkCreateSerializer
 )
+from .services.attendance import (
+    at_risk_summaries, attendance_summaries, record_session_attendance, summary_payload,
+)
 from .services.excel import StudentExcelService
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 
 
 class StudentViewSet(viewsets.ModelViewSet):
@@ -82,18 +86,19 @@ class StudentViewSet(viewsets.ModelViewSet):
         - Read operations: All authenticated users (with role-based filtering)
         - Write operations: Admin and Secretary only
         """
-        if self.action in ['list', 'retrieve', 'enrollments', 'grades', 'attendance_stats']:
+        if self.action in ['list', 'retrieve', 'enrollments', 'grades', 'attendance_stats',
+                           'timetable', 'timetable_ics']:
             return [IsAuthenticated()]
         return [IsAuthenticated(), IsSecretaryOrAdmin()]
 
     def perform_update(self, serializer):
         """Save the student and discard the previous generated card version."""
-        from django.core.cache import cache
+        from apps.core.services.artefacts import artefacts
         from apps.students.services.id_card import IDCardGenerator
 
         previous_card_key = IDCardGenerator(serializer.instance).cache_key()
         serializer.save()
-        cache.delete(previous_card_key)
+        artefacts.delete(previous_card_key)
     
     def get_queryset(self):
         """
@@ -125,6 +130,10 @@ class StudentViewSet(viewsets.ModelViewSet):
         
         if current_year_only:
             queryset = queryset.filter(enrollments__academic_year__is_current=True).distinct()
+        
+        if self.action in ['timetable', 'timetable_ics']:
+            # The timetable is cached: skip the enrollments prefetch.
+            queryset = queryset.prefetch_related(None)
             
         return queryset
     
@@ -281,35 +290,31 @@ class StudentViewSet(viewsets.ModelViewSet):
         - semester_id: Filter by semester
         - course_id: Filter by course
         
-        Returns attendance counts by status and overall attendance rate.
+        Returns attendance counts by status and overall attendance rate,
+        read from the per-course attendance summaries.
         """
-        from django.db.models import Count, Q
+        from django.db.models import Sum
+        from django.db.models.functions import Coalesce
         
         student = self.get_object()
         
-        attendances = Attendance.objects.filter(student=student)
+        summaries = AttendanceSummary.objects.filter(student=student)
         
         # Apply filters
         semester_id = request.query_params.get('semester_id')
         if semester_id:
-            attendances = attendances.filter(
-                course_session__schedule__semester_id=semester_id
-            )
+            summaries = summaries.filter(semester_id=semester_id)
         
         course_id = request.query_params.get('course_id')
         if course_id:
-            attendances = attendances.filter(
-                course_session__schedule__course_id=course_id
-            )
+            summaries = summaries.filter(course_id=course_id)
         
         # Get counts by status
-        stats = attendances.aggregate(
-            total=Count('id'),
-            present=Count('id', filter=Q(status='PRESENT')),
-            absent=Count('id', filter=Q(status='ABSENT')),
-            late=Count('id', filter=Q(status='LATE')),
-            excused=Count('id', filter=Q(status='EXCUSED'))
-        )
+        stats = summaries.aggregate(**{
+            field: Coalesce(Sum(field), 0)
+            for field in AttendanceSummary.STATUS_FIELDS.values()
+        })
+        stats['total'] = sum(stats.values())
         
         # Calculate attendance rate
         total = stats['total']
@@ -332,6 +337,41 @@ class StudentViewSet(viewsets.ModelViewSet):
             }
         })
 
+    def _timetable(self, request):
+        from apps.scheduling.services.timetables import student_timetable, timetable_semester
+
+        student = self.get_object()
+        semester = timetable_semester(request.query_params.get('semester_id'))
+        return student, student_timetable(student, semester) if semester else None
+
+    @action(detail=True, methods=['get'])
+    def timetable(self, request, pk=None):
+        """
+        Get the weekly timetable of a student.
+        
+        Query parameters:
+        - semester_id: Optional (defaults to current)
+        
+        Cached per student and semester and served with an ETag; a matching
+        If-None-Match is answered with 304 Not Modified.
+        """
+        from apps.scheduling.services.timetables import timetable_response
+
+        _, cached = self._timetable(request)
+        if cached is None:
+            return Response({'error': 'Semestre non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        return timetable_response(request, cached)
+
+    @action(detail=True, methods=['get'])
+    def timetable_ics(self, request, pk=None):
+        """Download the weekly timetable of a student as an iCalendar (.ics) feed."""
+        from apps.scheduling.services.timetables import timetable_response
+
+        student, cached = self._timetable(request)
+        if cached is None:
+            return Response({'error': 'Semestre non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        return timetable_response(request, cached, filename=f'emploi_du_temps_{student.student_id}')
+
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
     def generate_id_card(self, request, pk=None):
         """Generate and download Student ID Card."""
@@ -354,11 +394,14 @@ class StudentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
     def generate_bulk_id_cards(self, request):
-        """Generate and download ID cards for multiple students as ZIP."""
-        import zipfile
-        import io
-        from apps.students.services.id_card import IDCardGenerator
-        from django.http import HttpResponse
+        """
+        Generate the ID cards of several students.
+
+        Streams a ZIP of PNG cards as they are rendered, or with
+        layout='sheet' returns one A4 PDF of 10 cards per page for the
+        card printer.
+        """
+        from apps.students.services.id_card import iter_card_images, write_print_sheet
 
         student_ids = request.data.get('student_ids', [])
         if not student_ids:
@@ -367,48 +410,42 @@ class StudentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Create zip in memory
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_DEFLATED) as zip_file:
-            students = Student.objects.filter(id__in=student_ids).select_related(
-                'user', 'program', 'current_level',
-            ).prefetch_related('enrollments__academic_year')
-            if not students.exists():
-                return Response(
-                     {"error": "Aucun étudiant trouvé pour les IDs fournis"},
-                     status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            for student in students:
-                try:
-                    generator = IDCardGenerator(student)
-                    image_bytes, _ = generator.generate_cached()
-                    # Add to zip
-                    # Ensure unique filenames in case of duplicates? student_id should be unique.
-                    filename = f"carte_etudiant_{student.student_id}.png"
-                    zip_file.writestr(filename, image_bytes)
-                except Exception as e:
-                    # Log error or skip
-                    print(f"Error generating ID card for {student.id}: {e}")
-                    continue
-
-        zip_buffer.seek(0)
-        response = HttpResponse(zip_buffer, content_type='application/zip')
+        students = Student.objects.filter(id__in=student_ids).select_related(
+            'user', 'program', 'current_level',
+        ).order_by('student_id')
+        if not students.exists():
+            return Response(
+                 {"error": "Aucun étudiant trouvé pour les IDs fournis"},
+                 status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cards = iter_card_images(students)
+        if request.data.get('layout') == 'sheet':
+            return FileResponse(
+                write_print_sheet(image for _, image in cards),
+                as_attachment=True,
+                filename='cartes_etudiants.pdf',
+                content_type='application/pdf',
+            )
+
+        response = StreamingHttpResponse(
+            iter_zip(
+                (f"carte_etudiant_{student.student_id}.png", image_bytes)
+                for student, image_bytes in cards
+            ),
+            content_type=ZIP_CONTENT_TYPE,
+        )
         response['Content-Disposition'] = 'attachment; filename="cartes_etudiants.zip"'
         return response
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
     def export_excel(self, request):
-        """Export filtered students to Excel."""
+        """Export filtered students to Excel (or CSV with ?export_format=csv)."""
         queryset = self.filter_queryset(self.get_queryset())
-        excel_file = StudentExcelService.export_students(queryset)
-
-        response = HttpResponse(
-            excel_file,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return export_response(
+            request, StudentExcelService.HEADERS, StudentExcelService.export_rows(queryset),
+            filename='etudiants', title='Étudiants',
         )
-        response['Content-Disposition'] = 'attachment; filename="etudiants.xlsx"'
-        return response
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsSecretaryOrAdmin])
     def download_template(self, request):
@@ -535,6 +572,8 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     
     Custom Actions:
     - record_bulk: POST /api/v1/attendances/record_bulk/
+    - absence_report: GET /api/v1/attendances/absence_report/?course_id=
+    - at_risk: GET /api/v1/attendances/at_risk/
     
     Permissions:
     - Read: All authenticated users (filtered by role)
@@ -669,7 +708,8 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         
         try:
             course_session = CourseSession.objects.select_related(
-                'schedule', 'schedule__teacher', 'schedule__teacher__user'
+                'schedule', 'schedule__teacher', 'schedule__teacher__user',
+                'schedule__course', 'schedule__time_slot', 'schedule__classroom',
             ).get(id=course_session_id)
         except CourseSession.DoesNotExist:
             return Response(
@@ -685,53 +725,113 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
         
-        created_count = 0
-        updated_count = 0
-        errors = []
-        
-        for attendance_data in attendances_data:
-            student_id = attendance_data.get('student')
-            status_value = attendance_data.get('status', 'PRESENT')
-            remarks = attendance_data.get('remarks', '')
-            
-            try:
-                student = Student.objects.get(id=student_id)
-                
-                # Check if student is enrolled in the course
-                if not student.enrollments.filter(
-                    program=course_session.schedule.course.program,
-                    is_active=True
-                ).exists():
-                    errors.append({
-                        "student_id": student_id,
-                        "error": "Étudiant non inscrit à ce cours"
-                    })
-                    continue
-                
-                # Create or update attendance
-                attendance, created = Attendance.objects.update_or_create(
-                    student=student,
-                    course_session=course_session,
-                    defaults={
-                        'status': status_value,
-                        'remarks': remarks,
-                        'recorded_by': request.user
-                    }
-                )
-                
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
-                
-            except Student.DoesNotExist:
-                errors.append({
-                    "student_id": student_id,
-                    "error": "Étudiant non trouvé"
-                })
+        created_count, updated_count, errors = record_session_attendance(
+            course_session, attendances_data, request.user,
+        )
         
         return Response({
             "created": created_count,
             "updated": updated_count,
             "errors": errors
         })
+
+    def _report_scope(self, request):
+        """
+        Resolve (semester, course_ids) for the summary reports.
+
+        ?semester_id= defaults to the current semester. Teachers only see the
+        courses they are scheduled to teach in it (course_ids is a set);
+        admins, deans and secretaries see every course (course_ids is None).
+        """
+        from rest_framework.exceptions import NotFound, PermissionDenied
+        from apps.scheduling.models import Schedule
+        from apps.university.models import Semester
+
+        semester_id = request.query_params.get('semester_id')
+        semesters = Semester.objects.all()
+        semester = (
+            semesters.filter(pk=semester_id) if semester_id else semesters.filter(is_current=True)
+        ).first()
+        if semester is None:
+            raise NotFound("Semestre non trouvé")
+
+        user = request.user
+        if user.role in ['ADMIN', 'DEAN', 'SECRETARY']:
+            return semester, None
+        if user.role == 'TEACHER':
+            return semester, set(Schedule.objects.filter(
+                semester=semester, teacher__user=user,
+            ).order_by().values_list('course_id', flat=True))
+        raise PermissionDenied("Vous n'avez pas accès aux rapports de présence.")
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def absence_report(self, request):
+        """
+        Attendance counts and rates of every student of one course.
+        
+        Query parameters:
+        - course_id: Course to report on (required)
+        - semester_id: Semester (defaults to the current one)
+        """
+        from apps.academics.models import Course
+
+        semester, course_ids = self._report_scope(request)
+        try:
+            course = Course.objects.get(pk=request.query_params.get('course_id'))
+        except (Course.DoesNotExist, ValueError, TypeError):
+            return Response(
+                {"error": "Cours non trouvé"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if course_ids is not None and course.pk not in course_ids:
+            return Response(
+                {"error": "Vous n'êtes pas assigné à ce cours"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        summaries = attendance_summaries(semester.pk, [course.pk]).order_by('student__student_id')
+        return Response({
+            'course_id': course.pk,
+            'course_code': course.code,
+            'semester_id': semester.pk,
+            'results': [summary_payload(summary) for summary in summaries],
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def at_risk(self, request):
+        """
+        Students whose unexcused absences reach the alert threshold.
+        
+        Query parameters:
+        - semester_id: Semester (defaults to the current one)
+        - course_id: Restrict to one course
+        - threshold: Absence rate in percent (defaults to ATTENDANCE_ALERT_THRESHOLD)
+        """
+        semester, course_ids = self._report_scope(request)
+        course_id = request.query_params.get('course_id')
+        if course_id:
+            try:
+                course_id = int(course_id)
+            except ValueError:
+                return Response({"error": "course_id invalide"}, status=status.HTTP_400_BAD_REQUEST)
+            if course_ids is not None and course_id not in course_ids:
+                return Response(
+                    {"error": "Vous n'êtes pas assigné à ce cours"},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            course_ids = {course_id}
+
+        threshold = request.query_params.get('threshold')
+        if threshold is not None:
+            try:
+                threshold = float(threshold)
+            except ValueError:
+                return Response({"error": "threshold invalide"}, status=status.HTTP_400_BAD_REQUEST)
+
+        summaries = at_risk_summaries(semester.pk, threshold, course_ids)
+        results = [summary_payload(summary) for summary in summaries]
+        return Response({
+            'semester_id': semester.pk,
+            'count': len(results),
+            'results': results,
+        })
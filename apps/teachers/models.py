@@ -1,6 +1,10 @@
+import re
+
 from django.db import models
 from django.conf import settings
 
+from apps.university.models import IdentifierSequence
+
 
 class Teacher(models.Model):
     """Profil enseignant lié à un utilisateur."""
@@ -18,6 +22,11 @@ class Teacher(models.Model):
         ASSOCIATE_PROFESSOR = 'ASSOCIATE_PROFESSOR', 'Professeur associé'
         PROFESSOR = 'PROFESSOR', 'Professeur'
 
+    # IdentifierSequence counters of the teacher matricules, and the shape
+    # of a generated one: ENS[YY][YY+1][Initial][SEQ].
+    ID_SEQUENCE_SCOPE = 'teacher'
+    ID_PATTERN = re.compile(r'(?P<prefix>ENS\d{4}.)(?P<sequence>\d{3,})')
+
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -69,16 +78,47 @@ class Teacher(models.Model):
         verbose_name_plural = "Enseignants"
         ordering = ['employee_id']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_employee_id = instance.__dict__.get('employee_id')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.employee_id:
             self.generate_employee_id()
+        elif self.employee_id != getattr(self, '_saved_employee_id', None):
+            # An explicit matricule: later generated ones must not reuse it.
+            IdentifierSequence.seed_from(self.ID_SEQUENCE_SCOPE, [self.employee_id], self.ID_PATTERN)
         super().save(*args, **kwargs)
+        self._saved_employee_id = self.employee_id
 
     def generate_employee_id(self):
         """
         Génère un matricule au format: ENS[YY][YY+1][Initial][SEQ]
         Exemple: ENS1920A001
         """
+        prefix = self.employee_id_prefix()
+
+        # Sequence, from the per-prefix counter
+        sequence = IdentifierSequence.reserve(
+            self.ID_SEQUENCE_SCOPE, prefix, seed=lambda: Teacher._last_sequence(prefix),
+        )
+        self.employee_id = f"{prefix}{sequence:03d}"
+
+    @classmethod
+    def _last_sequence(cls, prefix):
+        last_teacher = cls.objects.filter(employee_id__startswith=prefix).order_by('-employee_id').first()
+
+        if last_teacher:
+            try:
+                return int(last_teacher.employee_id[-3:])
+            except ValueError:
+                return 0
+        return 0
+
+    def employee_id_prefix(self):
+        """Préfixe du matricule: ENS[YY][YY+1][Initial]."""
         # Prefix
         prefix_base = "ENS"
         
@@ -93,21 +133,7 @@ class Teacher(models.Model):
         # Initial
         initial = self.user.first_name[0].upper() if self.user.first_name else 'X'
         
-        prefix = f"{prefix_base}{year_str}{initial}"
-        
-        # Sequence
-        last_teacher = Teacher.objects.filter(employee_id__startswith=prefix).order_by('-employee_id').first()
-        
-        if last_teacher:
-            try:
-                last_seq = int(last_teacher.employee_id[-3:])
-                new_seq = last_seq + 1
-            except ValueError:
-                new_seq = 1
-        else:
-            new_seq = 1
-            
-        self.employee_id = f"{prefix}{new_seq:03d}"
+        return f"{prefix_base}{year_str}{initial}"
 
     def __str__(self):
         return f"{self.employee_id} - {self.user.get_full_name()}"
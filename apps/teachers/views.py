@@ -85,7 +85,7 @@ class TeacherViewSet(viewsets.ModelViewSet):
         - Read operations: All authenticated users
         - Write operations: Admin and Secretary only
         """
-        if self.action in ['list', 'retrieve', 'courses', 'schedules']:
+        if self.action in ['list', 'retrieve', 'courses', 'schedules', 'timetable', 'timetable_ics']:
             return [IsAuthenticated()]
         return [IsAuthenticated(), IsSecretaryOrAdmin()]
     
@@ -157,57 +157,73 @@ class TeacherViewSet(viewsets.ModelViewSet):
         """
         Get schedule for this teacher.
         
-        Returns all scheduled classes for the teacher in the current semester.
+        Returns the active scheduled classes of the teacher in the current
+        semester, read from the cached personal timetable.
         """
-        from apps.scheduling.models import Schedule
-        from apps.university.models import Semester
+        from apps.scheduling.services.timetables import teacher_timetable, timetable_semester
         
         teacher = self.get_object()
-        
-        # Get current semester
-        current_semester = Semester.objects.filter(is_current=True).first()
-        
-        # Get schedules
-        schedules = Schedule.objects.filter(
-            teacher=teacher
-        ).select_related(
-            'course', 'classroom', 'time_slot', 'semester'
-        )
-        
-        if current_semester:
-            schedules = schedules.filter(semester=current_semester)
-        
-        schedules = schedules.order_by('time_slot__day', 'time_slot__start_time')
+        current_semester = timetable_semester()
+        entries = teacher_timetable(teacher, current_semester)['timetable']['schedules'] if current_semester else []
         
         # Format schedule by day
         schedule_by_day = {}
-        days = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-        
-        for schedule in schedules:
-            day_name = days[schedule.time_slot.day] if schedule.time_slot else 'Non défini'
-            if day_name not in schedule_by_day:
-                schedule_by_day[day_name] = []
-            
-            schedule_by_day[day_name].append({
-                'id': schedule.id,
-                'course_name': schedule.course.name if schedule.course else 'N/A',
-                'course_code': schedule.course.code if schedule.course else 'N/A',
-                'classroom': schedule.classroom.name if schedule.classroom else 'N/A',
-                'start_time': schedule.time_slot.start_time.strftime('%H:%M') if schedule.time_slot else None,
-                'end_time': schedule.time_slot.end_time.strftime('%H:%M') if schedule.time_slot else None,
+        for entry in entries:
+            schedule_by_day.setdefault(entry['day_display'], []).append({
+                'id': entry['id'],
+                'course_name': entry['course_name'],
+                'course_code': entry['course_code'],
+                'classroom': entry['classroom'] or 'N/A',
+                'start_time': entry['start_time'],
+                'end_time': entry['end_time'],
             })
         
         return Response({
-            'count': schedules.count(),
+            'count': len(entries),
             'teacher': {
                 'id': teacher.id,
                 'name': teacher.user.get_full_name(),
                 'employee_id': teacher.employee_id,
             },
-            'current_semester': current_semester.name if current_semester else None,
+            'current_semester': str(current_semester) if current_semester else None,
             'schedule_by_day': schedule_by_day,
         })
 
+    def _timetable(self, request):
+        from apps.scheduling.services.timetables import teacher_timetable, timetable_semester
+
+        teacher = self.get_object()
+        semester = timetable_semester(request.query_params.get('semester_id'))
+        return teacher, teacher_timetable(teacher, semester) if semester else None
+
+    @action(detail=True, methods=['get'])
+    def timetable(self, request, pk=None):
+        """
+        Get the weekly timetable of a teacher.
+        
+        Query parameters:
+        - semester_id: Optional (defaults to current)
+        
+        Cached per teacher and semester and served with an ETag; a matching
+        If-None-Match is answered with 304 Not Modified.
+        """
+        from apps.scheduling.services.timetables import timetable_response
+
+        _, cached = self._timetable(request)
+        if cached is None:
+            return Response({'error': 'Semestre non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        return timetable_response(request, cached)
+
+    @action(detail=True, methods=['get'])
+    def timetable_ics(self, request, pk=None):
+        """Download the weekly timetable of a teacher as an iCalendar (.ics) feed."""
+        from apps.scheduling.services.timetables import timetable_response
+
+        teacher, cached = self._timetable(request)
+        if cached is None:
+            return Response({'error': 'Semestre non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        return timetable_response(request, cached, filename=f'emploi_du_temps_{teacher.employee_id}')
+
 
 class TeacherCourseViewSet(viewsets.ModelViewSet):
     """
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import (
-    AcademicYear, Semester, Faculty, Department, Level, Program, Classroom
+    AcademicYear, Semester, Faculty, Department, Level, Program, Classroom,
+    IdentifierSequence, CacheVersion,
 )
 
 
@@ -53,3 +54,16 @@ class ClassroomAdmin(admin.ModelAdmin):
     list_display = ['code', 'name', 'building', 'capacity', 'is_available']
     search_fields = ['name', 'code', 'building']
     list_filter = ['building', 'is_available', 'has_projector', 'has_computers']
+
+
+@admin.register(IdentifierSequence)
+class IdentifierSequenceAdmin(admin.ModelAdmin):
+    list_display = ['scope', 'prefix', 'last_value', 'updated_at']
+    list_filter = ['scope']
+    search_fields = ['prefix']
+
+
+@admin.register(CacheVersion)
+class CacheVersionAdmin(admin.ModelAdmin):
+    list_display = ['key', 'token', 'updated_at']
+    search_fields = ['key']
@@ -8,9 +8,29 @@ from apps.students.models import Enrollment, Student
 from apps.teachers.models import Teacher
 from apps.university.models import Program, Department, Semester
 from apps.finance.models import TuitionPayment
-from apps.scheduling.models import Schedule
+from apps.scheduling.services.timetables import (
+    student_timetable, teacher_timetable, timetable_semester,
+)
 from apps.academics.models import Grade, CourseGrade, Course
 
+
+def today_schedule(cached, color):
+    """Dashboard rows of today's classes in a cached personal timetable."""
+    if cached is None:
+        return []
+    today_index = timezone.now().weekday()  # 0=Monday
+    return [
+        {
+            'id': entry['id'],
+            'course': entry['course_name'],
+            'location': f"{entry['building']} - {entry['classroom']}" if entry['classroom'] else "N/A",
+            'time': f"{entry['start_time']} - {entry['end_time']}",
+            'color': color,
+        }
+        for entry in cached['timetable']['schedules']
+        if entry['day'] == today_index
+    ]
+
 class DashboardView(APIView):
     """
     Centralized Dashboard View for all user roles.
@@ -94,24 +114,11 @@ class DashboardView(APIView):
             enrollments__program__courses__in=courses,
         ).distinct().count()
         
-        # Simple Schedule for Today
-        today_index = timezone.now().weekday() # 0=Monday
-        today_schedule = Schedule.objects.filter(
-            teacher=teacher,
-            time_slot__day=today_index,
-            is_active=True,
-        ).select_related('course', 'classroom', 'time_slot').order_by('time_slot__start_time')
-
-        schedule_data = [
-            {
-                'id': s.id,
-                'course': s.course.name,
-                'location': f"{s.classroom.building} - {s.classroom.name}" if s.classroom else "N/A",
-                'time': f"{s.time_slot.start_time.strftime('%H:%M')} - {s.time_slot.end_time.strftime('%H:%M')}",
-                'color': 'blue' # proactive default
-            }
-            for s in today_schedule
-        ]
+        # Today's classes, read from the cached personal timetable
+        current_semester = timetable_semester()
+        schedule_data = today_schedule(
+            teacher_timetable(teacher, current_semester) if current_semester else None, 'blue',
+        )
 
         return {
             'role': 'TEACHER',
@@ -168,26 +175,10 @@ class DashboardView(APIView):
             for g in recent_grades_qs
         ]
         
-        # Schedule
-        today_index = timezone.now().weekday()
-        
-        today_schedule = Schedule.objects.filter(
-            course__in=student_courses,
-            semester=current_semester,
-            time_slot__day=today_index,
-            is_active=True,
-        ).select_related('course', 'classroom', 'time_slot').order_by('time_slot__start_time')
-
-        schedule_data = [
-            {
-                'id': s.id,
-                'course': s.course.name,
-                'location': f"{s.classroom.building} - {s.classroom.name}" if s.classroom else "N/A",
-                'time': f"{s.time_slot.start_time.strftime('%H:%M')} - {s.time_slot.end_time.strftime('%H:%M')}",
-                'color': 'green'
-            }
-            for s in today_schedule
-        ]
+        # Today's classes, read from the cached personal timetable
+        schedule_data = today_schedule(
+            student_timetable(student, current_semester) if current_semester else None, 'green',
+        )
 
         return {
             'role': 'STUDENT',
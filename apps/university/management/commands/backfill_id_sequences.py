@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.students.models import Student
+from apps.teachers.models import Teacher
+from apps.university.models import IdentifierSequence
+
+# (model, matricule field) of every generated matricule; each model's
+# ID_PATTERN tells its prefix from its sequence.
+SEQUENCES = [
+    (Student, 'student_id'),
+    (Teacher, 'employee_id'),
+]
+
+
+def highest_sequences(model, field):
+    """Return {prefix: highest sequence} over the matricules of model."""
+    return IdentifierSequence.highest_sequences(
+        model.objects.values_list(field, flat=True).iterator(chunk_size=2000),
+        model.ID_PATTERN,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Seeds the matricule counters from the student and teacher IDs already issued'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Backfilling matricule sequences...")
+        for model, field in SEQUENCES:
+            highest = highest_sequences(model, field)
+            for prefix, value in highest.items():
+                IdentifierSequence.seed(model.ID_SEQUENCE_SCOPE, prefix, value)
+            self.stdout.write(f"{model.ID_SEQUENCE_SCOPE}: {len(highest)} prefixes seeded")
+        self.stdout.write(self.style.SUCCESS("Matricule sequences are up to date"))
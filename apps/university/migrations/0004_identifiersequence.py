@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('university', '0003_programfee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=20, verbose_name='Type')),
+                ('prefix', models.CharField(max_length=30, verbose_name='Préfixe')),
+                ('last_value', models.PositiveBigIntegerField(default=0, verbose_name='Dernière valeur')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Séquence de matricules',
+                'verbose_name_plural': 'Séquences de matricules',
+                'unique_together': {('scope', 'prefix')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('university', '0004_identifiersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='Clé')),
+                ('token', models.CharField(max_length=32, verbose_name='Jeton')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Version de cache',
+                'verbose_name_plural': 'Versions de cache',
+            },
+        ),
+    ]
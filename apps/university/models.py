@@ -1,4 +1,8 @@
-from django.db import models
+from uuid import uuid4
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.conf import settings
 
 
@@ -236,3 +240,121 @@ class ProgramFee(models.Model):
 
     def __str__(self):
         return f"{self.program} - {self.level} - {self.academic_year}: {self.amount}"
+
+
+class IdentifierSequence(models.Model):
+    """
+    Compteur des matricules générés, un par (type, préfixe).
+
+    Remplace la recherche du dernier matricule par LIKE à chaque inscription :
+    l'incrément est un UPDATE atomique qui verrouille la ligne jusqu'à la fin
+    de la transaction appelante, et un import peut réserver un bloc entier.
+    """
+    scope = models.CharField(max_length=20, verbose_name="Type")
+    prefix = models.CharField(max_length=30, verbose_name="Préfixe")
+    last_value = models.PositiveBigIntegerField(default=0, verbose_name="Dernière valeur")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Séquence de matricules"
+        verbose_name_plural = "Séquences de matricules"
+        unique_together = ['scope', 'prefix']
+
+    def __str__(self):
+        return f"{self.scope}:{self.prefix} = {self.last_value}"
+
+    @classmethod
+    def reserve(cls, scope, prefix, count=1, seed=None):
+        """
+        Reserve count consecutive values for (scope, prefix) and return the first.
+
+        A missing counter starts from seed(), the highest value already in use
+        (0 without seed), so IDs issued before the counter existed are skipped.
+        """
+        counters = cls.objects.filter(scope=scope, prefix=prefix)
+        with transaction.atomic():
+            if not counters.update(last_value=F('last_value') + count, updated_at=timezone.now()):
+                start = seed() if seed else 0
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(scope=scope, prefix=prefix, last_value=start + count)
+                    return start + 1
+                except IntegrityError:
+                    # Created concurrently: fall back to incrementing it.
+                    counters.update(last_value=F('last_value') + count, updated_at=timezone.now())
+            return counters.values_list('last_value', flat=True).get() - count + 1
+
+    @classmethod
+    def seed(cls, scope, prefix, value):
+        """Raise the counter to at least value; never moves it backwards."""
+        with transaction.atomic():
+            counter, created = cls.objects.select_for_update().get_or_create(
+                scope=scope, prefix=prefix, defaults={'last_value': value},
+            )
+            if not created and counter.last_value < value:
+                counter.last_value = value
+                counter.save(update_fields=['last_value', 'updated_at'])
+        return counter
+
+    @staticmethod
+    def highest_sequences(identifiers, pattern):
+        """
+        Return {prefix: highest sequence} over identifiers.
+
+        pattern matches the generated shape, with 'prefix' and 'sequence'
+        groups; other identifiers are not counted.
+        """
+        highest = {}
+        for identifier in identifiers:
+            match = pattern.fullmatch(identifier or '')
+            if match:
+                prefix, value = match['prefix'], int(match['sequence'])
+                highest[prefix] = max(highest.get(prefix, 0), value)
+        return highest
+
+    @classmethod
+    def seed_from(cls, scope, identifiers, pattern):
+        """Raise the counters of scope past identifiers supplied explicitly, one seed per prefix."""
+        for prefix, value in cls.highest_sequences(identifiers, pattern).items():
+            cls.seed(scope, prefix, value)
+
+
+class CacheVersion(models.Model):
+    """
+    Version partagée d'un cache applicatif, une ligne par clé.
+
+    Le cache par défaut (LocMem) est propre à chaque processus : une version
+    rangée dedans n'expire que les copies du worker qui a écrit. La version
+    vit donc en base, validée ou annulée avec l'écriture qui la change. Chaque
+    version est un jeton aléatoire, qu'un rollback ne peut pas faire resservir.
+    """
+    key = models.CharField(max_length=100, unique=True, verbose_name="Clé")
+    token = models.CharField(max_length=32, verbose_name="Jeton")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Version de cache"
+        verbose_name_plural = "Versions de cache"
+
+    def __str__(self):
+        return f"{self.key} = {self.token}"
+
+    @classmethod
+    def current(cls, *keys):
+        """Return the versions of keys joined by dots, in one query; '0' if never bumped."""
+        tokens = dict(cls.objects.filter(key__in=keys).values_list('key', 'token'))
+        return '.'.join(tokens.get(key, '0') for key in keys)
+
+    @classmethod
+    def bump(cls, key):
+        """Give key a new version, expiring the cache entries of every process."""
+        token = uuid4().hex
+        versions = cls.objects.filter(key=key)
+        if versions.update(token=token, updated_at=timezone.now()):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(key=key, token=token)
+        except IntegrityError:
+            # Created concurrently: replace its token.
+            versions.update(token=token, updated_at=timezone.now())
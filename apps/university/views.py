@@ -468,7 +468,8 @@ class ClassroomViewSet(viewsets.ModelViewSet):
         - Read operations: All authenticated users
         - Write operations: Admin and Secretary only
         """
-        if self.action in ['list', 'retrieve', 'check_availability', 'available']:
+        if self.action in ['list', 'retrieve', 'check_availability', 'available',
+                           'availability_matrix']:
             return [IsAuthenticated()]
         return [IsAuthenticated(), IsSecretaryOrAdmin()]
 
@@ -483,7 +484,8 @@ class ClassroomViewSet(viewsets.ModelViewSet):
             "semester_id": <semester_id> (optional, defaults to current)
         }
         """
-        from apps.scheduling.models import Schedule, TimeSlot
+        from apps.scheduling.models import TimeSlot
+        from apps.scheduling.services.conflicts import ConflictIndex
         
         classroom = self.get_object()
         
@@ -504,21 +506,17 @@ class ClassroomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Build query
-        conflicts = Schedule.objects.filter(
-            classroom=classroom,
-            time_slot=time_slot
-        )
-        
+        # Default to current semester
         if semester_id:
-            conflicts = conflicts.filter(semester_id=semester_id)
+            semester = Semester.objects.filter(pk=semester_id).first()
         else:
-            # Default to current semester
-            current_semester = Semester.objects.filter(is_current=True).first()
-            if current_semester:
-                conflicts = conflicts.filter(semester=current_semester)
+            semester = Semester.objects.filter(is_current=True).first()
         
-        is_available = not conflicts.exists()
+        # Any active schedule of the room whose slot overlaps this one clashes
+        conflicts = ConflictIndex.for_semester(semester).classroom_conflicts(
+            classroom, time_slot
+        ) if semester else []
+        is_available = not conflicts
         
         return Response({
             'is_available': is_available,
@@ -535,12 +533,12 @@ class ClassroomViewSet(viewsets.ModelViewSet):
             },
             'conflicts': [
                 {
-                    'id': c.id,
-                    'course': c.course.name if c.course else 'N/A',
-                    'teacher': c.teacher.user.get_full_name() if c.teacher else 'N/A',
+                    'id': c['id'],
+                    'course': c['course_name'] or 'N/A',
+                    'teacher': c['teacher_name'] or 'N/A',
                 }
                 for c in conflicts
-            ] if not is_available else []
+            ]
         })
 
     @action(detail=False, methods=['get'])
@@ -553,7 +551,8 @@ class ClassroomViewSet(viewsets.ModelViewSet):
         - semester_id: Optional (defaults to current)
         - min_capacity: Optional minimum capacity filter
         """
-        from apps.scheduling.models import Schedule, TimeSlot
+        from apps.scheduling.models import TimeSlot
+        from apps.scheduling.services.conflicts import ConflictIndex
         
         time_slot_id = request.query_params.get('time_slot_id')
         semester_id = request.query_params.get('semester_id')
@@ -573,17 +572,15 @@ class ClassroomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Get occupied classrooms
-        occupied_query = Schedule.objects.filter(time_slot=time_slot)
-        
+        # Get occupied classrooms (any overlapping slot of the semester)
         if semester_id:
-            occupied_query = occupied_query.filter(semester_id=semester_id)
+            semester = Semester.objects.filter(pk=semester_id).first()
         else:
-            current_semester = Semester.objects.filter(is_current=True).first()
-            if current_semester:
-                occupied_query = occupied_query.filter(semester=current_semester)
+            semester = Semester.objects.filter(is_current=True).first()
         
-        occupied_classroom_ids = occupied_query.values_list('classroom_id', flat=True)
+        occupied_classroom_ids = list(
+            ConflictIndex.for_semester(semester).occupied_classrooms(time_slot)
+        ) if semester else []
         
         # Get available classrooms
         available_classrooms = Classroom.objects.filter(
@@ -610,3 +607,58 @@ class ClassroomViewSet(viewsets.ModelViewSet):
             'results': serializer.data
         })
 
+    @action(detail=False, methods=['get'])
+    def availability_matrix(self, request):
+        """
+        Get the weekly occupancy of every classroom in one response.
+        
+        Query parameters:
+        - semester_id: Optional (defaults to current)
+        - min_capacity: Optional minimum capacity filter
+        - has_projector, has_computers: Optional equipment filters (true)
+        - building: Optional building filter
+        
+        Each classroom lists the time slots it is occupied in; every other
+        time slot of the week is free.
+        """
+        from apps.scheduling.services.availability import classroom_matrix
+        
+        params = request.query_params
+        semester_id = params.get('semester_id')
+        if semester_id:
+            semester = Semester.objects.filter(pk=semester_id).first()
+        else:
+            semester = Semester.objects.filter(is_current=True).first()
+        if semester is None:
+            return Response(
+                {'error': 'Semestre non trouvé'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        try:
+            min_capacity = int(params.get('min_capacity') or 0)
+        except ValueError:
+            return Response(
+                {'error': 'min_capacity doit être un entier'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        equipment = [
+            field for field in ('has_projector', 'has_computers')
+            if params.get(field, 'false').lower() == 'true'
+        ]
+        building = params.get('building')
+        
+        matrix = classroom_matrix(semester)
+        classrooms = [
+            classroom for classroom in matrix['classrooms']
+            if classroom['capacity'] >= min_capacity
+            and all(classroom[field] for field in equipment)
+            and (not building or classroom['building'] == building)
+        ]
+        
+        return Response({
+            'semester_id': semester.id,
+            'count': len(classrooms),
+            'time_slots': matrix['time_slots'],
+            'classrooms': classrooms,
+        })
@@ -146,6 +146,21 @@ if default_database["ENGINE"] == "django.db.backends.sqlite3":
         default_media_root = sqlite_path.parent / "media"
 MEDIA_ROOT = Path(config("MEDIA_ROOT", default=str(default_media_root)))
 
+# Generated files (ID cards, bulletins, exports) shared by every worker; see
+# apps/core/services/artefacts.py. Defaults to /data/artefacts beside media.
+ARTEFACT_CACHE_ROOT = Path(
+    config("ARTEFACT_CACHE_ROOT", default=str(default_media_root.parent / "artefacts"))
+)
+ARTEFACT_CACHE_MAX_SIZE = config(
+    "ARTEFACT_CACHE_MAX_SIZE", default=512 * 1024 * 1024, cast=int
+)
+
+# Let the reverse proxy send public media bytes: "x-accel-redirect" (nginx,
+# with an internal location aliased to MEDIA_ROOT at MEDIA_ACCEL_PREFIX) or
+# "x-sendfile" (Apache mod_xsendfile). Empty: Django streams the files.
+MEDIA_OFFLOAD = config("MEDIA_OFFLOAD", default="")
+MEDIA_ACCEL_PREFIX = config("MEDIA_ACCEL_PREFIX", default="/protected-media/")
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
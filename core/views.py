@@ -1,11 +1,13 @@
-import mimetypes
 from pathlib import Path
 
 from django.conf import settings
 from django.db import connection
-from django.http import FileResponse, Http404, JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_GET
 
+from apps.core.services.media import serve_media_file
+from apps.students.services.photos import HASHED_VARIANT_PATTERN, PHOTO_VARIANTS
+
 
 @require_GET
 def student_photo(request, path):
@@ -18,19 +20,25 @@ def student_photo(request, path):
     except ValueError as exc:
         raise Http404 from exc
 
+    # ?size=thumb|display|card serves a resized derivative of the photo.
+    variant = request.GET.get("size")
+    if variant in PHOTO_VARIANTS:
+        from apps.students.models import Student
+
+        photo_name = f"students/photos/{requested_file.relative_to(photo_root).as_posix()}"
+        variants = Student.objects.filter(photo=photo_name).values_list(
+            "photo_variants", flat=True,
+        ).first() or {}
+        if variants.get("source") == photo_name and variants.get(variant):
+            requested_file = (Path(settings.MEDIA_ROOT) / variants[variant]).resolve()
+
     if not requested_file.is_file():
         raise Http404
 
-    content_type, encoding = mimetypes.guess_type(requested_file.name)
-    response = FileResponse(
-        requested_file.open("rb"),
-        content_type=content_type or "application/octet-stream",
+    # Only derivative URLs carry a content digest; ?size= URLs do not.
+    return serve_media_file(
+        request, requested_file, immutable=bool(HASHED_VARIANT_PATTERN.search(path)),
     )
-    if encoding:
-        response["Content-Encoding"] = encoding
-    response["Cache-Control"] = "public, max-age=3600"
-    response["X-Content-Type-Options"] = "nosniff"
-    return response
 
 
 def health_check(request):
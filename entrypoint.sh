@@ -8,6 +8,10 @@ mkdir -p /data/media
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+# Backfills missing months and refreshes the open one; closed months are kept.
+echo "Refreshing finance rollups..."
+python manage.py rebuild_finance_rollups
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 